@@ -7,12 +7,16 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .database import get_db
+from .database import get_db, get_async_db
 from .models import User
 from .schemas import TokenData
-from .config import AuthConfig
+from .config import AuthConfig, Config as DatabaseConfig
+from .replicas import READ_ONLY, USER_KEY, reads_from_replica, use_primary
+from .sharding import bind_user_shard
 
 # 密码加密
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -43,6 +47,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Optional[str]:
+    """解析访问令牌，返回用户名；令牌无效时抛出 JWTError"""
+    payload = jwt.decode(token, AuthConfig.get_secret_key(), algorithms=[AuthConfig.ALGORITHM])
+    return payload.get("sub")
+
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """验证用户"""
     user = db.query(User).filter(User.username == username).first()
@@ -53,6 +63,17 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
     return user
 
 
+def _bind_user_shard(db, user: User):
+    """让本次请求对用户数据的读写走用户所在分片；数据迁移中的用户暂停写入"""
+    bind_user_shard(db, user)
+    if user.shard_moving and not db.info.get(READ_ONLY):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="账户数据迁移中，请稍后重试",
+            headers={"Retry-After": str(max(1, int(DatabaseConfig.SHARD_MOVE_GRACE)))},
+        )
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -65,18 +86,22 @@ async def get_current_user(
     )
     
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, AuthConfig.get_secret_key(), algorithms=[AuthConfig.ALGORITHM])
-        username: str = payload.get("sub")
+        username = decode_access_token(credentials.credentials)
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
     
+    db.info[USER_KEY] = token_data.username
     user = db.query(User).filter(User.username == token_data.username).first()
+    if user is None and reads_from_replica(db):
+        # 刚注册的用户可能尚未同步到副本，回主库确认
+        with use_primary(db):
+            user = db.query(User).filter(User.username == token_data.username).first()
     if user is None:
         raise credentials_exception
+    _bind_user_shard(db, user)
     return user
 
 
@@ -96,16 +121,83 @@ async def get_current_user_optional(
         return None
     
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, AuthConfig.get_secret_key(), algorithms=[AuthConfig.ALGORITHM])
-        username: str = payload.get("sub")
+        username = decode_access_token(credentials.credentials)
         if username is None:
             return None
         
+        db.info[USER_KEY] = username
         user = db.query(User).filter(User.username == username).first()
+        if user is None and reads_from_replica(db):
+            with use_primary(db):
+                user = db.query(User).filter(User.username == username).first()
         if user is None or not user.is_active:
             return None
         
+        _bind_user_shard(db, user)
         return user
     except JWTError:
-        return None 
\ No newline at end of file
+        return None 
+
+
+# 异步会话版本的认证依赖（DB_MODE=async 时由异步路由使用）
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """获取当前用户（异步会话）"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="无法验证凭证",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        username = decode_access_token(credentials.credentials)
+    except JWTError:
+        raise credentials_exception
+    if username is None:
+        raise credentials_exception
+    
+    db.info[USER_KEY] = username
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is None and reads_from_replica(db):
+        # 刚注册的用户可能尚未同步到副本，回主库确认
+        with use_primary(db):
+            user = await db.scalar(select(User).where(User.username == username))
+    if user is None:
+        raise credentials_exception
+    _bind_user_shard(db, user)
+    return user
+
+
+async def get_current_active_user_async(current_user: User = Depends(get_current_user_async)) -> User:
+    """获取当前活跃用户（异步会话）"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="未激活的用户")
+    return current_user
+
+
+async def get_current_user_optional_async(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[User]:
+    """获取当前用户（可选的，异步会话）"""
+    if not credentials:
+        return None
+    
+    try:
+        username = decode_access_token(credentials.credentials)
+    except JWTError:
+        return None
+    if username is None:
+        return None
+    
+    db.info[USER_KEY] = username
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is None and reads_from_replica(db):
+        with use_primary(db):
+            user = await db.scalar(select(User).where(User.username == username))
+    if user is None or not user.is_active:
+        return None
+    _bind_user_shard(db, user)
+    return user
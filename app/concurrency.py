@@ -0,0 +1,127 @@
+"""
+同步路由并发控制模块
+线程池上限与数据库连接池容量保持一致；超出的请求在准入队列中有限等待，超时直接返回 503，
+而不是占着工作线程在连接池里排队直到连接超时
+"""
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from anyio import to_thread
+from starlette.routing import Match
+
+from .config import Config as DatabaseConfig
+
+logger = logging.getLogger(__name__)
+
+
+def configure_thread_limiter(limit: Optional[int] = None) -> int:
+    """设置当前事件循环的默认线程池上限（需在事件循环中调用）"""
+    limit = limit or DatabaseConfig.get_thread_limit()
+    to_thread.current_default_thread_limiter().total_tokens = limit
+    logger.info(f"同步路由线程上限: {limit}，连接池容量: {DatabaseConfig.get_pool_capacity()}")
+    return limit
+
+
+def thread_limiter_stats() -> dict:
+    """当前事件循环的线程池占用情况（需在事件循环中调用）"""
+    limiter = to_thread.current_default_thread_limiter()
+    return {"total": int(limiter.total_tokens), "borrowed": limiter.borrowed_tokens}
+
+
+class RequestGate:
+    """同步路由的准入队列"""
+
+    def __init__(self, limit: Optional[int] = None, timeout: Optional[float] = None):
+        self.limit = limit or DatabaseConfig.get_thread_limit()
+        self.timeout = DatabaseConfig.REQUEST_QUEUE_TIMEOUT if timeout is None else timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 信号量绑定事件循环，事件循环变化时（如测试中多次启动应用）重新创建
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.limit), loop
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        """在限定时间内等待空位，超时返回 False"""
+        semaphore = self._get_semaphore()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "queue_timeout": self.timeout,
+        }
+
+
+# 进程级准入队列
+request_gate = RequestGate()
+
+
+def _runs_in_threadpool(scope) -> bool:
+    """请求匹配到的路由是否为同步函数（在线程池中执行）"""
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            endpoint = getattr(route, "endpoint", None)
+            return endpoint is not None and not asyncio.iscoroutinefunction(endpoint)
+    return False
+
+
+class ConcurrencyLimitMiddleware:
+    """同步路由的准入控制中间件"""
+
+    def __init__(self, app, gate: Optional[RequestGate] = None):
+        self.app = app
+        self.gate = gate or request_gate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _runs_in_threadpool(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.gate.acquire():
+            logger.warning(f"请求排队超过 {self.gate.timeout} 秒，拒绝: {scope['method']} {scope['path']}")
+            await self._reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.gate.release()
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "服务繁忙，请稍后重试"}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, int(self.gate.timeout))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,145 @@
+"""
+条件请求与范围请求
+按内容摘要生成强 ETag；If-None-Match（优先）或 If-Modified-Since 命中时返回 304；
+Range 请求返回 206，只支持单个区间（多个区间时返回完整内容），If-Range 与 ETag 不一致时忽略 Range。
+"""
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+import anyio
+from fastapi.responses import Response, StreamingResponse
+
+# 内容地址（URL 含摘要）的资源永不变化
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """请求的区间超出内容长度"""
+
+
+def make_etag(digest: str) -> str:
+    return f'"{digest[:32]}"'
+
+
+def content_etag(content: bytes) -> str:
+    return make_etag(hashlib.sha256(content).hexdigest())
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: Optional[str],
+                    last_modified: Optional[float] = None) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and _etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(request_headers: Mapping[str, str], size: int, etag: Optional[str]) -> Optional[Tuple[int, int]]:
+    """返回闭区间 (start, end)；没有或不支持的 Range 返回 None"""
+    header = request_headers.get("range")
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    if_range = request_headers.get("if-range")
+    if if_range is not None and if_range.strip() != etag:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text == "":
+            # 后缀区间：最后 N 个字节
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def validator_headers(etag: Optional[str], last_modified: Optional[float] = None) -> dict:
+    headers = {"Accept-Ranges": "bytes"}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _not_modified(headers: dict) -> Response:
+    # 304 只带缓存相关的头，不带实体头
+    keep = {"cache-control", "etag", "last-modified", "vary", "content-location", "expires"}
+    return Response(status_code=304, headers={k: v for k, v in headers.items() if k.lower() in keep})
+
+
+def _unsatisfiable(size: int) -> Response:
+    return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+
+def bytes_response(request_headers: Mapping[str, str], content: bytes, media_type: str, headers: dict,
+                   etag: Optional[str] = None, last_modified: Optional[float] = None) -> Response:
+    """内存中的内容：处理 304 和 Range 后返回"""
+    etag = etag or content_etag(content)
+    headers = {**headers, **validator_headers(etag, last_modified)}
+    if is_not_modified(request_headers, etag, last_modified):
+        return _not_modified(headers)
+    try:
+        byte_range = parse_range(request_headers, len(content), etag)
+    except RangeNotSatisfiable:
+        return _unsatisfiable(len(content))
+    if byte_range is None:
+        return Response(content=content, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+    return Response(content=content[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+
+
+async def _iter_file(path: str, start: int, end: int):
+    async with await anyio.open_file(path, mode="rb") as file:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request_headers: Mapping[str, str], path: str, size: int, media_type: str, headers: dict,
+                  etag: str, full_response, last_modified: Optional[float] = None) -> Response:
+    """磁盘上的内容：304 和 206 在这里处理，完整内容由 full_response(headers) 生成（例如零拷贝文件响应）"""
+    headers = {**headers, **validator_headers(etag, last_modified)}
+    if is_not_modified(request_headers, etag, last_modified):
+        return _not_modified(headers)
+    try:
+        byte_range = parse_range(request_headers, size, etag)
+    except RangeNotSatisfiable:
+        return _unsatisfiable(size)
+    if byte_range is None:
+        return full_response(headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file(path, start, end), status_code=206, media_type=media_type, headers=headers)
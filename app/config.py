@@ -22,18 +22,118 @@ class Config:
     APP_PORT = int(os.getenv("APP_PORT", "8000"))
     APP_DEBUG = os.getenv("APP_DEBUG", "false").lower() == "true"
     
+    # 数据库访问模式: sync（pymysql + 线程池）或 async（asyncmy + AsyncSession），便于逐步切换
+    DB_MODE = os.getenv("DB_MODE", "sync").lower()
+    
+    # 数据库后端: mysql 或 sqlite（单机/边缘部署，省去访问数据库服务器的网络开销）
+    DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "./data/jiansou.db")
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 内存映射I/O大小（字节）
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # 等待写锁的超时（毫秒）
+    SQLITE_READER_POOL_SIZE = int(os.getenv("SQLITE_READER_POOL_SIZE", "8"))  # 只读连接池大小
+    
+    @classmethod
+    def is_sqlite(cls):
+        """是否使用嵌入式SQLite后端"""
+        return cls.DB_BACKEND == "sqlite"
+    
+    @classmethod
+    def describe(cls):
+        """数据库位置描述，用于日志"""
+        if cls.is_sqlite():
+            return f"SQLite数据库: {cls.SQLITE_PATH}"
+        return f"MySQL数据库: {cls.MYSQL_HOST}:{cls.MYSQL_PORT}/{cls.MYSQL_DATABASE}"
+    
     @classmethod
     def get_database_url(cls):
+        if cls.is_sqlite():
+            return f"sqlite:///{cls.SQLITE_PATH}"
         if not cls.MYSQL_PASSWORD:
             raise ValueError("MYSQL_PASSWORD environment variable is required")
         return f"mysql+pymysql://{cls.MYSQL_USER}:{quote_plus(cls.MYSQL_PASSWORD)}@{cls.MYSQL_HOST}:{cls.MYSQL_PORT}/{cls.MYSQL_DATABASE}?charset=utf8mb4"
     
+    @classmethod
+    def get_async_database_url(cls):
+        """获取异步驱动的数据库连接URL"""
+        if cls.is_sqlite():
+            return f"sqlite+aiosqlite:///{cls.SQLITE_PATH}"
+        return cls.get_database_url().replace("mysql+pymysql://", "mysql+asyncmy://", 1)
+    
+    @classmethod
+    def is_async_mode(cls):
+        """是否使用异步数据库会话"""
+        return cls.DB_MODE == "async"
+    
+    # 只读副本配置：逗号分隔的 host[:port]，与主库共用账号和库名；为空时所有请求走主库
+    MYSQL_REPLICA_HOSTS = [h.strip() for h in os.getenv("MYSQL_REPLICA_HOSTS", "").split(",") if h.strip()]
+    REPLICA_STRATEGY = os.getenv("REPLICA_STRATEGY", "round_robin").lower()  # round_robin 或 latency
+    REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))  # 写入后该用户读主库的时长（秒）
+    REPLICA_COOLDOWN = float(os.getenv("REPLICA_COOLDOWN", "30"))  # 副本出错后暂停使用的时长（秒）
+    
+    @classmethod
+    def get_replica_urls(cls):
+        """获取只读副本的数据库连接URL列表"""
+        urls = []
+        for host in cls.MYSQL_REPLICA_HOSTS:
+            hostname, _, port = host.partition(":")
+            urls.append(
+                f"mysql+pymysql://{cls.MYSQL_USER}:{quote_plus(cls.MYSQL_PASSWORD)}@{hostname}:{port or cls.MYSQL_PORT}/{cls.MYSQL_DATABASE}?charset=utf8mb4"
+            )
+        return urls
+
+    # 分片配置：逗号分隔的附加分片连接URL，按顺序编号为 1、2、...（分片 0 为主库，只能在末尾追加）
+    # 用户表始终在主库；快速链接、搜索引擎和搜索历史按用户所在分片存放
+    SHARD_URLS = [u.strip() for u in os.getenv("DB_SHARD_URLS", "").split(",") if u.strip()]
+    SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "64"))  # 一致性哈希环上每个分片的虚拟节点数
+    SHARD_ID_SPACING = int(os.getenv("SHARD_ID_SPACING", "100000000"))  # 分片 n 的自增主键从 n * 该值开始，保证跨分片唯一
+    SHARD_MOVE_GRACE = float(os.getenv("SHARD_MOVE_GRACE", "5"))  # 迁移用户时等待进行中请求结束的时间（秒）
+
+    @classmethod
+    def get_shard_urls(cls):
+        """获取附加分片的连接URL列表"""
+        return list(cls.SHARD_URLS)
+
+    @classmethod
+    def get_async_shard_urls(cls):
+        """获取附加分片的异步驱动连接URL列表"""
+        return [
+            url.replace("mysql+pymysql://", "mysql+asyncmy://", 1).replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+            for url in cls.SHARD_URLS
+        ]
+
     # 数据库引擎配置
     POOL_PRE_PING = True
     POOL_RECYCLE = 3600
-    POOL_SIZE = 10
-    MAX_OVERFLOW = 20
+    POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # 从连接池获取连接的超时（秒）
     ECHO = False
+    
+    # 同步路由线程池上限；0 表示自动取连接池容量，使每个工作线程都能拿到连接
+    THREAD_LIMIT = int(os.getenv("DB_THREAD_LIMIT", "0"))
+    REQUEST_QUEUE_TIMEOUT = float(os.getenv("REQUEST_QUEUE_TIMEOUT", "10"))  # 请求在准入队列中的最长等待（秒）
+    
+    @classmethod
+    def get_pool_capacity(cls):
+        """可同时借出的连接数（SQLite 为写连接加只读连接池）"""
+        if cls.is_sqlite():
+            return 1 + cls.SQLITE_READER_POOL_SIZE
+        return cls.POOL_SIZE + cls.MAX_OVERFLOW
+    
+    @classmethod
+    def get_thread_limit(cls):
+        """同步路由的线程上限"""
+        if cls.THREAD_LIMIT <= 0:
+            return cls.get_pool_capacity()
+        if cls.is_sqlite():
+            # SQLite 的写连接固定为 1，线程数不能超过读写连接总数
+            return min(cls.THREAD_LIMIT, cls.get_pool_capacity())
+        return cls.THREAD_LIMIT
+    
+    @classmethod
+    def get_max_overflow(cls):
+        """溢出连接数随显式设置的线程上限增长，保证每个线程都能拿到连接"""
+        return max(cls.MAX_OVERFLOW, cls.get_thread_limit() - cls.POOL_SIZE)
 
 
 class AppConfig:
@@ -97,6 +197,111 @@ class WebDAVConfig:
         return f"{cls.URL.rstrip('/')}/{cls.AVATAR_PATH}{filename}"
 
 
+class HTTPClientConfig:
+    """上游 HTTP 客户端配置（壁纸代理共用的连接池）"""
+    MAX_CONNECTIONS = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "100"))  # 连接总数上限
+    MAX_KEEPALIVE = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "20"))  # 保持的空闲连接数上限
+    KEEPALIVE_EXPIRY = float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY", "60"))  # 空闲连接保留时间（秒）
+    PER_HOST_CONNECTIONS = int(os.getenv("HTTP_CLIENT_PER_HOST_CONNECTIONS", "10"))  # 单个上游主机的并发请求上限
+    CONNECT_TIMEOUT = float(os.getenv("HTTP_CLIENT_CONNECT_TIMEOUT", "5"))  # 建立连接超时（秒）
+    READ_TIMEOUT = float(os.getenv("HTTP_CLIENT_READ_TIMEOUT", "15"))  # 两次读取之间的超时（秒）
+    WRITE_TIMEOUT = float(os.getenv("HTTP_CLIENT_WRITE_TIMEOUT", "10"))  # 发送请求超时（秒）
+    POOL_TIMEOUT = float(os.getenv("HTTP_CLIENT_POOL_TIMEOUT", "5"))  # 等待空闲连接超时（秒）
+    HTTP2 = os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true"  # 安装 h2 时启用 HTTP/2
+
+
+class WallpaperConfig:
+    """壁纸代理配置"""
+    MAX_IMAGE_BYTES = int(os.getenv("WALLPAPER_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))  # 单张上游图片的大小上限（字节）
+    STREAM_CHUNK_SIZE = int(os.getenv("WALLPAPER_STREAM_CHUNK_SIZE", "65536"))  # 转发时每块读取的字节数
+    CACHE_ENABLED = os.getenv("WALLPAPER_CACHE_ENABLED", "true").lower() == "true"  # 是否缓存壁纸
+    CACHE_TTL = int(os.getenv("WALLPAPER_CACHE_TTL", "3600"))  # 缓存有效期（秒），与响应头 max-age 一致
+    CACHE_MEMORY_BYTES = int(os.getenv("WALLPAPER_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))  # 内存层容量（字节）
+    CACHE_DISK_BYTES = int(os.getenv("WALLPAPER_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))  # 磁盘层容量（字节），0 表示不使用磁盘
+    CACHE_DIR = os.getenv("WALLPAPER_CACHE_DIR", "./data/wallpaper_cache")  # 磁盘层目录
+    PREFETCH_ENABLED = os.getenv("WALLPAPER_PREFETCH_ENABLED", "true").lower() == "true"  # 是否后台预取随机壁纸
+    PREFETCH_MIN = int(os.getenv("WALLPAPER_PREFETCH_MIN", "1"))  # 每个预取池至少保持的图片数
+    PREFETCH_MAX = int(os.getenv("WALLPAPER_PREFETCH_MAX", "8"))  # 每个预取池最多保持的图片数
+    PREFETCH_INITIAL = int(os.getenv("WALLPAPER_PREFETCH_INITIAL", "2"))  # 尚无需求统计时的目标数
+    PREFETCH_MAX_BYTES = int(os.getenv("WALLPAPER_PREFETCH_MAX_BYTES", str(64 * 1024 * 1024)))  # 全部预取池的内存上限（字节）
+    PREFETCH_IDLE_TTL = float(os.getenv("WALLPAPER_PREFETCH_IDLE_TTL", "1800"))  # 无请求多久后清空预取池（秒）
+    PREFETCH_CONCURRENCY = int(os.getenv("WALLPAPER_PREFETCH_CONCURRENCY", "4"))  # 同时进行的预取下载数
+    PIPELINE_ENABLED = os.getenv("WALLPAPER_PIPELINE_ENABLED", "true").lower() == "true"  # 是否按档位缩放并转码
+    PIPELINE_WORKERS = int(os.getenv("WALLPAPER_PIPELINE_WORKERS", str(min(4, os.cpu_count() or 1))))  # 转码进程数，0 表示在线程池中执行
+    WEBP_QUALITY = int(os.getenv("WALLPAPER_WEBP_QUALITY", "80"))  # WebP 编码质量
+    AVIF_QUALITY = int(os.getenv("WALLPAPER_AVIF_QUALITY", "60"))  # AVIF 编码质量（需安装 pillow-avif-plugin）
+    JPEG_QUALITY = int(os.getenv("WALLPAPER_JPEG_QUALITY", "85"))  # 不支持新格式时的 JPEG 编码质量
+    PLACEHOLDER_ENABLED = os.getenv("WALLPAPER_PLACEHOLDER_ENABLED", "true").lower() == "true"  # 是否为缓存的壁纸生成低质量占位图
+    PLACEHOLDER_SIZE = int(os.getenv("WALLPAPER_PLACEHOLDER_SIZE", "32"))  # 占位图最长边（像素）
+    PLACEHOLDER_QUALITY = int(os.getenv("WALLPAPER_PLACEHOLDER_QUALITY", "30"))  # 占位图 WebP 编码质量
+    PLACEHOLDER_MAX_ENTRIES = int(os.getenv("WALLPAPER_PLACEHOLDER_MAX_ENTRIES", "4096"))  # 内存中保留的占位图数量
+    PLACEHOLDER_DISK_MAX_ENTRIES = int(os.getenv("WALLPAPER_PLACEHOLDER_DISK_MAX_ENTRIES", "20000"))  # 磁盘上保留的占位图文件数
+    FALLBACK_ORDER = [name.strip() for name in os.getenv("WALLPAPER_FALLBACK_ORDER", "picsum,bing,unsplash").split(",") if name.strip()]  # 后备壁纸源顺序
+    ATTEMPT_TIMEOUT = float(os.getenv("WALLPAPER_ATTEMPT_TIMEOUT", "8"))  # 单个壁纸源等待响应头的超时（秒）
+    HEDGE_ENABLED = os.getenv("WALLPAPER_HEDGE_ENABLED", "true").lower() == "true"  # 是否对慢请求发起对冲请求
+    HEDGE_MIN_DELAY = float(os.getenv("WALLPAPER_HEDGE_MIN_DELAY", "0.2"))  # 对冲等待时间下限（秒）
+    HEDGE_MAX_DELAY = float(os.getenv("WALLPAPER_HEDGE_MAX_DELAY", "3"))  # 对冲等待时间上限（秒）
+    HEDGE_DEFAULT_DELAY = float(os.getenv("WALLPAPER_HEDGE_DEFAULT_DELAY", "1.5"))  # 尚无延迟样本时的对冲等待时间（秒）
+    BREAKER_FAILURES = int(os.getenv("WALLPAPER_BREAKER_FAILURES", "3"))  # 连续失败多少次打开熔断器
+    BREAKER_ERROR_RATE = float(os.getenv("WALLPAPER_BREAKER_ERROR_RATE", "0.5"))  # 最近请求错误率达到多少时打开熔断器
+    BREAKER_WINDOW = int(os.getenv("WALLPAPER_BREAKER_WINDOW", "20"))  # 统计错误率的最近请求数
+    BREAKER_OPEN_SECONDS = float(os.getenv("WALLPAPER_BREAKER_OPEN_SECONDS", "60"))  # 熔断持续时间（秒），之后放行一个探测请求
+    BING_CATALOG_PATH = os.getenv("WALLPAPER_BING_CATALOG_PATH", "./data/bing_catalog.json")  # 必应壁纸目录文件
+    BING_CATALOG_DAYS = int(os.getenv("WALLPAPER_BING_CATALOG_DAYS", "45"))  # 目录保留的天数
+    BING_MARKET = os.getenv("WALLPAPER_BING_MARKET", "zh-CN")  # 必应市场
+    BING_UTC_OFFSET = float(os.getenv("WALLPAPER_BING_UTC_OFFSET", "8"))  # 必应市场换图时区（UTC 偏移小时数）
+    BING_RETRY_INTERVAL = float(os.getenv("WALLPAPER_BING_RETRY_INTERVAL", "600"))  # 刷新失败或尚未换图时的重试间隔（秒）
+
+
+class LinkHealthConfig:
+    """快速链接健康检查配置"""
+    ENABLED = os.getenv("LINK_HEALTH_ENABLED", "false").lower() == "true"  # 是否启用后台巡检
+    INTERVAL = int(os.getenv("LINK_HEALTH_INTERVAL", "86400"))  # 后台巡检间隔（秒）
+    MAX_CONCURRENCY = int(os.getenv("LINK_HEALTH_MAX_CONCURRENCY", "50"))  # 全局并发上限
+    PER_HOST_CONCURRENCY = int(os.getenv("LINK_HEALTH_PER_HOST_CONCURRENCY", "2"))  # 单个主机并发上限
+    TIMEOUT = float(os.getenv("LINK_HEALTH_TIMEOUT", "10"))  # 单次请求超时（秒）
+    CACHE_TTL = int(os.getenv("LINK_HEALTH_CACHE_TTL", "3600"))  # 检查结果缓存时间（秒）
+    CACHE_MAX_ENTRIES = int(os.getenv("LINK_HEALTH_CACHE_MAX_ENTRIES", "10000"))  # 检查结果缓存的最大条数
+    BATCH_SIZE = int(os.getenv("LINK_HEALTH_BATCH_SIZE", "500"))  # 每批读取/写回的行数
+    MAX_REDIRECTS = int(os.getenv("LINK_HEALTH_MAX_REDIRECTS", "5"))  # 最多跟随的重定向次数
+    # 是否允许检查内网、回环、链路本地（含云元数据）地址；默认拒绝，防止被用来探测内网
+    ALLOW_PRIVATE = os.getenv("LINK_HEALTH_ALLOW_PRIVATE", "false").lower() == "true"
+
+
+class ClickCounterConfig:
+    """快速链接点击计数配置"""
+    FLUSH_INTERVAL = int(os.getenv("CLICK_FLUSH_INTERVAL", "30"))  # 计数刷写间隔（秒）
+
+
+class AccountDeletionConfig:
+    """账户删除配置"""
+    BATCH_SIZE = int(os.getenv("ACCOUNT_DELETE_BATCH_SIZE", "1000"))  # 每批删除的行数
+    BATCH_PAUSE = float(os.getenv("ACCOUNT_DELETE_BATCH_PAUSE", "0.05"))  # 两批之间让出的时间（秒）
+
+
+class MigrationConfig:
+    """数据迁移配置（migrate.py）"""
+    BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))  # 回填每批按主键区间更新的行数
+    BATCH_PAUSE = float(os.getenv("MIGRATION_BATCH_PAUSE", "0.1"))  # 两批之间至少休眠的时间（秒）
+    THROTTLE_RATIO = float(os.getenv("MIGRATION_THROTTLE_RATIO", "1.0"))  # 每批休眠时间不少于该批耗时乘以此比例
+    LOCK_WAIT_TIMEOUT = int(os.getenv("MIGRATION_LOCK_WAIT_TIMEOUT", "5"))  # DDL 等待元数据锁的超时（秒），超时即放弃，避免堵住业务查询
+    PROGRESS_INTERVAL = float(os.getenv("MIGRATION_PROGRESS_INTERVAL", "10"))  # 输出进度日志的间隔（秒）
+
+
+class SQLMetricsConfig:
+    """SQL 请求级统计配置"""
+    ENABLED = os.getenv("SQL_METRICS_ENABLED", "true").lower() == "true"  # 是否统计每个请求的SQL
+    SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))  # 慢查询阈值（毫秒）
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))  # 同一请求内相同语句重复次数达到该值视为 N+1
+
+
+class MetricsConfig:
+    """运行指标接口配置"""
+    # 是否开放 /api/metrics/*（连接池、SQL 耗时、各路由统计等内部信息），默认关闭
+    ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    TOKEN = os.getenv("METRICS_TOKEN", "")  # 设置后访问指标接口需携带 Authorization: Bearer <METRICS_TOKEN>
+
+
 class DefaultData:
     """默认数据配置"""
     
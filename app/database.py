@@ -1,47 +1,220 @@
 """
 数据库连接和会话管理模块
 """
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import Request
 import logging
+import os
 import time
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional
 
 from .config import Config as DatabaseConfig, AppConfig
+from .instrumentation import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_registry
+from .replicas import READ_ONLY, ReadYourWritesTracker, ReplicaSet, RoutingSession
+from .sharding import PRIMARY_SHARD, ShardedSession, ShardMap
 
 logger = logging.getLogger(__name__)
 
 # 全局变量
 engine = None
 SessionLocal = None
+async_engine = None
+AsyncSessionLocal = None
+replica_set = None
+async_replica_engines = []
+shard_map = None
+async_shard_map = None
+async_shard_engines = {}
 Base = declarative_base()
 
 
+def _pool_class(engine_factory):
+    """带借出等待统计的连接池类"""
+    return InstrumentedAsyncQueuePool if engine_factory is create_async_engine else InstrumentedQueuePool
+
+
+def _engine_options(engine_factory=create_engine) -> dict:
+    """主库和副本共用的引擎参数"""
+    return dict(
+        poolclass=_pool_class(engine_factory),
+        pool_pre_ping=DatabaseConfig.POOL_PRE_PING,
+        pool_recycle=DatabaseConfig.POOL_RECYCLE,
+        pool_size=DatabaseConfig.POOL_SIZE,
+        max_overflow=DatabaseConfig.get_max_overflow(),
+        pool_timeout=DatabaseConfig.POOL_TIMEOUT,
+        echo=DatabaseConfig.ECHO
+    )
+
+
+def _register_pools(prefix: str, primary, replicas, shards: dict = None):
+    """登记连接池，供 /api/metrics/pool 读取"""
+    for name, shard in (shards or {}).items():
+        pool_registry.register(f"{prefix}shard-{name}", shard)
+    if DatabaseConfig.is_sqlite():
+        pool_registry.register(f"{prefix}sqlite-writer", primary)
+        pool_registry.register(f"{prefix}sqlite-reader", replicas[0])
+        return
+    pool_registry.register(f"{prefix}primary", primary)
+    for index, replica in enumerate(replicas):
+        pool_registry.register(f"{prefix}replica-{index}", replica)
+
+
+def _create_shard_engines(engine_factory, urls) -> dict:
+    """为配置的附加分片创建引擎，按顺序命名为 1、2、..."""
+    engines = {}
+    for index, url in enumerate(urls, start=1):
+        if url.startswith("sqlite"):
+            # 本地 SQLite 文件可作为分片的替身，便于开发和测试
+            shard = engine_factory(url, connect_args={"check_same_thread": False})
+            _apply_sqlite_pragmas(getattr(shard, "sync_engine", shard), read_only=False)
+        else:
+            shard = engine_factory(url, **_engine_options(engine_factory))
+        engines[str(index)] = shard
+    if engines:
+        logger.info(f"已配置 {len(engines)} 个附加分片")
+    return engines
+
+
+def _session_options(replicas: ReplicaSet, tracker, shards: Optional[ShardMap]) -> dict:
+    """按是否配置副本和分片选择会话类"""
+    if shards is not None:
+        return {"class_": ShardedSession, "shard_map": shards, "replicas": replicas or None, "tracker": tracker}
+    if replicas:
+        return {"class_": RoutingSession, "replicas": replicas, "tracker": tracker}
+    return {}
+
+
+def _create_replica_engines(engine_factory, urls) -> list:
+    """为配置的只读副本创建引擎"""
+    engines = [engine_factory(url, **_engine_options(engine_factory)) for url in urls]
+    if engines:
+        logger.info(f"已配置 {len(engines)} 个只读副本，选择策略: {DatabaseConfig.REPLICA_STRATEGY}")
+    return engines
+
+
+def _apply_sqlite_pragmas(engine, read_only: bool):
+    """为SQLite连接设置WAL、同步级别、内存映射和忙等待超时"""
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={DatabaseConfig.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={DatabaseConfig.SQLITE_BUSY_TIMEOUT}")
+        # SQLite 默认不检查外键，开启后 ON DELETE CASCADE 才会生效
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _create_sqlite_engines(engine_factory, url):
+    """创建SQLite的写引擎（单连接，串行化写入）和只读连接池引擎
+
+    WAL 模式下读不阻塞写，只读连接池承担 GET 请求；写入排队等待唯一的写连接，
+    而不是在多个连接间争抢文件锁。
+    """
+    directory = os.path.dirname(os.path.abspath(DatabaseConfig.SQLITE_PATH))
+    os.makedirs(directory, exist_ok=True)
+    options = dict(
+        connect_args={"check_same_thread": False, "timeout": DatabaseConfig.SQLITE_BUSY_TIMEOUT / 1000},
+        poolclass=_pool_class(engine_factory),
+        max_overflow=0,
+        pool_timeout=DatabaseConfig.POOL_TIMEOUT,
+        echo=DatabaseConfig.ECHO
+    )
+    writer = engine_factory(url, pool_size=1, **options)
+    reader = engine_factory(url, pool_size=DatabaseConfig.SQLITE_READER_POOL_SIZE, **options)
+    _apply_sqlite_pragmas(getattr(writer, "sync_engine", writer), read_only=False)
+    _apply_sqlite_pragmas(getattr(reader, "sync_engine", reader), read_only=True)
+    return writer, reader
+
+
 def setup_database() -> bool:
     """设置数据库连接"""
-    global engine, SessionLocal
+    global engine, SessionLocal, replica_set, shard_map
     
     database_url = DatabaseConfig.get_database_url()
-    logger.info(f"连接MySQL数据库: {DatabaseConfig.MYSQL_HOST}:{DatabaseConfig.MYSQL_PORT}/{DatabaseConfig.MYSQL_DATABASE}")
+    logger.info(f"连接{DatabaseConfig.describe()}")
 
     try:
-        engine = create_engine(
-            database_url,
-            pool_pre_ping=DatabaseConfig.POOL_PRE_PING,
-            pool_recycle=DatabaseConfig.POOL_RECYCLE,
-            pool_size=DatabaseConfig.POOL_SIZE,
-            max_overflow=DatabaseConfig.MAX_OVERFLOW,
-            echo=DatabaseConfig.ECHO
-        )
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        logger.info("MySQL数据库引擎创建成功")
+        if DatabaseConfig.is_sqlite():
+            # 读连接与写连接访问同一个文件，提交后立即可见，无需写后读主库
+            engine, reader = _create_sqlite_engines(create_engine, database_url)
+            replica_set = ReplicaSet([reader])
+            tracker = ReadYourWritesTracker(window=0)
+        else:
+            engine = create_engine(database_url, **_engine_options(create_engine))
+            replica_set = ReplicaSet(
+                _create_replica_engines(create_engine, DatabaseConfig.get_replica_urls()),
+                strategy=DatabaseConfig.REPLICA_STRATEGY
+            )
+            tracker = None
+        shard_engines = _create_shard_engines(create_engine, DatabaseConfig.get_shard_urls())
+        shard_map = ShardMap({PRIMARY_SHARD: engine, **shard_engines}) if shard_engines else None
+        _register_pools("", engine, replica_set.engines, shard_engines)
+        # 写入后直接用内存中的对象返回响应，提交后不再过期属性，避免序列化时再查一次
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False,
+                                    **_session_options(replica_set, tracker, shard_map))
+        logger.info("数据库引擎创建成功")
         return True
     except Exception as e:
-        logger.error(f"MySQL数据库引擎创建失败: {e}")
+        logger.error(f"数据库引擎创建失败: {e}")
         return False
 
 
+def setup_async_database() -> bool:
+    """设置异步数据库连接（DB_MODE=async 时使用）"""
+    global async_engine, AsyncSessionLocal, async_replica_engines, async_shard_map, async_shard_engines
+    
+    database_url = DatabaseConfig.get_async_database_url()
+    logger.info(f"连接{DatabaseConfig.describe()}（异步）")
+
+    try:
+        if DatabaseConfig.is_sqlite():
+            async_engine, reader = _create_sqlite_engines(create_async_engine, database_url)
+            async_replica_engines = [reader]
+            tracker = ReadYourWritesTracker(window=0)
+        else:
+            async_engine = create_async_engine(database_url, **_engine_options(create_async_engine))
+            async_replica_engines = _create_replica_engines(
+                create_async_engine,
+                [url.replace("mysql+pymysql://", "mysql+asyncmy://", 1) for url in DatabaseConfig.get_replica_urls()]
+            )
+            tracker = None
+        async_shard_engines = _create_shard_engines(create_async_engine, DatabaseConfig.get_async_shard_urls())
+        _register_pools("async-", async_engine, async_replica_engines, async_shard_engines)
+        # 异步会话的路由发生在底层同步会话中，因此副本和分片都使用同步代理引擎
+        replicas = ReplicaSet([e.sync_engine for e in async_replica_engines], strategy=DatabaseConfig.REPLICA_STRATEGY)
+        async_shard_map = ShardMap({
+            PRIMARY_SHARD: async_engine.sync_engine,
+            **{name: shard.sync_engine for name, shard in async_shard_engines.items()}
+        }) if async_shard_engines else None
+        options = _session_options(replicas, tracker, async_shard_map)
+        if "class_" in options:
+            options["sync_session_class"] = options.pop("class_")
+        # 异步会话中访问过期属性会触发隐式IO，因此提交后不过期对象
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, **options)
+        logger.info("异步数据库引擎创建成功")
+        return True
+    except Exception as e:
+        logger.error(f"异步数据库引擎创建失败: {e}")
+        return False
+
+
+async def dispose_async_database():
+    """关闭异步数据库连接池"""
+    if async_engine is not None:
+        await async_engine.dispose()
+    for replica in async_replica_engines:
+        await replica.dispose()
+    for shard in async_shard_engines.values():
+        await shard.dispose()
+
+
 def create_database_tables() -> bool:
     """创建数据库表"""
     global engine
@@ -67,15 +240,80 @@ def create_database_tables() -> bool:
     return False
 
 
-def get_db() -> Generator[Session, None, None]:
-    """获取数据库会话"""
-    db = SessionLocal()
+def _is_read_only_request(request: Request) -> bool:
+    """GET/HEAD 请求只读，可以路由到只读副本"""
+    return request.method in ("GET", "HEAD")
+
+
+class LazySession:
+    """请求级会话代理：首次使用时才创建会话
+
+    未登录访问快速链接、搜索引擎等端点时直接返回默认数据，不会创建会话。
+    创建前写入 info 的键值会在创建时带入真实会话。
+    """
+
+    def __init__(self, factory, info: dict = None):
+        self._factory = factory
+        self._session = None
+        self._info = dict(info or {})
+
+    @property
+    def created(self) -> bool:
+        """是否已创建真实会话"""
+        return self._session is not None
+
+    @property
+    def info(self) -> dict:
+        return self._session.info if self._session is not None else self._info
+
+    @property
+    def sync_session(self) -> Session:
+        """底层同步会话（供 replicas 模块判断读写路由）"""
+        session = self._get_session()
+        return getattr(session, "sync_session", session)
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = self._factory()
+            self._session.info.update(self._info)
+        return self._session
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self._get_session(), name)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class LazyAsyncSession(LazySession):
+    """异步会话代理：首次使用时才创建会话"""
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+def get_db(request: Request) -> Generator[Session, None, None]:
+    """获取数据库会话（首次使用时才创建）"""
+    db = LazySession(SessionLocal, {READ_ONLY: _is_read_only_request(request)})
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """获取异步数据库会话（首次使用时才创建）"""
+    db = LazyAsyncSession(AsyncSessionLocal, {READ_ONLY: _is_read_only_request(request)})
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
 def test_database_connection() -> bool:
     """测试数据库连接"""
     try:
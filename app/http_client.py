@@ -0,0 +1,199 @@
+"""
+共享 HTTP 客户端
+壁纸上游（Unsplash、Picsum、Bing）的请求共用一个应用级 httpx.AsyncClient：
+保活连接跨请求复用，省去每次请求的 DNS、TCP 和 TLS 握手；单个主机的并发连接有上限；
+安装了 h2 时启用 HTTP/2。客户端由 lifespan 管理，首次使用时才创建（不拖慢冷启动），应用关闭时关闭。
+"""
+import asyncio
+import importlib.util
+import logging
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Optional
+
+from .config import HTTPClientConfig
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def http2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2"""
+    return importlib.util.find_spec("h2") is not None
+
+
+class _HostSlot:
+    """单个主机的连接名额与统计"""
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.requests = 0
+
+
+def _per_host_transport(transport, limit: int):
+    """包装 httpx 传输层：每个主机同时进行的请求数不超过 limit
+
+    名额在响应体读完或关闭时才归还，流式读取的大文件也计入占用。
+    """
+    import httpx
+
+    class ReleasingStream(httpx.AsyncByteStream):
+        def __init__(self, stream, release):
+            self._stream = stream
+            self._release = release
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                yield chunk
+
+        async def aclose(self):
+            try:
+                await self._stream.aclose()
+            finally:
+                self._release()
+
+    class PerHostLimitTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self.inner = transport
+            self.hosts: Dict[str, _HostSlot] = {}
+
+        async def handle_async_request(self, request):
+            host = request.url.netloc.decode("ascii")
+            slot = self.hosts.setdefault(host, _HostSlot(limit))
+            slot.waiting += 1
+            try:
+                await slot.semaphore.acquire()
+            finally:
+                slot.waiting -= 1
+            slot.active += 1
+            slot.requests += 1
+            released = False
+
+            def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    slot.active -= 1
+                    slot.semaphore.release()
+
+            try:
+                response = await self.inner.handle_async_request(request)
+            except BaseException:
+                release()
+                raise
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=ReleasingStream(response.stream, release),
+                extensions=response.extensions,
+            )
+
+        async def aclose(self):
+            await self.inner.aclose()
+
+    return PerHostLimitTransport()
+
+
+class SharedHTTPClient:
+    """应用级 HTTP 客户端"""
+
+    def __init__(self, transport=None):
+        # 测试时可传入 httpx.MockTransport 代替真实网络传输层
+        self.inner_transport = transport
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._transport = None
+        self.created_at: Optional[float] = None
+        self.clients_created = 0
+
+    @property
+    def started(self) -> bool:
+        return self._client is not None
+
+    def get(self) -> "httpx.AsyncClient":
+        """返回共享客户端，首次调用时创建"""
+        if self._client is None:
+            import httpx
+
+            http2 = HTTPClientConfig.HTTP2 and http2_available()
+            limits = httpx.Limits(
+                max_connections=HTTPClientConfig.MAX_CONNECTIONS,
+                max_keepalive_connections=HTTPClientConfig.MAX_KEEPALIVE,
+                keepalive_expiry=HTTPClientConfig.KEEPALIVE_EXPIRY,
+            )
+            timeout = httpx.Timeout(
+                connect=HTTPClientConfig.CONNECT_TIMEOUT,
+                read=HTTPClientConfig.READ_TIMEOUT,
+                write=HTTPClientConfig.WRITE_TIMEOUT,
+                pool=HTTPClientConfig.POOL_TIMEOUT,
+            )
+            self._transport = _per_host_transport(
+                self.inner_transport or httpx.AsyncHTTPTransport(limits=limits, http2=http2, retries=1),
+                HTTPClientConfig.PER_HOST_CONNECTIONS,
+            )
+            self._client = httpx.AsyncClient(transport=self._transport, timeout=timeout, follow_redirects=True)
+            self.created_at = time.time()
+            self.clients_created += 1
+            logger.info(f"共享HTTP客户端已创建（HTTP/2: {'启用' if http2 else '未启用'}）")
+        return self._client
+
+    async def aclose(self):
+        """关闭客户端和全部保活连接"""
+        if self._client is not None:
+            client, self._client, self._transport = self._client, None, None
+            await client.aclose()
+            logger.info("共享HTTP客户端已关闭")
+
+    def stats(self) -> dict:
+        """连接池统计：按主机的连接数（空闲/使用中/HTTP版本）和请求占用"""
+        result = {
+            "started": self.started,
+            "http2_enabled": bool(self.started and HTTPClientConfig.HTTP2 and http2_available()),
+            "max_connections": HTTPClientConfig.MAX_CONNECTIONS,
+            "max_keepalive_connections": HTTPClientConfig.MAX_KEEPALIVE,
+            "per_host_limit": HTTPClientConfig.PER_HOST_CONNECTIONS,
+            "connections": 0,
+            "idle": 0,
+            "queued_requests": 0,
+            "hosts": [],
+        }
+        if self._transport is None:
+            return result
+
+        # httpcore 连接池没有公开统计接口，读取其内部连接列表
+        pool = getattr(self._transport.inner, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        per_host: Dict[str, Counter] = {}
+        for connection in connections:
+            origin = getattr(connection, "_origin", None)
+            host = origin.host.decode("ascii") if origin is not None else "unknown"
+            if origin is not None and origin.port not in (None, 80, 443):
+                host = f"{host}:{origin.port}"
+            counter = per_host.setdefault(host, Counter())
+            counter["connections"] += 1
+            counter["idle"] += 1 if connection.is_idle() else 0
+            counter["http2"] += 1 if "HTTP/2" in connection.info() else 0
+        result["connections"] = len(connections)
+        result["idle"] = sum(counter["idle"] for counter in per_host.values())
+        result["queued_requests"] = len(getattr(pool, "_requests", []) or [])
+
+        for host in sorted(set(per_host) | set(self._transport.hosts)):
+            counter = per_host.get(host, Counter())
+            slot = self._transport.hosts.get(host)
+            result["hosts"].append({
+                "host": host,
+                "connections": counter["connections"],
+                "idle": counter["idle"],
+                "http2_connections": counter["http2"],
+                "active_requests": slot.active if slot else 0,
+                "waiting_requests": slot.waiting if slot else 0,
+                "total_requests": slot.requests if slot else 0,
+            })
+        return result
+
+
+# 进程级共享的上游 HTTP 客户端
+http_client = SharedHTTPClient()
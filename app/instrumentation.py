@@ -0,0 +1,301 @@
+"""
+SQL 请求级统计模块
+通过 SQLAlchemy 游标事件把每条语句记入当前请求的收集器，统计每个路由的查询数和数据库耗时，
+记录慢查询的调用位置，并把同一请求内重复出现的相同语句标记为疑似 N+1
+"""
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .config import SQLMetricsConfig
+
+logger = logging.getLogger(__name__)
+
+# 当前请求的收集器；anyio 在线程池中运行同步代码时会复制上下文，因此同步路由中的查询也能记到这里
+_current_stats: ContextVar[Optional["RequestQueryStats"]] = ContextVar("sql_request_stats", default=None)
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%s\s*,)+\s*%s\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """归一化语句形状：压缩空白，把展开的 IN 参数列表折叠为一个占位符"""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def _call_site() -> str:
+    """找到发起查询的应用代码位置"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if frame.filename.startswith(_APP_DIR) and not frame.filename.endswith(("instrumentation.py", "replicas.py")):
+            return f"{os.path.relpath(frame.filename, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}"
+    return "未知位置"
+
+
+class RequestQueryStats:
+    """单个请求内的SQL统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.slow = 0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float, slow: bool):
+        with self._lock:
+            self.count += 1
+            self.db_time += elapsed
+            self.shapes[statement_shape(statement)] += 1
+            if slow:
+                self.slow += 1
+
+    def repeated_shapes(self, threshold: Optional[int] = None) -> Dict[str, int]:
+        """返回重复次数达到阈值的语句形状"""
+        threshold = threshold or SQLMetricsConfig.N_PLUS_ONE_THRESHOLD
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+
+class SQLMetrics:
+    """按路由汇总的SQL统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, dict] = {}
+        self._observers: List[Callable[[str, RequestQueryStats], None]] = []
+
+    def record_request(self, route: str, stats: RequestQueryStats):
+        """汇总一个已完成请求的统计"""
+        repeated = stats.repeated_shapes()
+        for shape, n in repeated.items():
+            logger.warning(f"疑似 N+1 查询: {route} 中相同语句执行了 {n} 次: {shape[:300]}")
+
+        with self._lock:
+            route_stats = self._routes.setdefault(route, {
+                "requests": 0, "queries": 0, "max_queries": 0, "db_time": 0.0, "slow_queries": 0, "n_plus_one_requests": 0
+            })
+            route_stats["requests"] += 1
+            route_stats["queries"] += stats.count
+            route_stats["max_queries"] = max(route_stats["max_queries"], stats.count)
+            route_stats["db_time"] += stats.db_time
+            route_stats["slow_queries"] += stats.slow
+            route_stats["n_plus_one_requests"] += 1 if repeated else 0
+            observers = list(self._observers)
+
+        for observer in observers:
+            observer(route, stats)
+
+    def snapshot(self) -> List[dict]:
+        """返回各路由的统计，按总数据库耗时降序"""
+        with self._lock:
+            routes = {route: dict(values) for route, values in self._routes.items()}
+        result = []
+        for route, values in routes.items():
+            requests = values["requests"]
+            result.append({
+                "route": route,
+                "requests": requests,
+                "queries": values["queries"],
+                "avg_queries": round(values["queries"] / requests, 2),
+                "max_queries": values["max_queries"],
+                "db_time_ms": round(values["db_time"] * 1000, 3),
+                "avg_db_time_ms": round(values["db_time"] * 1000 / requests, 3),
+                "slow_queries": values["slow_queries"],
+                "n_plus_one_requests": values["n_plus_one_requests"],
+            })
+        return sorted(result, key=lambda item: item["db_time_ms"], reverse=True)
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._routes.clear()
+
+    @contextmanager
+    def observe(self):
+        """收集块内完成的每个请求的统计，供测试断言查询预算"""
+        requests: List[tuple] = []
+
+        def observer(route, stats):
+            requests.append((route, stats))
+
+        with self._lock:
+            self._observers.append(observer)
+        try:
+            yield requests
+        finally:
+            with self._lock:
+                self._observers.remove(observer)
+
+
+# 进程级SQL统计
+sql_metrics = SQLMetrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sql_metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sql_metrics_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    slow = elapsed * 1000 >= SQLMetricsConfig.SLOW_QUERY_MS
+    if slow:
+        logger.warning(f"慢查询 {elapsed * 1000:.1f}ms @ {_call_site()}: {statement_shape(statement)[:500]}")
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed, slow)
+
+
+def install_sql_instrumentation():
+    """在所有引擎上注册游标事件（重复调用无副作用）"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class PoolTelemetry:
+    """连接池借出等待时间与超时统计"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record_wait(self, elapsed: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+            self._recent.append(elapsed)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, timeouts, wait_total, wait_max = self.checkouts, self.timeouts, self.wait_total, self.wait_max
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_avg_ms": round(wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+            "wait_p95_ms": round(p95 * 1000, 3),
+            "wait_max_ms": round(wait_max * 1000, 3),
+        }
+
+
+class _TelemetryPoolMixin:
+    """记录每次借出连接的等待时间和超时次数"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.telemetry = PoolTelemetry()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.telemetry.record_timeout()
+            raise
+        self.telemetry.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，保留累计统计
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+
+class InstrumentedQueuePool(_TelemetryPoolMixin, QueuePool):
+    """带统计的同步连接池"""
+
+
+class InstrumentedAsyncQueuePool(_TelemetryPoolMixin, AsyncAdaptedQueuePool):
+    """带统计的异步连接池"""
+
+
+class PoolRegistry:
+    """登记各引擎，按需读取其连接池的实时状态"""
+
+    def __init__(self):
+        self._engines: Dict[str, Engine] = {}
+
+    def register(self, name: str, engine):
+        # 异步引擎的连接池挂在其同步代理引擎上
+        self._engines[name] = getattr(engine, "sync_engine", engine)
+
+    def snapshot(self) -> List[dict]:
+        result = []
+        for name, engine in list(self._engines.items()):
+            pool = engine.pool
+            item = {"name": name, "pool": type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                item.update({
+                    "size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "idle": pool.checkedin(),
+                    "overflow": max(0, pool.overflow()),
+                    "max_overflow": pool._max_overflow,
+                })
+            telemetry = getattr(pool, "telemetry", None)
+            if telemetry is not None:
+                item.update(telemetry.snapshot())
+            result.append(item)
+        return result
+
+
+# 进程级连接池登记
+pool_registry = PoolRegistry()
+
+
+def _route_name(app, scope) -> str:
+    """取请求匹配到的路由模板，如 GET /api/quick-links/{link_id}"""
+    endpoint = scope.get("endpoint")
+    for route in getattr(app, "routes", []):
+        if endpoint is not None and getattr(route, "endpoint", None) is endpoint:
+            return f"{scope['method']} {route.path}"
+    return f"{scope['method']} <unmatched>"
+
+
+class SQLMetricsMiddleware:
+    """为每个 HTTP 请求建立SQL收集器，请求结束后按路由汇总"""
+
+    def __init__(self, app, metrics: Optional[SQLMetrics] = None):
+        self.app = app
+        self.metrics = metrics or sql_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_stats.reset(token)
+            # 未匹配路由且没有查询的请求（静态文件等）不计入
+            if stats.count or scope.get("endpoint") is not None:
+                self.metrics.record_request(_route_name(scope.get("app"), scope), stats)
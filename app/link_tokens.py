@@ -0,0 +1,35 @@
+"""
+快速链接跳转令牌
+/go/{token} 不需要登录，因此不能直接使用自增主键：任何人都可以遍历主键找到所有用户的链接。
+令牌为 "{主键}.{签名}"，签名是用 SECRET_KEY 对主键计算的 HMAC，无法伪造，也无法由主键推算。
+"""
+import base64
+import hashlib
+import hmac
+from typing import Optional
+
+from .config import AuthConfig
+
+SIGNATURE_BYTES = 16
+
+
+def _signature(link_id: int) -> str:
+    digest = hmac.new(AuthConfig.get_secret_key().encode("utf-8"), f"go:{link_id}".encode("ascii"),
+                      hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:SIGNATURE_BYTES]).rstrip(b"=").decode("ascii")
+
+
+def sign_link_id(link_id: int) -> str:
+    """生成快速链接的跳转令牌"""
+    return f"{link_id}.{_signature(link_id)}"
+
+
+def verify_link_token(token: str) -> Optional[int]:
+    """返回令牌对应的快速链接主键；格式错误或签名不符时返回 None"""
+    id_text, _, signature = token.partition(".")
+    if not id_text.isdigit() or not signature:
+        return None
+    link_id = int(id_text)
+    if not hmac.compare_digest(signature, _signature(link_id)):
+        return None
+    return link_id
@@ -2,16 +2,33 @@
 主应用文件
 """
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 
-from .config import AppConfig
-from .database import setup_database, create_database_tables
-from .services.data_init_service import DataInitService
-from .routers import quick_links, search_engines, search
+from .config import AppConfig, LinkHealthConfig, SQLMetricsConfig, Config as DatabaseConfig
+from .database import setup_database, setup_async_database, dispose_async_database
+from .services.schema_service import SchemaService
+from .services.link_health_service import LinkHealthService
+from .services.click_counter_service import ClickCounterService
+from .services.account_deletion_service import AccountDeletionService
+from .concurrency import ConcurrencyLimitMiddleware, configure_thread_limiter
+from .instrumentation import SQLMetricsMiddleware, install_sql_instrumentation
+from .replicas import ReadYourWritesMiddleware
+from .http_client import http_client
+from .services.image_pipeline import image_pipeline
+from .services.wallpaper_prefetch import wallpaper_prefetcher
+from .routers import health, link_redirect, metrics
+
+# 按 DB_MODE 选择同步或异步会话版本的路由
+if DatabaseConfig.is_async_mode():
+    from .routers.aio import quick_links, search_engines, search, auth
+else:
+    from .routers import quick_links, search_engines, search, auth
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -21,34 +38,57 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
+    # 初始化完成前就绪检查返回 503，存活检查不受影响
+    app.state.ready = False
+    
+    # 线程池上限与连接池容量保持一致
+    configure_thread_limiter()
+    
     # 启动时初始化
     try:
         logger.info("应用启动，开始初始化...")
         
-        # 设置数据库连接
+        # 设置数据库连接（异步模式下同步引擎仍用于建表、初始化数据和后台任务）
         if not setup_database():
             logger.error("数据库设置失败")
             raise Exception("数据库设置失败")
         
-        # 创建数据库表
-        if not create_database_tables():
+        if DatabaseConfig.is_async_mode() and not setup_async_database():
+            logger.error("异步数据库设置失败")
+            raise Exception("异步数据库设置失败")
+        
+        # 结构与默认数据版本一致时只需一次主键查询；不一致时才建表和初始化默认数据
+        if not await run_in_threadpool(SchemaService.ensure_schema):
             logger.error("数据库表创建失败")
             raise Exception("数据库表创建失败")
         
-        # 初始化默认数据
-        if not DataInitService.init_default_data():
-            logger.warning("默认数据初始化失败，但应用将继续启动")
-        else:
-            logger.info("应用初始化完成")
-            
+        app.state.ready = True
+        logger.info("应用初始化完成")
+        
     except Exception as e:
         logger.error(f"应用初始化时发生错误: {e}")
         logger.warning("尽管初始化失败，应用仍将继续启动")
     
+    # 启动后台任务
+    background_tasks = [
+        asyncio.create_task(ClickCounterService.run_periodic_flush()),
+        asyncio.create_task(AccountDeletionService.resume_pending_purges()),
+    ]
+    if LinkHealthConfig.ENABLED:
+        logger.info(f"启用快速链接健康巡检，间隔 {LinkHealthConfig.INTERVAL} 秒")
+        background_tasks.append(asyncio.create_task(LinkHealthService.run_periodic_checks()))
+    
     yield
     
     # 关闭时的清理工作
     logger.info("应用正在关闭...")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await wallpaper_prefetcher.close()
+    image_pipeline.close()
+    await http_client.aclose()
+    await dispose_async_database()
 
 
 # 创建FastAPI应用
@@ -59,14 +99,26 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 按请求统计SQL查询数与耗时
+install_sql_instrumentation()
+if SQLMetricsConfig.ENABLED:
+    app.add_middleware(SQLMetricsMiddleware)
+
+# 配置了只读副本时，写后读主库的窗口通过 Cookie 在多个工作进程间传递
+if not DatabaseConfig.is_sqlite() and DatabaseConfig.MYSQL_REPLICA_HOSTS:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# 同步路由超出线程上限时在准入队列中有限等待，超时返回 503
+app.add_middleware(ConcurrencyLimitMiddleware)
+
 # 注册路由
 app.include_router(quick_links.router)
 app.include_router(search_engines.router)
 app.include_router(search.router)
-
-# 导入认证路由
-from .routers import auth
+app.include_router(link_redirect.router)
 app.include_router(auth.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 # 导入壁纸路由
 from .routers import wallpaper
@@ -0,0 +1,430 @@
+"""
+数据迁移框架
+取代一次性执行、整表加锁的 migrate_*.py 脚本：
+表结构变更在 MySQL 上优先使用在线 DDL（INSTANT，其次 INPLACE + LOCK=NONE），并限制等待元数据锁的时间；
+数据回填按主键区间分批更新，每批与检查点在同一事务中提交，批与批之间按耗时休眠限流，
+中断后重新运行即从检查点继续，已完成的步骤不再执行。
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import delete, inspect, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from .config import MigrationConfig
+from .models import MigrationCheckpoint
+
+logger = logging.getLogger(__name__)
+
+checkpoints = MigrationCheckpoint.__table__
+
+# MySQL 在线 DDL 选项，按对业务读写的影响从小到大尝试；None 表示交给 MySQL 选择（可能复制整表并阻塞写入）
+ONLINE_DDL_OPTIONS = ("ALGORITHM=INSTANT", "ALGORITHM=INPLACE, LOCK=NONE", None)
+
+# 等待锁超时：换一种算法也拿不到锁，直接失败，稍后重新运行即可
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """把秒数格式化为 1h02m03s"""
+    if seconds is None:
+        return "未知"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m{seconds:02d}s"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def online_alter(engine: Engine, table: str, clause: str, setup: Iterable[str] = (),
+                 options: Iterable[Optional[str]] = ONLINE_DDL_OPTIONS) -> str:
+    """执行 ALTER TABLE，MySQL 上依次尝试在线算法，返回实际使用的选项"""
+    statement = f"ALTER TABLE {table} {clause}"
+    if engine.dialect.name != "mysql":
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+        return "DEFAULT"
+    options = list(options)
+    for option in options:
+        try:
+            with engine.begin() as conn:
+                # 拿不到元数据锁时尽快放弃，避免后续业务查询全部排在这条 DDL 之后
+                conn.execute(text(f"SET SESSION lock_wait_timeout = {int(MigrationConfig.LOCK_WAIT_TIMEOUT)}"))
+                for sql in setup:
+                    conn.execute(text(sql))
+                conn.execute(text(f"{statement}, {option}" if option else statement))
+            return option or "DEFAULT"
+        except DBAPIError as e:
+            code = e.orig.args[0] if e.orig is not None and e.orig.args else None
+            if option is options[-1] or code == MYSQL_LOCK_WAIT_TIMEOUT:
+                raise
+            logger.warning(f"{table}: {option} 不可用，尝试下一种方式: {e.orig}")
+    return "DEFAULT"
+
+
+class Progress:
+    """按主键区间估算回填进度和剩余时间，每隔 interval 秒输出一次日志"""
+
+    def __init__(self, label: str, start: int, end: int, interval: float,
+                 clock: Callable[[], float] = time.monotonic,
+                 report: Optional[Callable[[dict], None]] = None):
+        self.label = label
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.clock = clock
+        self.report = report
+        self.started_at = clock()
+        self.logged_at = None
+
+    def update(self, position: int, rows: int) -> dict:
+        now = self.clock()
+        span = max(self.end - self.start, 1)
+        fraction = min(max(position - self.start, 0) / span, 1.0)
+        elapsed = now - self.started_at
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        snapshot = {"step": self.label, "position": position, "end": self.end, "rows": rows,
+                    "percent": round(fraction * 100, 1), "elapsed": elapsed, "eta": eta}
+        if self.logged_at is None or now - self.logged_at >= self.interval or fraction >= 1:
+            self.logged_at = now
+            logger.info(f"{self.label}: {snapshot['percent']}% (id {position}/{self.end}, "
+                        f"已更新 {rows} 行, 用时 {format_duration(elapsed)}, ETA {format_duration(eta)})")
+        if self.report is not None:
+            self.report(snapshot)
+        return snapshot
+
+
+class Step:
+    """迁移步骤基类：run 必须可重复执行（已完成的部分自动跳过）"""
+    name = ""
+
+    def run(self, runner: "MigrationRunner", key: str):
+        raise NotImplementedError
+
+
+class CreateTable(Step):
+    """按模型定义创建表（已存在时跳过）"""
+
+    def __init__(self, table, name: Optional[str] = None):
+        self.table = table
+        self.name = name or f"create_{table.name}"
+
+    def run(self, runner, key):
+        if runner.has_table(self.table.name):
+            logger.info(f"表 {self.table.name} 已存在")
+            return
+        self.table.create(runner.engine)
+        logger.info(f"表 {self.table.name} 创建成功")
+
+
+class AddColumns(Step):
+    """添加字段，MySQL 上一条在线 ALTER 添加全部缺少的字段"""
+
+    def __init__(self, table: str, columns: Dict[str, str], name: Optional[str] = None):
+        self.table = table
+        self.columns = columns
+        self.name = name or f"add_columns_{table}"
+
+    def run(self, runner, key):
+        if not runner.has_table(self.table):
+            logger.info(f"表 {self.table} 不存在，跳过")
+            return
+        existing = runner.columns(self.table)
+        missing = [column for column in self.columns if column not in existing]
+        if not missing:
+            logger.info(f"表 {self.table} 已有字段: {', '.join(self.columns)}")
+            return
+        clauses = [f"ADD COLUMN {column} {self.columns[column]}" for column in missing]
+        if runner.is_mysql:
+            algorithm = online_alter(runner.engine, self.table, ", ".join(clauses))
+        else:
+            # SQLite 每条 ALTER 只能添加一列
+            for clause in clauses:
+                algorithm = online_alter(runner.engine, self.table, clause)
+        logger.info(f"✓ {self.table} 添加字段 {', '.join(missing)} ({algorithm})")
+
+
+class SetNotNull(Step):
+    """把已回填完的字段改为 NOT NULL（SQLite 不支持修改列定义，跳过）"""
+
+    def __init__(self, table: str, column: str, definition: str, name: Optional[str] = None):
+        self.table = table
+        self.column = column
+        self.definition = definition
+        self.name = name or f"not_null_{table}_{column}"
+
+    def run(self, runner, key):
+        if not runner.has_table(self.table):
+            return
+        if not runner.is_mysql:
+            logger.info(f"{runner.engine.dialect.name} 不支持修改列定义，{self.table}.{self.column} 保持可空")
+            return
+        if not runner.columns(self.table)[self.column]["nullable"]:
+            return
+        algorithm = online_alter(runner.engine, self.table,
+                                 f"MODIFY COLUMN {self.column} {self.definition} NOT NULL",
+                                 options=ONLINE_DDL_OPTIONS[1:])
+        logger.info(f"✓ {self.table}.{self.column} 已改为 NOT NULL ({algorithm})")
+
+
+class AddForeignKey(Step):
+    """添加外键，同一列上指向同一张表、删除规则不同的旧外键一并替换（SQLite 不支持 ALTER 添加外键，跳过）
+
+    MySQL 只有关闭 foreign_key_checks 时才能 INPLACE 添加外键；
+    数据已由前面的回填步骤保证有效，关闭检查可避免复制整表。
+    """
+
+    def __init__(self, table: str, constraint: str, column: str, reference: str,
+                 ondelete: Optional[str] = None, name: Optional[str] = None):
+        self.table = table
+        self.constraint = constraint
+        self.column = column
+        self.reference = reference
+        self.ondelete = ondelete
+        self.name = name or f"fk_{table}_{column}"
+
+    def run(self, runner, key):
+        if not runner.has_table(self.table):
+            return
+        if not runner.is_mysql:
+            logger.info(f"{runner.engine.dialect.name} 不支持添加外键，跳过 {self.constraint}")
+            return
+        referred = self.reference.split("(")[0].strip()
+        existing = [fk for fk in inspect(runner.engine).get_foreign_keys(self.table)
+                    if fk["constrained_columns"] == [self.column] and fk["referred_table"] == referred]
+        wanted = (self.ondelete or "").upper()
+        if any(((fk.get("options") or {}).get("ondelete") or "").upper() == wanted for fk in existing):
+            return
+        drops = [f"DROP FOREIGN KEY {fk['name']}" for fk in existing]
+        setup = ["SET SESSION foreign_key_checks = 0"]
+        if any(fk["name"] == self.constraint for fk in existing):
+            # 同一条 ALTER 中不能删除再添加同名外键
+            online_alter(runner.engine, self.table, ", ".join(drops), setup=setup, options=ONLINE_DDL_OPTIONS[1:])
+            drops = []
+        clause = f"ADD CONSTRAINT {self.constraint} FOREIGN KEY ({self.column}) REFERENCES {self.reference}"
+        if self.ondelete:
+            clause += f" ON DELETE {self.ondelete}"
+        algorithm = online_alter(runner.engine, self.table, ", ".join(drops + [clause]), setup=setup,
+                                 options=ONLINE_DDL_OPTIONS[1:])
+        logger.info(f"✓ {self.table} 添加外键 {self.constraint} ({algorithm})")
+
+
+class AddIndex(Step):
+    """添加普通索引（已存在时跳过），MySQL 上在线创建，建索引期间不阻塞读写"""
+
+    def __init__(self, table: str, index: str, columns: List[str], name: Optional[str] = None):
+        self.table = table
+        self.index = index
+        self.columns = columns
+        self.name = name or f"add_index_{index}"
+
+    def run(self, runner, key):
+        if not runner.has_table(self.table):
+            logger.info(f"表 {self.table} 不存在，跳过")
+            return
+        if self.index in {index["name"] for index in inspect(runner.engine).get_indexes(self.table)}:
+            logger.info(f"索引 {self.index} 已存在")
+            return
+        column_list = ", ".join(self.columns)
+        if runner.is_mysql:
+            algorithm = online_alter(runner.engine, self.table, f"ADD INDEX {self.index} ({column_list})",
+                                     options=ONLINE_DDL_OPTIONS[1:])
+        else:
+            with runner.engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX {self.index} ON {self.table} ({column_list})"))
+            algorithm = "DEFAULT"
+        logger.info(f"✓ {self.table} 添加索引 {self.index} ({column_list}) ({algorithm})")
+
+
+class DropUniqueIndexes(Step):
+    """删除某一列上的单列唯一索引"""
+
+    def __init__(self, table: str, column: str, name: Optional[str] = None):
+        self.table = table
+        self.column = column
+        self.name = name or f"drop_unique_{table}_{column}"
+
+    def run(self, runner, key):
+        if not runner.has_table(self.table):
+            return
+        inspector = inspect(runner.engine)
+        names = [index["name"] for index in inspector.get_indexes(self.table)
+                 if index.get("unique") and index["column_names"] == [self.column]]
+        for name in names:
+            if runner.is_mysql:
+                online_alter(runner.engine, self.table, f"DROP INDEX {name}", options=ONLINE_DDL_OPTIONS[1:])
+            else:
+                with runner.engine.begin() as conn:
+                    conn.execute(text(f"DROP INDEX {name}"))
+            logger.info(f"✓ 移除表 {self.table} 列 {self.column} 的唯一索引: {name}")
+
+
+class RunPython(Step):
+    """执行一个函数 fn(engine)，函数本身需要可重复执行"""
+
+    def __init__(self, name: str, fn: Callable[[Engine], object]):
+        self.name = name
+        self.fn = fn
+
+    def run(self, runner, key):
+        self.fn(runner.engine)
+
+
+class Backfill(Step):
+    """按主键区间分批执行 UPDATE {table} SET {assignments} [WHERE {where}]
+
+    每批的上界由主键索引定位（起点之后第 batch_size 行），稀疏主键不会产生空批；
+    更新和检查点在同一事务中提交，中断后从最后提交的主键继续。
+    开始时记录当前最大主键，之后新写入的行应已由应用代码填好。
+    """
+
+    def __init__(self, table: str, assignments: str, where: Optional[str] = None,
+                 params: Union[dict, Callable[[Connection], dict], None] = None,
+                 key: str = "id", name: Optional[str] = None):
+        self.table = table
+        self.assignments = assignments
+        self.where = where
+        self.params = params
+        self.key = key
+        self.name = name or f"backfill_{table}"
+
+    def run(self, runner, key):
+        if not runner.has_table(self.table):
+            logger.info(f"表 {self.table} 不存在，跳过")
+            return
+        checkpoint = runner.load(key)
+        last_id = checkpoint.last_id if checkpoint else 0
+        rows = checkpoint.rows_done if checkpoint else 0
+        pk, table = self.key, self.table
+        with runner.engine.connect() as conn:
+            low, high = conn.execute(text(f"SELECT MIN({pk}), MAX({pk}) FROM {table}")).one()
+            params = self.params(conn) if callable(self.params) else dict(self.params or {})
+        if high is None or last_id >= high:
+            return
+        start = max(last_id, low - 1)
+        if checkpoint:
+            logger.info(f"{key}: 从检查点 id {last_id} 继续（已更新 {rows} 行）")
+        progress = Progress(key, start, high, runner.progress_interval, runner.clock, runner.report)
+        condition = f" AND ({self.where})" if self.where else ""
+        while start < high:
+            began = runner.clock()
+            with runner.engine.begin() as conn:
+                end = conn.execute(
+                    text(f"SELECT {pk} FROM {table} WHERE {pk} > :lo ORDER BY {pk} LIMIT 1 OFFSET :offset"),
+                    {"lo": start, "offset": runner.batch_size - 1},
+                ).scalar()
+                end = high if end is None or end > high else end
+                result = conn.execute(
+                    text(f"UPDATE {table} SET {self.assignments} WHERE {pk} > :_lo AND {pk} <= :_hi{condition}"),
+                    {**params, "_lo": start, "_hi": end},
+                )
+                rows += result.rowcount
+                runner.save(conn, key, last_id=end, rows_done=rows)
+            elapsed = runner.clock() - began
+            start = end
+            progress.update(start, rows)
+            if start < high:
+                runner.throttle(elapsed)
+
+
+class Migration:
+    """一个迁移：按顺序执行的步骤列表"""
+
+    def __init__(self, name: str, description: str, steps: List[Step]):
+        names = [step.name for step in steps]
+        if len(names) != len(set(names)):
+            raise ValueError(f"迁移 {name} 中存在重名步骤")
+        self.name = name
+        self.description = description
+        self.steps = steps
+
+
+class MigrationRunner:
+    """执行迁移并在 migration_checkpoints 表中记录每个步骤的进度"""
+
+    def __init__(self, engine: Engine, batch_size: Optional[int] = None, pause: Optional[float] = None,
+                 throttle_ratio: Optional[float] = None, progress_interval: Optional[float] = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic,
+                 report: Optional[Callable[[dict], None]] = None):
+        self.engine = engine
+        self.batch_size = batch_size or MigrationConfig.BATCH_SIZE
+        self.pause = MigrationConfig.BATCH_PAUSE if pause is None else pause
+        self.throttle_ratio = MigrationConfig.THROTTLE_RATIO if throttle_ratio is None else throttle_ratio
+        self.progress_interval = (MigrationConfig.PROGRESS_INTERVAL if progress_interval is None
+                                  else progress_interval)
+        self.sleep = sleep
+        self.clock = clock
+        self.report = report
+
+    @property
+    def is_mysql(self) -> bool:
+        return self.engine.dialect.name == "mysql"
+
+    def has_table(self, table: str) -> bool:
+        return inspect(self.engine).has_table(table)
+
+    def columns(self, table: str) -> Dict[str, dict]:
+        return {column["name"]: column for column in inspect(self.engine).get_columns(table)}
+
+    def throttle(self, elapsed: float):
+        """批间休眠：至少 pause 秒，且不少于该批耗时乘以 throttle_ratio，给业务查询留出数据库时间"""
+        delay = max(self.pause, elapsed * self.throttle_ratio)
+        if delay > 0:
+            self.sleep(delay)
+
+    def load(self, key: str):
+        with self.engine.connect() as conn:
+            return conn.execute(select(checkpoints).where(checkpoints.c.name == key)).first()
+
+    def save(self, conn: Connection, key: str, **values):
+        """在调用方的事务中写入检查点"""
+        values["updated_at"] = datetime.utcnow()
+        result = conn.execute(update(checkpoints).where(checkpoints.c.name == key).values(**values))
+        if result.rowcount == 0:
+            conn.execute(insert(checkpoints).values(**{"name": key, "last_id": 0, "rows_done": 0,
+                                                       "done": False, **values}))
+
+    def run(self, migration: Migration) -> List[str]:
+        """执行迁移中尚未完成的步骤，返回本次执行的步骤名"""
+        checkpoints.create(self.engine, checkfirst=True)
+        executed = []
+        for step in migration.steps:
+            key = f"{migration.name}:{step.name}"
+            checkpoint = self.load(key)
+            if checkpoint is not None and checkpoint.done:
+                continue
+            logger.info(f"执行 {key}")
+            step.run(self, key)
+            with self.engine.begin() as conn:
+                self.save(conn, key, done=True)
+            executed.append(step.name)
+        logger.info(f"迁移 {migration.name} 完成")
+        return executed
+
+    def status(self, migration: Migration) -> List[dict]:
+        """各步骤的检查点"""
+        checkpoints.create(self.engine, checkfirst=True)
+        result = []
+        for step in migration.steps:
+            checkpoint = self.load(f"{migration.name}:{step.name}")
+            result.append({
+                "step": step.name,
+                "done": bool(checkpoint and checkpoint.done),
+                "last_id": checkpoint.last_id if checkpoint else None,
+                "rows_done": checkpoint.rows_done if checkpoint else 0,
+                "updated_at": checkpoint.updated_at if checkpoint else None,
+            })
+        return result
+
+    def reset(self, migration: Migration) -> int:
+        """清除迁移的检查点，下次运行时重新执行全部步骤"""
+        checkpoints.create(self.engine, checkfirst=True)
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(checkpoints).where(checkpoints.c.name.like(f"{migration.name}:%")))
+        return result.rowcount
@@ -1,7 +1,7 @@
 """
 数据库模型定义
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -20,13 +20,16 @@ class User(Base):
     bio = Column(String(500), nullable=True)  # 个人简介
     avatar_url = Column(String(512), nullable=True)  # 头像URL
     is_active = Column(Boolean, default=True)
+    shard = Column(String(50), nullable=True)  # 用户数据所在分片，为空表示主库
+    shard_moving = Column(Boolean, default=False, server_default="0", nullable=False)  # 数据迁移中，暂停写入
+    deletion_requested_at = Column(DateTime, nullable=True, index=True)  # 注销时间，不为空表示数据待删除
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # 关联关系
-    quick_links = relationship("QuickLink", back_populates="user", cascade="all, delete-orphan")
-    search_engines = relationship("SearchEngine", back_populates="user", cascade="all, delete-orphan")
-    search_history = relationship("SearchHistory", back_populates="user", cascade="all, delete-orphan")
+    # 关联关系（删除用户时由数据库外键级联删除子表，ORM 不再逐行加载）
+    quick_links = relationship("QuickLink", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    search_engines = relationship("SearchEngine", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    search_history = relationship("SearchHistory", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class QuickLink(Base):
@@ -39,11 +42,20 @@ class QuickLink(Base):
     icon = Column(String(100))
     color = Column(String(20))
     category = Column(String(100), index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    status = Column(String(20), nullable=True)  # 链接健康状态: ok / broken / error
+    last_checked = Column(DateTime, nullable=True)  # 最近一次健康检查时间
+    click_count = Column(Integer, default=0, server_default="0", nullable=False)  # 点击次数（定期批量刷写）
     
     # 关联关系
     user = relationship("User", back_populates="quick_links")
+    
+    # 按用户查询的复合索引
+    __table_args__ = (
+        Index("ix_quick_links_user_category", "user_id", "category"),
+        Index("ix_quick_links_user_clicks", "user_id", "click_count"),
+    )
 
 
 class SearchEngine(Base):
@@ -59,11 +71,18 @@ class SearchEngine(Base):
     is_active = Column(Boolean, default=True)
     is_default = Column(Boolean, default=False)
     sort_order = Column(Integer, default=0)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # 关联关系
     user = relationship("User", back_populates="search_engines")
+    
+    # 按用户查询的复合索引
+    __table_args__ = (
+        Index("ix_search_engines_user_name", "user_id", "name"),
+        Index("ix_search_engines_user_active_sort", "user_id", "is_active", "sort_order"),
+        Index("ix_search_engines_user_default", "user_id", "is_default"),
+    )
 
 
 class SearchHistory(Base):
@@ -73,8 +92,34 @@ class SearchHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     query = Column(String(255), index=True)
     search_engine = Column(String(100))
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # 关联关系
-    user = relationship("User", back_populates="search_history") 
\ No newline at end of file
+    user = relationship("User", back_populates="search_history")
+    
+    # 按用户查询的复合索引
+    __table_args__ = (
+        Index("ix_search_history_user_created", "user_id", "created_at"),
+    )
+
+
+class SchemaVersion(Base):
+    """数据库结构与默认数据版本（启动时用一次主键查询判断是否需要建表和初始化）"""
+    __tablename__ = "schema_version"
+    
+    name = Column(String(50), primary_key=True)
+    schema_fingerprint = Column(String(64), nullable=False)
+    seed_fingerprint = Column(String(64), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MigrationCheckpoint(Base):
+    """迁移步骤的进度检查点（回填每提交一批就更新一次，中断后从这里继续）"""
+    __tablename__ = "migration_checkpoints"
+    
+    name = Column(String(150), primary_key=True)  # 迁移名:步骤名
+    last_id = Column(Integer, nullable=False, default=0)  # 已处理到的主键
+    rows_done = Column(Integer, nullable=False, default=0)  # 已更新的行数
+    done = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,288 @@
+"""
+只读副本路由模块
+GET 请求的会话标记为只读，读取按策略路由到副本；写入、非只读请求和刚写入过的用户始终走主库。
+写后读主库的窗口同时记在进程内存和响应 Cookie 中：多工作进程部署时，下一个请求落到其他进程也能读到自己的写入。
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.cookies import CookieError, SimpleCookie
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .config import Config as DatabaseConfig
+
+logger = logging.getLogger(__name__)
+
+# 会话 info 中使用的键
+READ_ONLY = "read_only"  # 会话只做读取，可以路由到副本
+USER_KEY = "user_key"  # 当前请求用户的标识（令牌中的用户名），用于读己之写
+
+STRATEGY_ROUND_ROBIN = "round_robin"
+STRATEGY_LATENCY = "latency"
+
+# 延迟滑动平均的平滑系数
+LATENCY_ALPHA = 0.2
+
+# 记录写后读主库截止时间（Unix 时间戳）的 Cookie
+PRIMARY_COOKIE = "db_primary_until"
+
+
+class ReplicaSet:
+    """一组只读副本引擎
+
+    round_robin 轮询选择；latency 选择查询耗时滑动平均最低的副本。
+    出错的副本在冷却时间内不再被选中。
+    """
+
+    def __init__(self, engines: Iterable[Engine], strategy: str = STRATEGY_ROUND_ROBIN,
+                 cooldown: Optional[float] = None):
+        self.engines = list(engines)
+        self.strategy = strategy
+        self.cooldown = DatabaseConfig.REPLICA_COOLDOWN if cooldown is None else cooldown
+        self._lock = threading.Lock()
+        self._cycle = itertools.cycle(self.engines)
+        self._latency: Dict[Engine, float] = {}
+        self._down_until: Dict[Engine, float] = {}
+        for engine in self.engines:
+            self._instrument(engine)
+
+    def __bool__(self):
+        return bool(self.engines)
+
+    def _instrument(self, engine: Engine):
+        """为副本引擎注册查询计时"""
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("replica_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            self.record_latency(engine, time.perf_counter() - conn.info["replica_query_start"].pop())
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(context):
+            # 语句出错时不会触发 after_cursor_execute，在这里丢弃计时起点
+            conn = context.connection
+            starts = conn.info.get("replica_query_start") if conn is not None else None
+            if starts:
+                starts.pop()
+
+    def record_latency(self, engine: Engine, elapsed: float):
+        """记录一次查询耗时"""
+        with self._lock:
+            previous = self._latency.get(engine)
+            self._latency[engine] = elapsed if previous is None else previous + LATENCY_ALPHA * (elapsed - previous)
+
+    def mark_down(self, engine: Engine):
+        """标记副本不可用，冷却期后重新参与选择"""
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.cooldown
+        logger.warning(f"只读副本不可用，{self.cooldown} 秒内改用其他副本或主库: {engine.url.host}")
+
+    def choose(self) -> Optional[Engine]:
+        """按策略选择一个可用副本，没有可用副本时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            available = [engine for engine in self.engines if self._down_until.get(engine, 0) <= now]
+            if not available:
+                return None
+            if self.strategy == STRATEGY_LATENCY:
+                # 尚未测量过的副本视为 0，保证每个副本都会被尝试
+                return min(available, key=lambda engine: self._latency.get(engine, 0.0))
+            for _ in range(len(self.engines)):
+                engine = next(self._cycle)
+                if engine in available:
+                    return engine
+        return None
+
+
+class RequestPin:
+    """单个请求的写后读主库状态：请求带来的 Cookie 截止时间，以及本次请求写入后新的截止时间"""
+
+    def __init__(self, until: float = 0.0):
+        self.until = until
+        self.wrote_until: Optional[float] = None
+
+
+# 当前请求的状态；同步路由在线程池中运行时复制上下文，引用的仍是同一个对象
+_request_pin: ContextVar[Optional[RequestPin]] = ContextVar("replica_request_pin", default=None)
+
+
+class ReadYourWritesTracker:
+    """记录最近写入过的用户，在窗口期内把他们的读取固定到主库
+
+    进程内的记录只对同一工作进程有效；请求经过 ReadYourWritesMiddleware 时，
+    截止时间还会写入响应 Cookie，之后落到任何工作进程的请求都会读主库。
+    """
+
+    def __init__(self, window: Optional[float] = None):
+        self.window = DatabaseConfig.REPLICA_STICKY_SECONDS if window is None else window
+        self._lock = threading.Lock()
+        self._until: Dict[str, float] = {}
+
+    def mark_write(self, key: Optional[str]):
+        """记录用户发生了写入"""
+        if key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._until[key] = now + self.window
+            if len(self._until) > 10000:
+                self._until = {k: until for k, until in self._until.items() if until > now}
+        pin = _request_pin.get()
+        if pin is not None and self.window > 0:
+            pin.wrote_until = time.time() + self.window
+
+    def is_pinned(self, key: Optional[str]) -> bool:
+        """用户是否仍处于写后读主库的窗口期"""
+        if key is None:
+            return False
+        pin = _request_pin.get()
+        if pin is not None and max(pin.until, pin.wrote_until or 0.0) > time.time():
+            return True
+        with self._lock:
+            return self._until.get(key, 0) > time.monotonic()
+
+
+# 进程级读己之写记录
+read_your_writes = ReadYourWritesTracker()
+
+
+def _cookie_until(scope, window: float) -> float:
+    """读取请求 Cookie 中的截止时间；超出窗口上限的值视为伪造并截断"""
+    for name, value in scope.get("headers", []):
+        if name != b"cookie":
+            continue
+        cookie = SimpleCookie()
+        try:
+            cookie.load(value.decode("latin-1"))
+            until = float(cookie[PRIMARY_COOKIE].value)
+        except (CookieError, KeyError, ValueError):
+            continue
+        return min(until, time.time() + window)
+    return 0.0
+
+
+class ReadYourWritesMiddleware:
+    """在 Cookie 中传递写后读主库的截止时间
+
+    请求开始时读取 Cookie，本次请求发生写入时在响应中写回新的截止时间（有效期即窗口长度）。
+    不保存 Cookie 的 API 客户端只能依赖进程内记录，多工作进程时写后立即读取可能读到副本上的旧数据。
+    """
+
+    def __init__(self, app, tracker: Optional[ReadYourWritesTracker] = None):
+        self.app = app
+        self.tracker = tracker or read_your_writes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.tracker.window <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        pin = RequestPin(_cookie_until(scope, self.tracker.window))
+        token = _request_pin.set(pin)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and pin.wrote_until is not None:
+                cookie = (f"{PRIMARY_COOKIE}={pin.wrote_until:.3f}; Max-Age={max(1, int(self.tracker.window + 0.999))}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_pin.reset(token)
+
+
+class RoutingSession(Session):
+    """按读写路由的会话
+
+    只读会话（info[READ_ONLY]）的查询走副本，同一会话内固定使用选中的副本；
+    flush 和 DML 语句走主库，会话一旦写入，后续读取也改走主库。
+    副本查询出现连接类错误且会话尚未写入时，回滚并在主库重试。
+    """
+
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None,
+                 tracker: Optional[ReadYourWritesTracker] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+        self.tracker = tracker or read_your_writes
+        self.replica_bind: Optional[Engine] = None
+        self.wrote = False
+
+    def _use_replica(self, clause) -> bool:
+        if not self.replicas or not self.info.get(READ_ONLY) or self.wrote:
+            return False
+        if self._flushing or getattr(clause, "is_dml", False):
+            return False
+        return not self.tracker.is_pinned(self.info.get(USER_KEY))
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        if self._use_replica(clause):
+            if self.replica_bind is None:
+                self.replica_bind = self.replicas.choose()
+            if self.replica_bind is not None:
+                return self.replica_bind
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+    def _execute_internal(self, *args, **kwargs):
+        try:
+            return super()._execute_internal(*args, **kwargs)
+        except OperationalError:
+            replica = self.replica_bind
+            if replica is None or self.wrote:
+                raise
+            self.replicas.mark_down(replica)
+            self.rollback()
+            self.replica_bind = None
+            self.info[READ_ONLY] = False
+            return super()._execute_internal(*args, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.wrote = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_dml_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.wrote = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _pin_writer_to_primary(session):
+    if session.wrote:
+        session.tracker.mark_write(session.info.get(USER_KEY))
+
+
+def _sync_session(session):
+    """兼容 AsyncSession，返回底层同步会话"""
+    return getattr(session, "sync_session", session)
+
+
+def reads_from_replica(session) -> bool:
+    """会话当前是否正在从副本读取"""
+    session = _sync_session(session)
+    return isinstance(session, RoutingSession) and session.replica_bind is not None
+
+
+@contextmanager
+def use_primary(session):
+    """临时让只读会话的读取走主库（例如副本可能尚未同步时的确认查询）"""
+    session = _sync_session(session)
+    read_only = session.info.get(READ_ONLY)
+    session.info[READ_ONLY] = False
+    try:
+        yield
+    finally:
+        session.info[READ_ONLY] = read_only
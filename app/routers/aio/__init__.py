@@ -0,0 +1 @@
+# 异步会话路由包（DB_MODE=async 时注册）
\ No newline at end of file
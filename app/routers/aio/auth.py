@@ -0,0 +1,95 @@
+"""
+认证路由（异步会话版本）
+"""
+from fastapi import APIRouter, HTTPException, Depends, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...database import get_async_db
+from ...schemas import UserCreate, UserLogin, Token, UserResponse, UserProfileUpdate
+from ...services.user_service import AsyncUserService
+from ...services.account_deletion_service import AccountDeletionService
+from ...sharding import user_shard
+from ...auth import get_current_active_user_async
+from ...models import User
+from ...config import AuthConfig
+
+router = APIRouter(prefix="/api/auth", tags=["用户认证"])
+
+
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    """用户注册"""
+    db_user = await AsyncUserService.create_user(db, user)
+    if not db_user:
+        # 检查具体失败原因
+        if await AsyncUserService.get_user_by_username(db, user.username):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="用户名已存在"
+            )
+        if await db.scalar(select(User).where(User.email == user.email)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="邮箱已被使用"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"密码长度至少{AuthConfig.MIN_PASSWORD_LENGTH}位"
+        )
+    
+    return UserResponse.model_validate(db_user)
+
+
+@router.post("/login", response_model=Token)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    """用户登录"""
+    token = await AsyncUserService.login_user(db, user)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用户名或密码错误",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return token
+
+
+@router.get("/me", response_model=UserResponse)
+async def read_users_me(current_user: User = Depends(get_current_active_user_async)):
+    """获取当前用户信息"""
+    return UserResponse.model_validate(current_user)
+
+
+@router.put("/profile", response_model=UserResponse)
+async def update_user_profile(
+    update_data: UserProfileUpdate,
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """更新用户信息"""
+    try:
+        updated_user = await AsyncUserService.update_user_profile(db, current_user.id, update_data)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not updated_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在"
+        )
+    return UserResponse.model_validate(updated_user)
+
+
+@router.delete("/account", status_code=status.HTTP_202_ACCEPTED)
+async def delete_account(
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """注销账户：立即停用，数据由后台任务分批删除"""
+    user_id, shard = current_user.id, user_shard(current_user)
+    AccountDeletionService.mark_deleted(current_user)
+    await db.commit()
+    AccountDeletionService.schedule_purge(user_id, shard)
+    return {"message": "账户已停用，数据将在后台删除"}
@@ -0,0 +1,83 @@
+"""
+快速链接路由（异步会话版本）
+"""
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ...database import get_db, get_async_db
+from ...schemas import QuickLinkCreate, QuickLinkUpdate, QuickLinkResponse, LinkHealthResult
+from ...services.quick_link_service import QuickLinkService, AsyncQuickLinkService
+from ...services.link_health_service import LinkHealthService
+from ...auth import get_current_active_user_async, get_current_user_optional_async
+from ...models import User
+from ...sharding import bind_user_shard
+
+router = APIRouter(prefix="/api/quick-links", tags=["快速链接"])
+
+
+@router.get("", response_model=List[QuickLinkResponse])
+async def get_quick_links(
+    category: Optional[str] = None, 
+    sort: Optional[str] = Query(None, pattern="^usage$", description="排序方式: usage 按点击次数"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """获取用户的快速链接列表，如果未登录则返回默认数据"""
+    user_id = current_user.id if current_user else None
+    return await AsyncQuickLinkService.get_quick_links(db, user_id, category, sort)
+
+
+@router.post("", response_model=QuickLinkResponse)
+async def create_quick_link(
+    link: QuickLinkCreate, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """创建快速链接"""
+    return await AsyncQuickLinkService.create_quick_link(db, link, current_user.id)
+
+
+@router.put("/{link_id}", response_model=QuickLinkResponse)
+async def update_quick_link(
+    link_id: int, 
+    link: QuickLinkUpdate, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """更新快速链接"""
+    db_link = await AsyncQuickLinkService.update_quick_link(db, link_id, link, current_user.id)
+    if not db_link:
+        raise HTTPException(status_code=404, detail="快速链接未找到")
+    return db_link
+
+
+@router.delete("/{link_id}")
+async def delete_quick_link(
+    link_id: int, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """删除快速链接"""
+    success = await AsyncQuickLinkService.delete_quick_link(db, link_id, current_user.id)
+    if not success:
+        raise HTTPException(status_code=404, detail="快速链接未找到")
+    return {"message": "删除成功"}
+
+
+@router.post("/health-check", response_model=List[LinkHealthResult])
+async def check_quick_links_health(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """立即检查当前用户全部快速链接的可用性（批量读写仍走同步会话）"""
+    # 认证依赖只在异步会话上绑定了分片，同步会话也要走用户所在分片
+    bind_user_shard(db, current_user)
+    return await LinkHealthService.check_links(db, user_id=current_user.id)
+
+
+@router.get("/categories")
+async def get_categories():
+    """获取预定义的分类列表"""
+    return QuickLinkService.get_categories()
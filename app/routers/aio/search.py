@@ -0,0 +1,37 @@
+"""
+搜索路由（异步会话版本）
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from ...database import get_async_db
+from ...schemas import SearchRequest, SearchResponse, SearchHistoryResponse
+from ...services.search_service import AsyncSearchService
+from ...auth import get_current_active_user_async
+from ...models import User
+
+router = APIRouter(prefix="/api", tags=["搜索"])
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search(
+    search_request: SearchRequest, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """执行搜索"""
+    result = await AsyncSearchService.perform_search(db, search_request, current_user.id)
+    if not result:
+        raise HTTPException(status_code=404, detail="搜索引擎未找到")
+    return result
+
+
+@router.get("/search-history", response_model=List[SearchHistoryResponse])
+async def get_search_history(
+    limit: int = 10, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """获取用户的搜索历史"""
+    return await AsyncSearchService.get_search_history(db, current_user.id, limit)
@@ -0,0 +1,78 @@
+"""
+搜索引擎路由（异步会话版本）
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from ...database import get_async_db
+from ...schemas import SearchEngineCreate, SearchEngineUpdate, SearchEngineResponse
+from ...services.search_engine_service import AsyncSearchEngineService
+from ...auth import get_current_active_user_async, get_current_user_optional_async
+from ...models import User
+
+router = APIRouter(prefix="/api/search-engines", tags=["搜索引擎"])
+
+
+@router.get("", response_model=List[SearchEngineResponse])
+async def get_search_engines(
+    active_only: bool = True, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """获取用户的搜索引擎列表，如果未登录则返回默认数据"""
+    user_id = current_user.id if current_user else None
+    return await AsyncSearchEngineService.get_search_engines(db, user_id, active_only)
+
+
+@router.post("", response_model=SearchEngineResponse)
+async def create_search_engine(
+    engine: SearchEngineCreate, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """创建搜索引擎"""
+    db_engine = await AsyncSearchEngineService.create_search_engine(db, engine, current_user.id)
+    if not db_engine:
+        raise HTTPException(status_code=400, detail="搜索引擎名称已存在")
+    return db_engine
+
+
+@router.put("/{engine_id}", response_model=SearchEngineResponse)
+async def update_search_engine(
+    engine_id: int, 
+    engine: SearchEngineUpdate, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """更新搜索引擎"""
+    db_engine = await AsyncSearchEngineService.update_search_engine(db, engine_id, engine, current_user.id)
+    if not db_engine:
+        raise HTTPException(status_code=404, detail="搜索引擎未找到")
+    return db_engine
+
+
+@router.delete("/{engine_id}")
+async def delete_search_engine(
+    engine_id: int, 
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+):
+    """删除搜索引擎"""
+    success = await AsyncSearchEngineService.delete_search_engine(db, engine_id, current_user.id)
+    if not success:
+        raise HTTPException(status_code=404, detail="搜索引擎未找到")
+    return {"message": "删除成功"}
+
+
+@router.get("/default", response_model=SearchEngineResponse)
+async def get_default_search_engine(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """获取用户的默认搜索引擎，如果未登录则返回默认搜索引擎"""
+    user_id = current_user.id if current_user else None
+    default_engine = await AsyncSearchEngineService.get_default_search_engine(db, user_id)
+    if not default_engine:
+        raise HTTPException(status_code=404, detail="未找到可用的搜索引擎")
+    return default_engine
@@ -1,12 +1,15 @@
 """
 认证路由
 """
+from anyio import from_thread
 from fastapi import APIRouter, HTTPException, Depends, status
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..schemas import UserCreate, UserLogin, Token, UserResponse, UserProfileUpdate
 from ..services.user_service import UserService
+from ..services.account_deletion_service import AccountDeletionService
+from ..sharding import user_shard
 from ..auth import get_current_active_user
 from ..models import User
 
@@ -107,4 +110,17 @@ async def update_user_profile(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        ) 
\ No newline at end of file
+        )
+
+
+@router.delete("/account", status_code=status.HTTP_202_ACCEPTED)
+def delete_account(
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """注销账户：立即停用，数据由后台任务分批删除"""
+    user_id, shard = current_user.id, user_shard(current_user)
+    AccountDeletionService.deactivate_user(db, current_user)
+    # 删除任务在事件循环上独立运行，不挂在本次响应上
+    from_thread.run_sync(AccountDeletionService.schedule_purge, user_id, shard)
+    return {"message": "账户已停用，数据将在后台删除"}
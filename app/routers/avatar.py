@@ -1,18 +1,23 @@
 """
 头像管理路由
 """
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, status
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile, File, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..models import User
 from ..auth import get_current_active_user
-from ..services.webdav_service import webdav_service
+from ..services.webdav_service import get_webdav_service
+from ..conditional import IMMUTABLE_CACHE_CONTROL, bytes_response
 from ..config import WebDAVConfig
+from ..singleflight import flight
 
 router = APIRouter(prefix="/api/avatar", tags=["头像管理"])
 
+# 同一头像文件的并发下载合并为一次
+avatar_flight = flight("avatar")
+
 
 @router.post("/upload")
 async def upload_avatar(
@@ -34,7 +39,7 @@ async def upload_avatar(
         file_content = await file.read()
         
         # 上传到WebDAV
-        success, message, avatar_url = webdav_service.upload_avatar(
+        success, message, avatar_url = get_webdav_service().upload_avatar(
             file_content, file.filename, current_user.id
         )
         
@@ -46,12 +51,11 @@ async def upload_avatar(
         
         # 删除用户的旧头像
         if current_user.avatar_url:
-            webdav_service.delete_avatar(current_user.avatar_url)
+            get_webdav_service().delete_avatar(current_user.avatar_url)
         
         # 更新用户头像URL
         current_user.avatar_url = avatar_url
         db.commit()
-        db.refresh(current_user)
         
         return {
             "success": True,
@@ -83,7 +87,7 @@ async def delete_avatar(
     
     try:
         # 删除WebDAV上的文件
-        success = webdav_service.delete_avatar(current_user.avatar_url)
+        success = get_webdav_service().delete_avatar(current_user.avatar_url)
         
         # 清除数据库中的头像URL
         current_user.avatar_url = None
@@ -102,8 +106,8 @@ async def delete_avatar(
 
 
 @router.get("/download/{filename}")
-async def download_avatar(filename: str):
-    """代理下载头像文件"""
+async def download_avatar(request: Request, filename: str):
+    """代理下载头像文件（文件名随每次上传变化，内容不变，可永久缓存）"""
     
     if not WebDAVConfig.is_configured():
         raise HTTPException(
@@ -115,8 +119,10 @@ async def download_avatar(filename: str):
         # 构造完整的头像URL
         avatar_url = WebDAVConfig.get_avatar_url(filename)
         
-        # 获取文件内容
-        file_content = webdav_service.get_avatar_content(avatar_url)
+        # 获取文件内容：WebDAV 下载是阻塞调用，放到线程池执行；同一文件的并发请求只下载一次
+        file_content = await avatar_flight.do(
+            filename, lambda: run_in_threadpool(get_webdav_service().get_avatar_content, avatar_url)
+        )
         
         if file_content is None:
             raise HTTPException(
@@ -136,11 +142,12 @@ async def download_avatar(filename: str):
         else:
             media_type = "image/jpeg"  # 默认
         
-        return Response(
-            content=file_content,
-            media_type=media_type,
+        return bytes_response(
+            request.headers,
+            file_content,
+            media_type,
             headers={
-                "Cache-Control": "public, max-age=3600",  # 缓存1小时
+                "Cache-Control": IMMUTABLE_CACHE_CONTROL,
                 "Content-Disposition": f"inline; filename={filename}"
             }
         )
@@ -167,7 +174,7 @@ async def list_user_avatars(
         )
     
     try:
-        avatars = webdav_service.list_user_avatars(current_user.id)
+        avatars = get_webdav_service().list_user_avatars(current_user.id)
         return {
             "avatars": avatars,
             "current_avatar": current_user.avatar_url
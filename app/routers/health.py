@@ -0,0 +1,40 @@
+"""
+存活与就绪检查路由
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from .. import database
+
+router = APIRouter(tags=["健康检查"])
+
+
+def _ping_database() -> bool:
+    """检查数据库连接是否可用"""
+    if database.SessionLocal is None:
+        return False
+    db = database.SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+    finally:
+        db.close()
+
+
+@router.get("/healthz")
+async def liveness():
+    """存活检查：进程能处理请求即返回 200，不访问数据库"""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readiness(request: Request):
+    """就绪检查：启动初始化完成且数据库可用时返回 200"""
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="应用尚未完成初始化")
+    if not await run_in_threadpool(_ping_database):
+        raise HTTPException(status_code=503, detail="数据库不可用")
+    return {"status": "ready"}
@@ -0,0 +1,30 @@
+"""
+快速链接跳转路由
+"""
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import RedirectResponse
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..link_tokens import verify_link_token
+from ..services.quick_link_service import QuickLinkService
+from ..services.click_counter_service import click_counter
+
+router = APIRouter(tags=["快速链接"])
+
+
+@router.get("/go/{token}")
+def go_to_quick_link(token: str, db: Session = Depends(get_db)):
+    """记录点击并跳转到快速链接（计数在内存累加，不等待数据库写入）
+
+    令牌由服务端签发（QuickLinkResponse.go_token），不能用主键直接访问。
+    """
+    link_id = verify_link_token(token)
+    if link_id is None:
+        raise HTTPException(status_code=404, detail="快速链接未找到")
+    url = QuickLinkService.get_quick_link_url(db, link_id)
+    if not url or not url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=404, detail="快速链接未找到")
+
+    click_counter.record(link_id)
+    return RedirectResponse(url, status_code=302)
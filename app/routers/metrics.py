@@ -0,0 +1,103 @@
+"""
+运行指标路由
+指标包含连接池、SQL 耗时和各路由统计等内部信息，默认关闭（METRICS_ENABLED），
+开放时可以用 METRICS_TOKEN 限制访问
+"""
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from typing import List, Optional
+
+from ..config import MetricsConfig
+from ..concurrency import request_gate, thread_limiter_stats
+from ..http_client import http_client
+from ..instrumentation import pool_registry, sql_metrics
+from ..schemas import (
+    HTTPClientMetricsResponse, ImagePipelineStats, PoolMetricsResponse, SingleFlightStats, SQLRouteMetrics,
+    WallpaperCacheStats, WallpaperFailoverStats, WallpaperPlaceholderStats, WallpaperPrefetchStats,
+)
+from ..services.image_pipeline import image_pipeline
+from ..services.wallpaper_cache import wallpaper_cache
+from ..services.wallpaper_failover import source_failover
+from ..services.wallpaper_placeholders import wallpaper_placeholders
+from ..services.wallpaper_prefetch import wallpaper_prefetcher
+from ..singleflight import flight_stats
+
+
+
+def require_metrics_access(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """指标接口未开放时返回 404；配置了令牌时校验 Bearer 令牌"""
+    if not MetricsConfig.ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if MetricsConfig.TOKEN and (
+        credentials is None or not hmac.compare_digest(credentials.credentials.encode(), MetricsConfig.TOKEN.encode())
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的指标访问令牌",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(prefix="/api/metrics", tags=["监控"], dependencies=[Depends(require_metrics_access)])
+
+
+@router.get("/sql", response_model=List[SQLRouteMetrics])
+def get_sql_metrics():
+    """获取各路由的SQL查询数与数据库耗时统计"""
+    return sql_metrics.snapshot()
+
+
+@router.get("/pool", response_model=PoolMetricsResponse)
+async def get_pool_metrics():
+    """获取连接池借出等待、占用和超时统计，以及线程池和准入队列状态"""
+    # 线程池上限绑定事件循环，因此使用异步端点在事件循环中读取
+    return {
+        "pools": pool_registry.snapshot(),
+        "threadpool": thread_limiter_stats(),
+        "request_gate": request_gate.stats(),
+    }
+
+
+@router.get("/http", response_model=HTTPClientMetricsResponse)
+async def get_http_client_metrics():
+    """获取共享上游HTTP客户端的连接池状态（按主机的连接数、空闲连接和请求占用）"""
+    return http_client.stats()
+
+
+@router.get("/wallpaper-cache", response_model=WallpaperCacheStats)
+async def get_wallpaper_cache_metrics():
+    """获取壁纸缓存的命中率（内存/磁盘）、容量和淘汰次数"""
+    return wallpaper_cache.stats()
+
+
+@router.get("/wallpaper-prefetch", response_model=WallpaperPrefetchStats)
+async def get_wallpaper_prefetch_metrics():
+    """获取各壁纸预取池的就绪数、自适应目标数、请求速率和直接命中比例"""
+    return wallpaper_prefetcher.stats()
+
+
+@router.get("/wallpaper-pipeline", response_model=ImagePipelineStats)
+async def get_wallpaper_pipeline_metrics():
+    """获取壁纸缩放转码的次数、失败数和节省的字节比例"""
+    return image_pipeline.stats()
+
+
+@router.get("/wallpaper-placeholders", response_model=WallpaperPlaceholderStats)
+async def get_wallpaper_placeholder_metrics():
+    """获取壁纸占位图的生成次数、失败数和平均大小"""
+    return wallpaper_placeholders.stats()
+
+
+@router.get("/singleflight", response_model=List[SingleFlightStats])
+async def get_singleflight_metrics():
+    """获取各合并组的执行次数、被合并的并发请求数和进行中的任务数"""
+    return flight_stats()
+
+
+@router.get("/wallpaper-sources", response_model=WallpaperFailoverStats)
+async def get_wallpaper_source_metrics():
+    """获取各壁纸源的熔断状态、p95 延迟、错误率，以及对冲和故障转移次数"""
+    return source_failover.stats()
@@ -1,13 +1,14 @@
 """
 快速链接路由
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from ..database import get_db
-from ..schemas import QuickLinkCreate, QuickLinkUpdate, QuickLinkResponse
+from ..schemas import QuickLinkCreate, QuickLinkUpdate, QuickLinkResponse, LinkHealthResult
 from ..services.quick_link_service import QuickLinkService
+from ..services.link_health_service import LinkHealthService
 from ..auth import get_current_active_user, get_current_user_optional
 from ..models import User
 
@@ -17,12 +18,13 @@ router = APIRouter(prefix="/api/quick-links", tags=["快速链接"])
 @router.get("", response_model=List[QuickLinkResponse])
 def get_quick_links(
     category: Optional[str] = None, 
+    sort: Optional[str] = Query(None, pattern="^usage$", description="排序方式: usage 按点击次数"),
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """获取用户的快速链接列表，如果未登录则返回默认数据"""
     user_id = current_user.id if current_user else None
-    return QuickLinkService.get_quick_links(db, user_id, category)
+    return QuickLinkService.get_quick_links(db, user_id, category, sort)
 
 
 @router.post("", response_model=QuickLinkResponse)
@@ -62,6 +64,15 @@ def delete_quick_link(
     return {"message": "删除成功"}
 
 
+@router.post("/health-check", response_model=List[LinkHealthResult])
+async def check_quick_links_health(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """立即检查当前用户全部快速链接的可用性"""
+    return await LinkHealthService.check_links(db, user_id=current_user.id)
+
+
 @router.get("/categories")
 def get_categories():
     """获取预定义的分类列表"""
@@ -2,19 +2,34 @@
 壁纸相关路由
 提供壁纸代理服务，解决前端CORS问题
 """
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import StreamingResponse
-import httpx
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+import anyio
 import asyncio
-from typing import Optional
+from typing import Optional, Tuple
 import logging
-import random
+import os
 import time
 
+from ..conditional import IMMUTABLE_CACHE_CONTROL, bytes_response, file_response, make_etag
+from ..config import WallpaperConfig
+from ..http_client import http_client
+from ..services.bing_catalog import bing_catalog
+from ..services.image_pipeline import image_pipeline
+from ..services.wallpaper_cache import CacheSpool, CachedImage, cache_key, content_digest, wallpaper_cache
+from ..services.wallpaper_failover import NoSourceAvailable, source_failover
+from ..services.wallpaper_placeholders import wallpaper_placeholders
+from ..services.wallpaper_prefetch import PrefetchSpec, resolution_bucket, wallpaper_prefetcher
+from ..singleflight import flight
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/wallpaper", tags=["wallpaper"])
 
+# 缓存未命中时的上游获取按缓存键合并
+wallpaper_flight = flight("wallpaper")
+
 # 支持的壁纸源配置
 WALLPAPER_SOURCES = {
     "unsplash": {
@@ -34,16 +49,20 @@ WALLPAPER_SOURCES = {
 
 @router.get("/random")
 async def get_random_wallpaper(
+    request: Request,
     source: str = Query("unsplash", description="壁纸源: unsplash, picsum, bing"),
     width: float = Query(1920, description="图片宽度"),
     height: float = Query(1080, description="图片高度"),
     category: Optional[str] = Query(None, description="图片分类（仅unsplash支持）"),
-    blur: Optional[int] = Query(None, description="模糊程度（仅picsum支持）")
+    blur: Optional[int] = Query(None, description="模糊程度（仅picsum支持）"),
+    accept: Optional[str] = Header(None)
 ):
     """
     获取随机壁纸
-    通过后端代理请求，解决前端CORS问题
+    通过后端代理请求，解决前端CORS问题；尺寸归入分辨率档位，并按 Accept 头转码为 AVIF/WebP
     """
+    import httpx  # 首次请求时才导入，缩短冷启动时间
+
     try:
         # 将浮点数转换为整数，避免参数验证错误
         width = int(round(width))
@@ -55,68 +74,57 @@ async def get_random_wallpaper(
         if width > 10000 or height > 10000:
             raise HTTPException(status_code=400, detail="图片尺寸不能超过10000像素")
         
-        # 特殊处理必应壁纸
+        if source not in WALLPAPER_SOURCES:
+            raise HTTPException(status_code=400, detail=f"不支持的壁纸源: {source}")
+        
+        # 相近的屏幕尺寸归入同一档位，上游请求、预取和缓存都按档位进行
+        width, height = resolution_bucket(width, height)
+        # 上游会忽略的分类和模糊程度不参与预取池和缓存键，避免任意取值各自建池、重复下载同样的图片
+        category, blur = _normalize_options(source, category, blur)
+        fmt = image_pipeline.negotiate(accept) if image_pipeline.active else None
+        
+        # 必应壁纸从本地目录中随机选取，图片按日期缓存，不经过预取池
         if source == "bing":
-            # 随机选择过去30天内的某一天
-            random_days = random.randint(0, 30)
-            
-            # 使用必应官方API获取历史壁纸
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                api_url = f"https://www.bing.com/HPImageArchive.aspx?format=js&idx={random_days}&n=1&mkt=zh-CN"
-                response = await client.get(api_url)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("images") and len(data["images"]) > 0:
-                        image_info = data["images"][0]
-                        base_url = "https://www.bing.com"
-                        image_url = base_url + image_info["url"]
-                        
-                        # 获取实际的图片
-                        img_response = await client.get(image_url, follow_redirects=True)
-                        if img_response.status_code == 200:
-                            return StreamingResponse(
-                                _iter_content(img_response.content),
-                                media_type=img_response.headers.get("content-type", "image/jpeg"),
-                                headers={
-                                    "Cache-Control": "public, max-age=3600",
-                                    "Access-Control-Allow-Origin": "*",
-                                    "Access-Control-Allow-Methods": "GET",
-                                    "Access-Control-Allow-Headers": "*"
-                                }
-                            )
-                        else:
-                            raise HTTPException(status_code=500, detail="获取必应壁纸图片失败")
-                    else:
-                        raise HTTPException(status_code=404, detail="未找到必应壁纸数据")
-                else:
-                    raise HTTPException(status_code=500, detail="获取必应壁纸失败")
+            return await _random_bing_image(request, width, height, fmt)
         
-        # 处理其他壁纸源
-        wallpaper_url = _build_wallpaper_url(source, width, height, category, blur)
+        # 预取池中有现成的图片时立即返回，取走后在后台补充
+        spec = PrefetchSpec(source, width, height, category, blur)
+        prefetched = wallpaper_prefetcher.take(spec, lambda: _download_image(spec))
+        if prefetched is not None:
+            content, content_type = await _render(prefetched.content, prefetched.content_type, width, height, fmt)
+            return _image_response(request, content, content_type, "PREFETCHED", source,
+                                   original_digest=content_digest(prefetched.content))
         
-        # 通过代理获取图片
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(wallpaper_url, follow_redirects=True)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"获取壁纸失败: {response.status_code}"
-                )
-            
-            # 返回图片流
-            return StreamingResponse(
-                _iter_content(response.content),
-                media_type=response.headers.get("content-type", "image/jpeg"),
-                headers={
-                    "Cache-Control": "public, max-age=3600",  # 缓存1小时
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
+        # 同一组参数（和输出格式）在缓存有效期内直接返回本机缓存
+        key = cache_key(source, width, height, category, blur)
+        if fmt is not None:
+            key = f"{key}:{fmt}"
+        cached = await wallpaper_cache.get(key)
+        if cached is not None:
+            try:
+                return _cached_response(request, cached, source)
+            except OSError:
+                pass  # 磁盘文件刚被淘汰，按未命中处理
+        
+        # 请求的源熔断或失败时改用后备源；后备源的图片不写入请求的源的缓存
+        if fmt is not None:
+            # 同一个键的并发未命中只下载、转码一次
+            async def produce():
+                chosen, upstream = await _open_with_failover(spec)
+                original, original_type = await _read_upstream(upstream)
+                rendered = await _render(original, original_type, width, height, fmt,
+                                         cache_key=key if chosen == source else None)
+                return rendered, chosen
             
+            (content, content_type), chosen = await wallpaper_flight.do(key, produce)
+            return _image_response(request, content, content_type, "MISS", chosen)
+        
+        # 不转码时通过代理获取图片，上游数据边读边转发
+        chosen, upstream = await _open_with_failover(spec)
+        return await _stream_upstream(upstream, chosen, cache_key=key if chosen == source else None)
+        
+    except HTTPException:
+        raise
     except httpx.TimeoutException:
         raise HTTPException(status_code=408, detail="请求超时")
     except httpx.RequestError as e:
@@ -127,6 +135,53 @@ async def get_random_wallpaper(
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 
+@router.get("/cached/{digest}")
+async def get_cached_wallpaper(request: Request, digest: str):
+    """
+    按内容摘要获取已缓存的壁纸
+    地址随内容变化，因此可以永久缓存（Cache-Control: immutable）；支持条件请求和 Range
+    """
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=400, detail="无效的图片摘要")
+    entry = await wallpaper_cache.get_object(digest)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="图片不在缓存中")
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Access-Control-Allow-Origin": "*",
+    }
+    _add_placeholder(headers, digest)
+    try:
+        return _object_response(request, entry, headers)
+    except OSError:
+        raise HTTPException(status_code=404, detail="图片不在缓存中")
+
+
+@router.get("/meta/{digest}")
+async def get_wallpaper_meta(digest: str):
+    """
+    获取已缓存壁纸的元数据和低质量占位图（data URI）
+    占位图尚未生成时在这里生成一次
+    """
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise HTTPException(status_code=400, detail="无效的图片摘要")
+    entry = await wallpaper_cache.get_object(digest)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="图片不在缓存中")
+    placeholder = await wallpaper_placeholders.load(digest)
+    if placeholder is None and wallpaper_placeholders.enabled:
+        content = await wallpaper_cache.read(entry)
+        if content is not None:
+            placeholder = await wallpaper_placeholders.ensure(digest, content)
+    return {
+        "digest": digest,
+        "url": f"/api/wallpaper/cached/{digest}",
+        "content_type": entry.content_type,
+        "size": entry.size,
+        "placeholder": placeholder,
+    }
+
+
 @router.get("/sources")
 async def get_wallpaper_sources():
     """
@@ -168,19 +223,19 @@ async def get_bing_daily_wallpaper():
     获取必应每日壁纸信息
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # 获取必应壁纸API信息
-            response = await client.get("https://api.dujin.org/bing/m.php")
+        image = await bing_catalog.latest(http_client.get())
+        if image is None:
+            raise HTTPException(status_code=500, detail="获取必应壁纸信息失败")
+        return {
+            "url": image.url,
+            "title": image.title,
+            "copyright": image.copyright,
+            "date": image.date,
+            "source": "bing"
+        }
             
-            if response.status_code == 200:
-                return {
-                    "url": response.text.strip(),
-                    "date": "today",
-                    "source": "bing"
-                }
-            else:
-                raise HTTPException(status_code=500, detail="获取必应壁纸信息失败")
-                
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"获取必应壁纸信息时发生错误: {e}")
         raise HTTPException(status_code=500, detail="服务器内部错误")
@@ -195,31 +250,18 @@ async def get_bing_history_wallpaper(days_ago: int = Query(0, description="获
         if days_ago < 0 or days_ago > 30:
             raise HTTPException(status_code=400, detail="days_ago参数必须在0-30之间")
         
-        # 使用必应官方API获取历史壁纸
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            # 必应官方壁纸API
-            api_url = f"https://www.bing.com/HPImageArchive.aspx?format=js&idx={days_ago}&n=1&mkt=zh-CN"
-            response = await client.get(api_url)
+        # 从本地必应壁纸目录读取，目录每天换图后才访问一次必应官方API
+        image = await bing_catalog.days_ago(http_client.get(), days_ago)
+        if image is None:
+            raise HTTPException(status_code=404, detail="未找到壁纸数据")
+        return {
+            "url": image.url,
+            "title": image.title,
+            "copyright": image.copyright,
+            "date": image.date,
+            "source": "bing_official"
+        }
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("images") and len(data["images"]) > 0:
-                    image_info = data["images"][0]
-                    base_url = "https://www.bing.com"
-                    image_url = base_url + image_info["url"]
-                    
-                    return {
-                        "url": image_url,
-                        "title": image_info.get("title", ""),
-                        "copyright": image_info.get("copyright", ""),
-                        "date": image_info.get("startdate", ""),
-                        "source": "bing_official"
-                    }
-                else:
-                    raise HTTPException(status_code=404, detail="未找到壁纸数据")
-            else:
-                raise HTTPException(status_code=500, detail="获取必应壁纸失败")
-                
     except HTTPException:
         raise
     except Exception as e:
@@ -227,6 +269,122 @@ async def get_bing_history_wallpaper(days_ago: int = Query(0, description="获
         raise HTTPException(status_code=500, detail="服务器内部错误")
 
 
+async def _random_bing_image(request: Request, width: int, height: int, fmt: Optional[str]) -> Response:
+    """从必应壁纸目录中随机选一天；每天的图片固定不变，缓存有效期与目录保留天数一致
+
+    转码时原图和各档位、格式的变体分别缓存，同一天的原图只下载一次。
+    """
+    client = http_client.get()
+    image = await bing_catalog.pick(client)
+    if image is None:
+        raise HTTPException(status_code=500, detail="获取必应壁纸失败")
+    ttl = WallpaperConfig.BING_CATALOG_DAYS * 86400
+    key = image.cache_key if fmt is None else f"{image.cache_key}:{width}x{height}:{fmt}"
+    cached = await wallpaper_cache.get(key, ttl=ttl)
+    if cached is not None:
+        try:
+            return _cached_response(request, cached, "bing")
+        except OSError:
+            pass  # 磁盘文件刚被淘汰，按未命中处理
+    if fmt is None:
+        return await _proxy_image(client, image.url, "bing", error_status=500, error_detail="获取必应壁纸图片失败",
+                                  cache_key=image.cache_key)
+
+    async def load_original() -> Tuple[bytes, str]:
+        original = await wallpaper_cache.get(image.cache_key, ttl=ttl)
+        content = await wallpaper_cache.read(original) if original is not None else None
+        if content is not None:
+            return content, original.content_type
+        content, content_type = await _download(image.url, error_status=500, error_detail="获取必应壁纸图片失败")
+        _store(image.cache_key, content, content_type)
+        return content, content_type
+
+    # 原图和变体分别合并：不同档位的并发请求共用一次原图下载
+    async def produce() -> Tuple[bytes, str]:
+        original, original_type = await wallpaper_flight.do(image.cache_key, load_original)
+        return await _render(original, original_type, width, height, fmt, cache_key=key)
+
+    content, content_type = await wallpaper_flight.do(key, produce)
+    return _image_response(request, content, content_type, "MISS", "bing")
+
+
+async def _render(content: bytes, content_type: str, width: int, height: int, fmt: Optional[str],
+                  cache_key: Optional[str] = None) -> Tuple[bytes, str]:
+    """按档位和格式缩放转码（转码失败时返回原图），并写入缓存"""
+    if fmt is not None:
+        rendered = await image_pipeline.render(content, width, height, fmt)
+        if rendered is not None:
+            content, content_type = rendered
+    if cache_key is not None:
+        _store(cache_key, content, content_type)
+    return content, content_type
+
+
+def _store(cache_key: str, content: bytes, content_type: str):
+    """写入缓存，并在后台为这张图片生成占位图"""
+    entry = wallpaper_cache.put(cache_key, content, content_type)
+    if entry is not None:
+        wallpaper_placeholders.ingest(entry.digest, content)
+
+
+async def _store_spool(spool: CacheSpool):
+    """流式转发读完后写入缓存，并在后台为这张图片生成占位图（大图从磁盘文件读取）"""
+    entry = await spool.commit()
+    if entry is not None:
+        wallpaper_placeholders.ingest(entry.digest, entry.content if entry.content is not None else entry.path)
+
+
+async def _download(url: str, error_status: Optional[int] = None,
+                    error_detail: Optional[str] = None) -> Tuple[bytes, str]:
+    """下载一张完整的图片，返回内容和类型"""
+    return await _read_upstream(await _open_upstream(http_client.get(), url, error_status, error_detail))
+
+
+async def _open_source(source: str, spec: PrefetchSpec):
+    """按参数打开某个壁纸源的一张图片；必应从壁纸目录中随机选取"""
+    client = http_client.get()
+    if source == "bing":
+        image = await bing_catalog.pick(client)
+        if image is None:
+            raise HTTPException(status_code=500, detail="获取必应壁纸失败")
+        return await _open_upstream(client, image.url)
+    return await _open_upstream(client, _build_wallpaper_url(source, spec.width, spec.height, spec.category, spec.blur))
+
+
+async def _open_with_failover(spec: PrefetchSpec, fallback: bool = True):
+    """跳过熔断中的源，依次（超过 p95 延迟时对冲）尝试请求的源和后备源，返回 (实际使用的源, 上游响应)"""
+    try:
+        return await source_failover.run(
+            spec.source,
+            lambda source: _open_source(source, spec),
+            discard=lambda upstream: upstream.aclose(),
+            fallback=fallback,
+        )
+    except NoSourceAvailable:
+        raise HTTPException(status_code=503, detail="壁纸源暂时不可用")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=408, detail="请求超时")
+
+
+async def _download_image(spec: PrefetchSpec) -> Tuple[bytes, str]:
+    """按预取参数下载一张图片（只使用请求的源，熔断中直接失败），并提前生成占位图"""
+    _, upstream = await _open_with_failover(spec, fallback=False)
+    content, content_type = await _read_upstream(upstream)
+    wallpaper_placeholders.ingest(content_digest(content), content)
+    return content, content_type
+
+
+def _normalize_options(source: str, category: Optional[str],
+                       blur: Optional[int]) -> Tuple[Optional[str], Optional[int]]:
+    """只保留对该壁纸源有效的参数：unsplash 的预定义分类，picsum 的 1~10 级模糊，其余为 None"""
+    config = WALLPAPER_SOURCES[source]
+    if source != "unsplash" or category not in config.get("categories", ()):
+        category = None
+    if source != "picsum" or blur is None or not 1 <= blur <= 10:
+        blur = None
+    return category, blur
+
+
 def _build_wallpaper_url(source: str, width: int, height: int, category: Optional[str], blur: Optional[int]) -> str:
     """
     根据参数构建壁纸URL
@@ -263,10 +421,214 @@ def _build_wallpaper_url(source: str, width: int, height: int, category: Optiona
         raise HTTPException(status_code=400, detail=f"不支持的壁纸源: {source}")
 
 
-async def _iter_content(content: bytes):
+class UpstreamTooLarge(Exception):
+    """上游图片超过 WallpaperConfig.MAX_IMAGE_BYTES"""
+
+
+class UpstreamStreamingResponse(StreamingResponse):
+    """转发上游响应体的流式响应
+
+    每块数据在发给客户端（send 返回）之后才读取下一块，客户端读得慢时上游读取随之暂停，
+    单个请求占用的内存不超过一块（需要缓存时各块同时写入缓存临时文件）；
+    无论正常结束、出错还是客户端断开，都会释放上游连接并删除未完成的临时文件。
+    """
+
+    def __init__(self, upstream, max_bytes: int, chunk_size: int, spool: Optional[CacheSpool] = None, **kwargs):
+        self.upstream = upstream
+        self.spool = spool
+        super().__init__(_iter_upstream(upstream, max_bytes, chunk_size, spool), **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # 客户端断开时本任务已被取消，屏蔽取消以确保连接归还连接池
+            with anyio.CancelScope(shield=True):
+                await self.upstream.aclose()
+                if self.spool is not None:
+                    await self.spool.discard()
+
+
+async def _iter_upstream(upstream, max_bytes: int, chunk_size: int, spool: Optional[CacheSpool] = None):
+    """逐块读取上游响应体，累计超过 max_bytes 时中止；spool 不为空时各块同时写入临时文件，完整读完后写入缓存"""
+    received = 0
+    async for chunk in upstream.aiter_bytes(chunk_size):
+        received += len(chunk)
+        if received > max_bytes:
+            logger.warning(f"上游图片超过 {max_bytes} 字节，已中止: {upstream.url}")
+            raise UpstreamTooLarge(str(upstream.url))
+        if spool is not None:
+            await spool.write(chunk)
+        yield chunk
+    if spool is not None:
+        await _store_spool(spool)
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """磁盘缓存命中时的文件响应
+
+    服务器支持 ASGI 的 http.response.zerocopy 扩展时把文件交给服务器用 sendfile 发送，
+    不经过 Python 读写；否则按 FileResponse 分块读取发送。
+    """
+
+    async def __call__(self, scope, receive, send):
+        if "http.response.zerocopy" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+        if self.stat_result is None:
+            self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            self.set_stat_headers(self.stat_result)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopy", "file": file,
+                            "count": self.stat_result.st_size, "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def _image_headers(cache_status: str, source: str) -> dict:
+    headers = {
+        "Cache-Control": "public, max-age=3600",  # 缓存1小时
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET",
+        "Access-Control-Allow-Headers": "*",
+        "X-Cache": cache_status,
+        "X-Wallpaper-Source": source,  # 实际提供图片的壁纸源（故障转移时与请求的不同）
+    }
+    if image_pipeline.active:
+        headers["Vary"] = "Accept"  # 输出格式取决于 Accept 头
+    return headers
+
+
+def _add_placeholder(headers: dict, *digests: Optional[str]):
+    """占位图已生成时放入响应头，前端在图片下载完成前先显示它"""
+    for digest in digests:
+        placeholder = wallpaper_placeholders.get(digest) if digest else None
+        if placeholder is not None:
+            headers["X-Wallpaper-Placeholder"] = placeholder
+            headers["Access-Control-Expose-Headers"] = "X-Wallpaper-Placeholder"
+            return
+
+
+def _image_response(request: Request, content: bytes, content_type: str, cache_status: str,
+                    source: str, original_digest: Optional[str] = None) -> Response:
+    """完整的图片内容：带 ETag，支持 304 和 Range；已进入缓存时用 Content-Location 指向不变地址
+
+    转码后的图片还没有占位图时，使用原图（original_digest）的占位图。
     """
-    异步迭代器，用于流式传输图片内容
+    headers = _image_headers(cache_status, source)
+    digest = content_digest(content)
+    if wallpaper_cache.contains(digest):
+        headers["Content-Location"] = f"/api/wallpaper/cached/{digest}"
+    _add_placeholder(headers, digest, original_digest)
+    return bytes_response(request.headers, content, content_type, headers, etag=make_etag(digest))
+
+
+def _cached_response(request: Request, entry: CachedImage, source: str) -> Response:
+    """内存命中直接返回字节；磁盘命中以文件响应返回，并在发送后读入内存"""
+    headers = _image_headers("HIT-MEMORY" if entry.content is not None else "HIT-DISK", source)
+    headers["Content-Location"] = f"/api/wallpaper/cached/{entry.digest}"
+    _add_placeholder(headers, entry.digest)
+    return _object_response(request, entry, headers, last_modified=entry.created_at)
+
+
+def _object_response(request: Request, entry: CachedImage, headers: dict,
+                     last_modified: Optional[float] = None) -> Response:
+    etag = make_etag(entry.digest)
+    if entry.content is not None:
+        return bytes_response(request.headers, entry.content, entry.content_type, headers,
+                              etag=etag, last_modified=last_modified)
+    stat_result = os.stat(entry.path)
+    return file_response(
+        request.headers, entry.path, stat_result.st_size, entry.content_type, headers, etag,
+        lambda full_headers: ZeroCopyFileResponse(
+            entry.path,
+            media_type=entry.content_type,
+            headers=full_headers,
+            stat_result=stat_result,
+            background=BackgroundTask(wallpaper_cache.promote, entry),
+        ),
+        last_modified=last_modified,
+    )
+
+
+async def _open_upstream(client, url: str, error_status: Optional[int] = None,
+                         error_detail: Optional[str] = None):
+    """发起上游请求，收到响应头且状态为 200 时返回未读取响应体的响应"""
+    upstream = await client.send(client.build_request("GET", url), stream=True)
+    if upstream.status_code != 200:
+        await upstream.aclose()
+        raise HTTPException(
+            status_code=error_status or upstream.status_code,
+            detail=error_detail or f"获取壁纸失败: {upstream.status_code}"
+        )
+    return upstream
+
+
+def _declared_length(upstream) -> Optional[int]:
+    """上游声明的 Content-Length；缺失或格式不对时返回 None，按长度未知处理（读取时仍受上限约束）"""
+    try:
+        length = int(upstream.headers.get("content-length"))
+    except (TypeError, ValueError):
+        return None
+    return length if length >= 0 else None
+
+
+def _declared_too_large(upstream) -> bool:
+    length = _declared_length(upstream)
+    return length is not None and length > WallpaperConfig.MAX_IMAGE_BYTES
+
+
+async def _stream_upstream(upstream, source: str, cache_key: Optional[str] = None) -> StreamingResponse:
+    """以流式方式转发上游图片：收到响应头即开始转发，透传 Content-Length；各块同时写入缓存临时文件，读完后写入缓存
+
+    交给 UpstreamStreamingResponse 之前出错时在这里关闭上游响应。
     """
-    chunk_size = 8192
-    for i in range(0, len(content), chunk_size):
-        yield content[i:i + chunk_size] 
\ No newline at end of file
+    try:
+        if _declared_too_large(upstream):
+            raise HTTPException(status_code=502, detail="上游图片过大")
+
+        headers = _image_headers("MISS", source)
+        # 响应体按解压后的字节转发，只有上游未压缩时长度才一致
+        content_length = _declared_length(upstream)
+        if content_length is not None and upstream.headers.get("content-encoding", "identity") == "identity":
+            headers["Content-Length"] = str(content_length)
+        media_type = upstream.headers.get("content-type", "image/jpeg")
+        spool = wallpaper_cache.spool(cache_key, media_type) if cache_key is not None else None
+        return UpstreamStreamingResponse(
+            upstream,
+            max_bytes=WallpaperConfig.MAX_IMAGE_BYTES,
+            chunk_size=WallpaperConfig.STREAM_CHUNK_SIZE,
+            spool=spool,
+            media_type=media_type,
+            headers=headers,
+        )
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await upstream.aclose()
+        raise
+
+
+async def _read_upstream(upstream) -> Tuple[bytes, str]:
+    """读取完整的上游图片（大小受 WALLPAPER_MAX_IMAGE_BYTES 限制），返回内容和类型"""
+    try:
+        if _declared_too_large(upstream):
+            raise HTTPException(status_code=502, detail="上游图片过大")
+        try:
+            chunks = [chunk async for chunk in _iter_upstream(
+                upstream, WallpaperConfig.MAX_IMAGE_BYTES, WallpaperConfig.STREAM_CHUNK_SIZE)]
+        except UpstreamTooLarge:
+            raise HTTPException(status_code=502, detail="上游图片过大")
+        return b"".join(chunks), upstream.headers.get("content-type", "image/jpeg")
+    finally:
+        await upstream.aclose()
+
+
+async def _proxy_image(client, url: str, source: str, error_status: Optional[int] = None,
+                       error_detail: Optional[str] = None, cache_key: Optional[str] = None) -> StreamingResponse:
+    """以流式方式代理指定地址的上游图片"""
+    upstream = await _open_upstream(client, url, error_status, error_detail)
+    return await _stream_upstream(upstream, source, cache_key)
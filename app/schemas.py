@@ -1,9 +1,11 @@
 """
 Pydantic数据模式定义
 """
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, computed_field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+
+from .link_tokens import sign_link_id
 
 
 # 用户认证相关模式
@@ -84,11 +86,29 @@ class QuickLinkResponse(BaseModel):
     color: str
     category: str
     created_at: datetime
+    status: Optional[str] = None
+    last_checked: Optional[datetime] = None
+    click_count: int = 0
+    user_id: int = Field(0, exclude=True)  # 0 表示未登录时返回的默认链接（临时 ID，未保存）
+    
+    @computed_field
+    @property
+    def go_token(self) -> Optional[str]:
+        """经由 /go/{go_token} 跳转并统计点击；默认链接的临时 ID 可能与他人的链接相同，不签发令牌"""
+        return sign_link_id(self.id) if self.user_id else None
     
     class Config:
         from_attributes = True
 
 
+class LinkHealthResult(BaseModel):
+    """快速链接健康检查结果模式"""
+    id: int
+    url: str
+    status: str
+    last_checked: datetime
+
+
 # 搜索引擎相关模式
 class SearchEngineCreate(BaseModel):
     """创建搜索引擎的请求模式"""
@@ -151,4 +171,175 @@ class SearchHistoryResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+
+# 监控相关模式
+class SQLRouteMetrics(BaseModel):
+    """单个路由的SQL统计"""
+    route: str
+    requests: int
+    queries: int
+    avg_queries: float
+    max_queries: int
+    db_time_ms: float
+    avg_db_time_ms: float
+    slow_queries: int
+    n_plus_one_requests: int
+
+
+class PoolStats(BaseModel):
+    """数据库连接池状态"""
+    name: str
+    pool: str
+    size: Optional[int] = None
+    checked_out: Optional[int] = None
+    idle: Optional[int] = None
+    overflow: Optional[int] = None
+    max_overflow: Optional[int] = None
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_avg_ms: float = 0.0
+    wait_p95_ms: float = 0.0
+    wait_max_ms: float = 0.0
+
+
+class ThreadPoolStats(BaseModel):
+    """同步路由线程池占用"""
+    total: int
+    borrowed: int
+
+
+class RequestGateStats(BaseModel):
+    """同步路由准入队列状态"""
+    limit: int
+    active: int
+    waiting: int
+    rejected: int
+    queue_timeout: float
+
+
+class PoolMetricsResponse(BaseModel):
+    """连接池与线程池指标"""
+    pools: List[PoolStats]
+    threadpool: ThreadPoolStats
+    request_gate: RequestGateStats
+
+
+class HTTPHostStats(BaseModel):
+    """单个上游主机的连接与请求占用"""
+    host: str
+    connections: int
+    idle: int
+    http2_connections: int
+    active_requests: int
+    waiting_requests: int
+    total_requests: int
+
+
+class HTTPClientMetricsResponse(BaseModel):
+    """共享HTTP客户端连接池状态"""
+    started: bool
+    http2_enabled: bool
+    max_connections: int
+    max_keepalive_connections: int
+    per_host_limit: int
+    connections: int
+    idle: int
+    queued_requests: int
+    hosts: List[HTTPHostStats]
+
+
+class WallpaperCacheStats(BaseModel):
+    """壁纸两级缓存命中率与容量"""
+    enabled: bool
+    lookups: int
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    hit_ratio: float
+    memory_hit_ratio: float
+    stores: int
+    memory_entries: int
+    memory_bytes: int
+    memory_max_bytes: int
+    memory_evictions: int
+    disk_bytes: int
+    disk_max_bytes: int
+    disk_evictions: int
+
+
+class WallpaperPrefetchPool(BaseModel):
+    """单个壁纸预取池状态"""
+    key: str
+    ready: int
+    target: int
+    demand_per_minute: float
+    fetch_ms: Optional[float] = None
+    served: int
+    misses: int
+    fetched: int
+    errors: int
+    bytes: int
+
+
+class WallpaperPrefetchStats(BaseModel):
+    """壁纸预取状态"""
+    enabled: bool
+    bytes: int
+    max_bytes: int
+    served_ratio: float
+    pools: List[WallpaperPrefetchPool]
+
+
+class ImagePipelineStats(BaseModel):
+    """壁纸缩放转码统计"""
+    enabled: bool
+    workers: int
+    formats: List[str]
+    rendered: int
+    failures: int
+    bytes_in: int
+    bytes_out: int
+    saved_ratio: float
+
+
+class WallpaperPlaceholderStats(BaseModel):
+    """壁纸占位图统计"""
+    enabled: bool
+    size: int
+    entries: int
+    files: int
+    pending: int
+    computed: int
+    failures: int
+    average_bytes: int
+
+
+class SingleFlightStats(BaseModel):
+    """请求合并统计"""
+    name: str
+    in_flight: int
+    calls: int
+    coalesced: int
+    errors: int
+    coalesced_ratio: float
+
+
+class WallpaperSourceHealth(BaseModel):
+    """单个壁纸源的健康状况"""
+    source: str
+    state: str
+    p95_ms: Optional[float] = None
+    hedge_delay_ms: float
+    error_rate: float
+    successes: int
+    failures: int
+    opens: int
+
+
+class WallpaperFailoverStats(BaseModel):
+    """壁纸源故障转移统计"""
+    hedges: int
+    fallbacks: int
+    sources: List[WallpaperSourceHealth]
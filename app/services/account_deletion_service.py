@@ -0,0 +1,157 @@
+"""
+账户删除服务
+先停用账户并记录注销时间，再由后台任务按批删除用户数据：每批只读取一批主键并删除，
+批与批之间提交并让出事件循环，删除大账户时既不占住工作线程，也不会把全部行加载到内存。
+记录了注销时间的账户就是待删除的账户（管理员停用的账户不会被删除）：进程在删除中途退出时，应用下次启动会继续删除。
+"""
+import asyncio
+import contextvars
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from ..config import AccountDeletionConfig
+from ..models import QuickLink, SearchEngine, SearchHistory, User
+from ..sharding import PRIMARY_SHARD, SHARD_KEY, user_shard
+
+logger = logging.getLogger(__name__)
+
+# 按数据量从大到小删除，用户行最后删除（外键 ON DELETE CASCADE 兜底清理残留）
+USER_DATA_MODELS = (SearchHistory, QuickLink, SearchEngine)
+
+# 运行中的删除任务（保留引用，避免任务被垃圾回收）
+_purge_tasks = set()
+
+
+class AccountDeletionService:
+    """账户删除服务类"""
+
+    @staticmethod
+    def deactivate_user(db: Session, user: User):
+        """停用账户并记录注销时间，令牌随即失效，数据由后台任务删除"""
+        AccountDeletionService.mark_deleted(user)
+        db.commit()
+
+    @staticmethod
+    def mark_deleted(user: User):
+        """标记账户已注销（同步和异步会话共用）"""
+        user.is_active = False
+        user.deletion_requested_at = datetime.utcnow()
+
+    @staticmethod
+    def schedule_purge(user_id: int, shard: str = PRIMARY_SHARD) -> asyncio.Task:
+        """在事件循环上启动删除任务（须在事件循环线程中调用，同步路由通过 anyio.from_thread 调用）
+
+        任务在空白上下文中运行、不挂在响应上：不计入当前请求的 SQL 统计，也不占用并发限制的名额。
+        """
+        loop = asyncio.get_running_loop()
+        task = contextvars.Context().run(loop.create_task, AccountDeletionService.purge_user(user_id, shard=shard))
+        _purge_tasks.add(task)
+        task.add_done_callback(_purge_tasks.discard)
+        return task
+
+    @staticmethod
+    async def drain():
+        """等待运行中的删除任务完成"""
+        if _purge_tasks:
+            await asyncio.gather(*list(_purge_tasks), return_exceptions=True)
+
+    @staticmethod
+    def delete_batch(db: Session, model, user_id: int, batch_size: int) -> int:
+        """删除用户的一批数据行，返回删除的行数"""
+        # MySQL 不支持 IN 子查询中使用 LIMIT，先取出一批主键再删除
+        ids = db.execute(
+            select(model.id).where(model.user_id == user_id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return 0
+        db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        return len(ids)
+
+    @staticmethod
+    def delete_batch_with_new_session(model, user_id: int, batch_size: int, shard: str = PRIMARY_SHARD) -> int:
+        """使用独立会话在用户所在分片上删除一批数据"""
+        from ..database import SessionLocal
+
+        db = SessionLocal()
+        db.info[SHARD_KEY] = shard
+        try:
+            return AccountDeletionService.delete_batch(db, model, user_id, batch_size)
+        finally:
+            db.close()
+
+    @staticmethod
+    def delete_user_row(user_id: int) -> bool:
+        """删除用户行"""
+        from ..database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            result = db.execute(delete(User).where(User.id == user_id))
+            db.commit()
+            return result.rowcount > 0
+        finally:
+            db.close()
+
+    @staticmethod
+    async def purge_user(user_id: int, batch_size: Optional[int] = None, pause: Optional[float] = None,
+                         shard: str = PRIMARY_SHARD) -> int:
+        """后台任务：按批删除用户全部数据和用户本身，返回删除的数据行数"""
+        batch_size = batch_size or AccountDeletionConfig.BATCH_SIZE
+        pause = AccountDeletionConfig.BATCH_PAUSE if pause is None else pause
+        total = 0
+        try:
+            for model in USER_DATA_MODELS:
+                while True:
+                    deleted = await run_in_threadpool(
+                        AccountDeletionService.delete_batch_with_new_session, model, user_id, batch_size, shard
+                    )
+                    total += deleted
+                    if deleted < batch_size:
+                        break
+                    await asyncio.sleep(pause)
+            await run_in_threadpool(AccountDeletionService.delete_user_row, user_id)
+        except Exception as e:
+            # 账户已注销，残留数据不影响其他用户；应用下次启动时继续删除（resume_pending_purges）
+            logger.error(f"删除用户 {user_id} 的数据失败（已删除 {total} 行）: {e}")
+            return total
+        logger.info(f"用户 {user_id} 已删除，共删除 {total} 行数据")
+        return total
+
+    @staticmethod
+    def pending_purges() -> List[Tuple[int, str]]:
+        """已注销但尚未删除的账户，返回 [(用户ID, 所在分片)]"""
+        from ..database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            rows = db.execute(select(User.id, User.shard).where(User.deletion_requested_at.is_not(None))).all()
+            return [(row.id, user_shard(row)) for row in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    async def resume_pending_purges() -> int:
+        """启动时的后台任务：继续删除上次没有删完的账户，返回处理的账户数
+
+        多个工作进程同时执行时只会重复删除同一批主键，结果不变。
+        """
+        from ..database import SessionLocal
+
+        if SessionLocal is None:
+            return 0
+        try:
+            pending = await run_in_threadpool(AccountDeletionService.pending_purges)
+        except Exception as e:
+            logger.error(f"查询待删除账户失败: {e}")
+            return 0
+        if pending:
+            logger.info(f"继续删除 {len(pending)} 个已注销的账户")
+        for user_id, shard in pending:
+            await AccountDeletionService.purge_user(user_id, shard=shard)
+        return len(pending)
@@ -0,0 +1,183 @@
+"""
+必应壁纸目录
+HPImageArchive 单次最多返回 8 天，因此按 n=8 分批拉取，并把最近若干天的元数据（日期、地址、标题、版权）
+保存在本地 JSON 文件中，每次刷新只补充新出现的日期，超过保留天数的旧条目才删除。
+必应在市场所在时区的零点换图，目录在换图后才再次访问上游；上游失败时继续使用已有目录，稍后重试。
+"""
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import WallpaperConfig
+from ..singleflight import flight
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_URL = "https://www.bing.com/HPImageArchive.aspx"
+BATCH_SIZE = 8  # 必应单次请求的最大天数
+
+
+@dataclass
+class BingImage:
+    """一天的必应壁纸元数据"""
+    date: str  # 开始日期 YYYYMMDD
+    url: str
+    title: str = ""
+    copyright: str = ""
+    end_date: str = ""  # 下一张壁纸的开始日期
+
+    @classmethod
+    def from_archive(cls, item: dict) -> "BingImage":
+        return cls(date=item["startdate"], url="https://www.bing.com" + item["url"],
+                   title=item.get("title", ""), copyright=item.get("copyright", ""),
+                   end_date=item.get("enddate", ""))
+
+    @property
+    def cache_key(self) -> str:
+        """图片在壁纸缓存中的键，同一天的图片不随请求尺寸变化"""
+        return f"bing:{self.date}"
+
+
+class BingCatalog:
+    """本地持久化的必应壁纸目录"""
+
+    def __init__(self, path: Optional[str] = None, days: Optional[int] = None, market: Optional[str] = None,
+                 utc_offset: Optional[float] = None, retry_interval: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        self.path = path or WallpaperConfig.BING_CATALOG_PATH
+        self.days = days or WallpaperConfig.BING_CATALOG_DAYS
+        self.market = market or WallpaperConfig.BING_MARKET
+        self.utc_offset = WallpaperConfig.BING_UTC_OFFSET if utc_offset is None else utc_offset
+        self.retry_interval = WallpaperConfig.BING_RETRY_INTERVAL if retry_interval is None else retry_interval
+        self.clock = clock
+        self._images: Dict[str, BingImage] = {}
+        self._loaded = False
+        self._next_refresh = 0.0
+        self._flight = flight("bing_catalog")
+        self.refreshes = 0
+        self.upstream_requests = 0
+
+    def images(self) -> List[BingImage]:
+        """按日期从新到旧排列"""
+        return [self._images[date] for date in sorted(self._images, reverse=True)]
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._images = {item["date"]: BingImage(**item) for item in data.get("images", [])}
+            self._next_refresh = self._rollover_after(self.images()[0]) if self._images else 0.0
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"读取必应壁纸目录失败，将重新拉取: {e}")
+        self._loaded = True
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"market": self.market, "images": [asdict(image) for image in self.images()]},
+                          f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _rollover_after(self, latest: BingImage) -> float:
+        """最新一张壁纸之后的换图时刻（市场时区零点）；没有结束日期时按开始日期加一天计算"""
+        tz = timezone(timedelta(hours=self.utc_offset))
+        try:
+            if latest.end_date:
+                day = datetime.strptime(latest.end_date, "%Y%m%d")
+            else:
+                day = datetime.strptime(latest.date, "%Y%m%d") + timedelta(days=1)
+        except ValueError:
+            return self.clock() + self.retry_interval
+        return day.replace(tzinfo=tz).timestamp()
+
+    async def ensure(self, client: "httpx.AsyncClient") -> List[BingImage]:
+        """返回目录；尚未加载时从文件加载，到了换图时刻时刷新（并发请求共用一次刷新）"""
+        if self._loaded and self.clock() < self._next_refresh:
+            return self.images()
+        await self._flight.do(self.path, lambda: self._load_and_refresh(client))
+        return self.images()
+
+    async def _load_and_refresh(self, client: "httpx.AsyncClient"):
+        if not self._loaded:
+            await run_in_threadpool(self._load)
+        if self.clock() >= self._next_refresh:
+            await self.refresh(client)
+
+    async def refresh(self, client: "httpx.AsyncClient"):
+        """按 n=8 分批向前拉取，直到补齐保留天数或某一批没有新日期"""
+        added = 0
+        try:
+            for idx in range(0, self.days, BATCH_SIZE):
+                self.upstream_requests += 1
+                response = await client.get(ARCHIVE_URL, params={
+                    "format": "js", "idx": idx, "n": BATCH_SIZE, "mkt": self.market})
+                if response.status_code != 200:
+                    raise RuntimeError(f"必应返回 {response.status_code}")
+                batch = [BingImage.from_archive(item) for item in response.json().get("images") or []]
+                new = [image for image in batch if image.date not in self._images]
+                for image in new:
+                    self._images[image.date] = image
+                added += len(new)
+                # 这一批满 8 天且全是新日期时，更早的日期可能也还没有
+                if len(batch) < BATCH_SIZE or len(new) < len(batch):
+                    break
+        except Exception as e:
+            self._next_refresh = self.clock() + self.retry_interval
+            logger.warning(f"刷新必应壁纸目录失败，{self.retry_interval:.0f} 秒后重试: {e}")
+            if added:
+                await self._persist()
+            return
+
+        for date in sorted(self._images, reverse=True)[self.days:]:
+            del self._images[date]
+        images = self.images()
+        self._next_refresh = self._rollover_after(images[0]) if images else self.clock() + self.retry_interval
+        # 换图时刻已过但上游还没换图（刚过零点）时，稍后再试
+        if self._next_refresh <= self.clock():
+            self._next_refresh = self.clock() + self.retry_interval
+        self.refreshes += 1
+        logger.info(f"必应壁纸目录已刷新：新增 {added} 天，共 {len(images)} 天")
+        await self._persist()
+
+    async def _persist(self):
+        try:
+            await run_in_threadpool(self._save)
+        except OSError as e:
+            logger.warning(f"保存必应壁纸目录失败: {e}")
+
+    async def latest(self, client: "httpx.AsyncClient") -> Optional[BingImage]:
+        images = await self.ensure(client)
+        return images[0] if images else None
+
+    async def days_ago(self, client: "httpx.AsyncClient", days: int) -> Optional[BingImage]:
+        images = await self.ensure(client)
+        return images[days] if days < len(images) else None
+
+    async def pick(self, client: "httpx.AsyncClient") -> Optional[BingImage]:
+        """随机选取一天的壁纸"""
+        images = await self.ensure(client)
+        return random.choice(images) if images else None
+
+
+# 进程级共享的必应壁纸目录
+bing_catalog = BingCatalog()
@@ -0,0 +1,121 @@
+"""
+快速链接点击计数服务
+"""
+import asyncio
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import Session
+
+from ..config import ClickCounterConfig
+from ..models import QuickLink
+from ..sharding import PRIMARY_SHARD, ShardMap, use_shard
+
+logger = logging.getLogger(__name__)
+
+
+class ClickCounter:
+    """内存点击计数器
+
+    点击只在内存中累加，由后台任务定期合并为一条批量 UPDATE 刷写，
+    请求路径上不产生任何数据库写入。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Counter = Counter()
+
+    def record(self, link_id: int):
+        """记录一次点击"""
+        with self._lock:
+            self._pending[link_id] += 1
+
+    def pending(self) -> Dict[int, int]:
+        """返回尚未刷写的计数快照"""
+        with self._lock:
+            return dict(self._pending)
+
+    def _drain(self) -> Counter:
+        """取出全部待刷写计数"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        return pending
+
+    def _restore(self, pending: Counter):
+        """刷写失败时把计数放回，等待下次刷写"""
+        with self._lock:
+            self._pending.update(pending)
+
+    def flush(self, db: Session, shard_map: Optional[ShardMap] = None) -> int:
+        """把待刷写计数批量写入数据库，返回更新的链接数
+
+        配置了分片时按主键区间（shard_for_id）把计数分组，每个分片只执行属于它的那一批 UPDATE，
+        并单独提交；某个分片失败时只放回该分片的计数，已提交的分片不会在下次重复累加。
+        """
+        pending = self._drain()
+        if not pending:
+            return 0
+
+        table = QuickLink.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("link_id"))
+            .values(click_count=table.c.click_count + bindparam("delta"))
+        )
+        batches = defaultdict(list)
+        for link_id, delta in pending.items():
+            shard = shard_map.shard_for_id(link_id) if shard_map is not None else PRIMARY_SHARD
+            batches[shard].append({"link_id": link_id, "delta": delta})
+        flushed = 0
+        for shard, params in batches.items():
+            try:
+                with use_shard(db, shard):
+                    db.execute(stmt, params)
+                    db.commit()
+            except Exception as e:
+                logger.error(f"分片 {shard} 点击计数刷写失败，将在下次重试: {e}")
+                db.rollback()
+                self._restore(Counter({param["link_id"]: param["delta"] for param in params}))
+                continue
+            flushed += len(params)
+        return flushed
+
+
+# 进程级点击计数器
+click_counter = ClickCounter()
+
+
+class ClickCounterService:
+    """点击计数服务类"""
+
+    @staticmethod
+    def flush_with_new_session(counter: Optional[ClickCounter] = None) -> int:
+        """使用独立会话刷写计数"""
+        from ..database import SessionLocal, shard_map
+
+        counter = counter or click_counter
+        if SessionLocal is None or not counter.pending():
+            return 0
+        db = SessionLocal()
+        try:
+            return counter.flush(db, shard_map)
+        finally:
+            db.close()
+
+    @staticmethod
+    async def run_periodic_flush(interval: Optional[int] = None):
+        """后台刷写任务：定期批量刷写点击计数，取消时做最后一次刷写"""
+        interval = interval or ClickCounterConfig.FLUSH_INTERVAL
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                flushed = await run_in_threadpool(ClickCounterService.flush_with_new_session)
+                if flushed:
+                    logger.info(f"点击计数已刷写: {flushed} 个链接")
+        except asyncio.CancelledError:
+            await run_in_threadpool(ClickCounterService.flush_with_new_session)
+            raise
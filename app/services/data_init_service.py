@@ -144,6 +144,37 @@ class DataInitService:
             db.rollback()
             return False
     
+    @staticmethod
+    def build_user_default_data(user_id: int) -> list:
+        """构建新用户的默认快速链接和搜索引擎对象（只构建，不写库）"""
+        from ..models import QuickLink, SearchEngine
+        objects = [
+            QuickLink(
+                name=link_data["name"],
+                url=link_data["url"],
+                icon=link_data["icon"],
+                color=link_data["color"],
+                category=link_data["category"],
+                user_id=user_id
+            )
+            for link_data in DefaultData.DEFAULT_QUICK_LINKS
+        ]
+        objects.extend(
+            SearchEngine(
+                name=engine_data["name"],
+                display_name=engine_data["display_name"],
+                url_template=engine_data["url_template"],
+                icon=engine_data["icon"],
+                color=engine_data["color"],
+                is_active=engine_data["is_active"],
+                is_default=engine_data["is_default"],
+                sort_order=engine_data["sort_order"],
+                user_id=user_id
+            )
+            for engine_data in DefaultData.DEFAULT_SEARCH_ENGINES
+        )
+        return objects
+    
     @staticmethod
     def _init_user_quick_links(db: Session, user_id: int) -> bool:
         """为用户初始化默认快速链接"""
@@ -0,0 +1,173 @@
+"""
+壁纸缩放与转码
+把上游原图按请求的分辨率档位裁剪缩放，并按浏览器的 Accept 头转成 AVIF / WebP（都不支持时为 JPEG）。
+解码、缩放、编码都是 CPU 密集操作，放在进程池中执行，不占用事件循环和线程池。
+PIL 只在首次转码时导入，不影响冷启动。
+"""
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional, Tuple, Union
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import WallpaperConfig
+
+logger = logging.getLogger(__name__)
+
+# 按优先级排列：(格式, MIME 类型, PIL 格式名)
+FORMATS = (("avif", "image/avif", "AVIF"), ("webp", "image/webp", "WEBP"), ("jpeg", "image/jpeg", "JPEG"))
+CONTENT_TYPES = {name: mime for name, mime, _ in FORMATS}
+
+
+def _pil_format(fmt: str) -> str:
+    return next(pil for name, _, pil in FORMATS if name == fmt)
+
+
+def _register_plugins():
+    """AVIF 编码需要可选插件 pillow-avif-plugin"""
+    try:
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+
+
+def available_formats() -> Tuple[str, ...]:
+    """当前环境能够编码的格式"""
+    from PIL import Image
+
+    _register_plugins()
+    Image.init()
+    return tuple(name for name, _, pil in FORMATS if pil in Image.SAVE)
+
+
+def transcode(content: bytes, width: int, height: int, fmt: str, quality: int) -> bytes:
+    """裁剪到目标宽高比并缩小到目标尺寸（不放大），再编码为指定格式
+
+    在进程池中执行，必须是模块级函数。
+    """
+    from PIL import Image, ImageOps
+
+    _register_plugins()
+    with Image.open(BytesIO(content)) as source:
+        img = ImageOps.exif_transpose(source)
+        # 与前端 background-size: cover 一致：居中裁剪出目标宽高比
+        target_ratio = width / height
+        if img.width / img.height > target_ratio:
+            crop_width = round(img.height * target_ratio)
+            left = (img.width - crop_width) // 2
+            img = img.crop((left, 0, left + crop_width, img.height))
+        else:
+            crop_height = round(img.width / target_ratio)
+            top = (img.height - crop_height) // 2
+            img = img.crop((0, top, img.width, top + crop_height))
+        if img.width > width:
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        if img.mode not in ("RGB", "RGBA") or (fmt == "jpeg" and img.mode != "RGB"):
+            img = img.convert("RGB")
+        output = BytesIO()
+        options = {"quality": quality}
+        if fmt == "webp":
+            options["method"] = 4
+        elif fmt == "jpeg":
+            options.update(optimize=True, progressive=True)
+        img.save(output, format=_pil_format(fmt), **options)
+        return output.getvalue()
+
+
+def placeholder(content: Union[bytes, str], size: int, quality: int) -> bytes:
+    """生成最长边为 size 像素的 WebP 小图，供图片加载前模糊显示（content 为图片内容或文件路径）"""
+    from PIL import Image
+
+    with Image.open(content if isinstance(content, str) else BytesIO(content)) as source:
+        source.draft("RGB", (size * 4, size * 4))  # JPEG 解码时直接按比例缩小，省去解出整张大图
+        img = source.convert("RGB")
+        img.thumbnail((size, size), Image.Resampling.BILINEAR)
+        output = BytesIO()
+        img.save(output, format="WEBP", quality=quality)
+        return output.getvalue()
+
+
+class ImagePipeline:
+    """缩放转码进程池"""
+
+    def __init__(self, enabled: Optional[bool] = None, workers: Optional[int] = None):
+        self.enabled = WallpaperConfig.PIPELINE_ENABLED if enabled is None else enabled
+        # 0 表示在线程池中执行（不启动子进程）
+        self.workers = WallpaperConfig.PIPELINE_WORKERS if workers is None else workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._formats: Optional[Tuple[str, ...]] = None
+        self.rendered = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def formats(self) -> Tuple[str, ...]:
+        if self._formats is None:
+            try:
+                self._formats = available_formats()
+            except ImportError:
+                logger.warning("未安装 Pillow，壁纸不做缩放转码")
+                self._formats = ()
+        return self._formats
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and "jpeg" in self.formats
+
+    def negotiate(self, accept: Optional[str]) -> str:
+        """按 Accept 头选择输出格式：AVIF 优先于 WebP，都不接受时输出 JPEG"""
+        accept = (accept or "").lower()
+        for name, mime, _ in FORMATS[:-1]:
+            if mime in accept and name in self.formats:
+                return name
+        return "jpeg"
+
+    def quality(self, fmt: str) -> int:
+        return {"avif": WallpaperConfig.AVIF_QUALITY, "webp": WallpaperConfig.WEBP_QUALITY}.get(
+            fmt, WallpaperConfig.JPEG_QUALITY)
+
+    async def submit(self, fn, *args):
+        """在进程池（workers 为 0 时在线程池）中执行模块级函数"""
+        if self.workers > 0:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        return await run_in_threadpool(fn, *args)
+
+    async def render(self, content: bytes, width: int, height: int, fmt: str) -> Optional[Tuple[bytes, str]]:
+        """返回 (图片, MIME 类型)；原图无法解码或编码失败时返回 None，由调用方回退为原图"""
+        try:
+            output = await self.submit(transcode, content, width, height, fmt, self.quality(fmt))
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"壁纸转码失败（{width}x{height} {fmt}）: {e}")
+            return None
+        self.rendered += 1
+        self.bytes_in += len(content)
+        self.bytes_out += len(output)
+        return output, CONTENT_TYPES[fmt]
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.active,
+            "workers": self.workers,
+            "formats": list(self.formats) if self._formats is not None else [],
+            "rendered": self.rendered,
+            "failures": self.failures,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "saved_ratio": round(1 - self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+        }
+
+
+# 进程级共享的壁纸转码进程池
+image_pipeline = ImagePipeline()
@@ -0,0 +1,293 @@
+"""
+快速链接健康检查服务
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from ..config import LinkHealthConfig
+from ..models import QuickLink
+from ..sharding import PRIMARY_SHARD, use_shard
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# 链接状态
+STATUS_OK = "ok"          # 2xx/3xx
+STATUS_BROKEN = "broken"  # 4xx/5xx
+STATUS_ERROR = "error"    # 超时、DNS失败、URL非法等
+
+# HEAD 不被支持时回退为 GET 的状态码
+HEAD_FALLBACK_STATUS = {403, 405, 501}
+
+REDIRECT_STATUS = {301, 302, 303, 307, 308}
+
+
+class BlockedTarget(Exception):
+    """链接指向不允许访问的地址（内网、回环、链路本地等）或不是 http(s) URL"""
+
+
+def is_public_address(address: str) -> bool:
+    """是否为公网地址；回环、私有、链路本地（含 169.254.169.254 元数据服务）、保留和组播地址都不是"""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class LinkChecker:
+    """并发链接检查器
+
+    全局和单主机并发都有上限；同一批次内相同URL只请求一次，
+    检查结果按TTL缓存，跨批次、跨用户复用；缓存条数有上限（最近最少使用的先淘汰），
+    每批检查后清理已过期的条目，长时间运行的进程中不会无限增长。
+    URL 由用户提交：重定向手动跟随，每一跳请求前都解析主机名，解析到非公网地址时不发起请求。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        per_host_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[int] = None,
+        cache_max_entries: Optional[int] = None,
+        max_redirects: Optional[int] = None,
+        allow_private: Optional[bool] = None,
+    ):
+        self.max_concurrency = max_concurrency or LinkHealthConfig.MAX_CONCURRENCY
+        self.per_host_concurrency = per_host_concurrency or LinkHealthConfig.PER_HOST_CONCURRENCY
+        self.timeout = timeout or LinkHealthConfig.TIMEOUT
+        self.cache_ttl = LinkHealthConfig.CACHE_TTL if cache_ttl is None else cache_ttl
+        self.cache_max_entries = cache_max_entries or LinkHealthConfig.CACHE_MAX_ENTRIES
+        self.max_redirects = LinkHealthConfig.MAX_REDIRECTS if max_redirects is None else max_redirects
+        self.allow_private = LinkHealthConfig.ALLOW_PRIVATE if allow_private is None else allow_private
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _get_cached(self, url: str) -> Optional[str]:
+        """读取未过期的缓存结果"""
+        cached = self._cache.get(url)
+        if cached is None:
+            return None
+        status, expires_at = cached
+        if expires_at < time.monotonic():
+            del self._cache[url]
+            return None
+        self._cache.move_to_end(url)
+        return status
+
+    def _store(self, url: str, status: str, expires_at: float):
+        self._cache[url] = (status, expires_at)
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def _sweep_expired(self):
+        """删除已过期的缓存条目"""
+        now = time.monotonic()
+        for url in [url for url, (_, expires_at) in self._cache.items() if expires_at < now]:
+            del self._cache[url]
+
+    def clear_cache(self):
+        """清空结果缓存"""
+        self._cache.clear()
+
+    async def check_urls(self, urls: Iterable[str]) -> Dict[str, str]:
+        """检查一组URL，返回 {url: status}"""
+        results: Dict[str, str] = {}
+        pending: List[str] = []
+        for url in dict.fromkeys(urls):
+            cached = self._get_cached(url)
+            if cached is not None:
+                results[url] = cached
+            else:
+                pending.append(url)
+
+        if not pending:
+            self._sweep_expired()
+            return results
+
+        # httpx 只在实际检查时导入，不影响未启用巡检时的启动时间
+        import httpx
+
+        # 信号量绑定当前事件循环，每次调用单独创建
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+
+        async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=False, limits=limits) as client:
+            statuses = await asyncio.gather(
+                *(self._check_one(client, url, global_limit, host_limits) for url in pending)
+            )
+
+        expires_at = time.monotonic() + self.cache_ttl
+        for url, status in zip(pending, statuses):
+            self._store(url, status, expires_at)
+            results[url] = status
+        self._sweep_expired()
+        return results
+
+    async def _check_one(
+        self,
+        client: "httpx.AsyncClient",
+        url: str,
+        global_limit: asyncio.Semaphore,
+        host_limits: Dict[str, asyncio.Semaphore],
+    ) -> str:
+        """检查单个URL（先HEAD，不支持时回退GET且不读取响应体）"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return STATUS_ERROR
+
+        host = parts.hostname.lower()
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+
+        import httpx
+
+        # 先占主机名额再占全局名额，避免排队中的请求占用全局并发
+        async with host_limit, global_limit:
+            try:
+                status_code = await self._request(client, url)
+            except (httpx.HTTPError, BlockedTarget, OSError, ValueError) as e:
+                logger.debug(f"链接检查失败 {url}: {e}")
+                return STATUS_ERROR
+
+        return STATUS_OK if status_code < 400 else STATUS_BROKEN
+
+    async def _request(self, client: "httpx.AsyncClient", url: str) -> int:
+        """手动跟随重定向，每一跳请求前校验目标地址，返回最终响应的状态码"""
+        method = "HEAD"
+        for _ in range(self.max_redirects + 1):
+            await self._ensure_allowed(url)
+            async with client.stream(method, url) as response:
+                status_code = response.status_code
+                location = response.headers.get("location")
+            if method == "HEAD" and status_code in HEAD_FALLBACK_STATUS:
+                method = "GET"
+                continue
+            if status_code in REDIRECT_STATUS and location:
+                url = urljoin(url, location)
+                continue
+            return status_code
+        raise BlockedTarget(f"重定向超过 {self.max_redirects} 次")
+
+    async def _ensure_allowed(self, url: str):
+        """URL 必须是 http(s)，且主机名解析出的每个地址都是公网地址"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise BlockedTarget(f"不支持的URL: {url}")
+        if self.allow_private:
+            return
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        for *_, sockaddr in infos:
+            if not is_public_address(sockaddr[0]):
+                raise BlockedTarget(f"{parts.hostname} 解析到非公网地址 {sockaddr[0]}")
+
+
+# 进程级共享的检查器，缓存在后台任务和按需检查之间复用
+link_checker = LinkChecker()
+
+
+class LinkHealthService:
+    """快速链接健康检查服务类"""
+
+    @staticmethod
+    def _fetch_batch(db: Session, last_id: int, limit: int, user_id: Optional[int] = None) -> List[Tuple[int, str]]:
+        """按主键游标读取一批 (id, url)"""
+        query = db.query(QuickLink.id, QuickLink.url).filter(QuickLink.id > last_id)
+        if user_id is not None:
+            query = query.filter(QuickLink.user_id == user_id)
+        return [(row.id, row.url) for row in query.order_by(QuickLink.id).limit(limit).all()]
+
+    @staticmethod
+    def _persist_results(db: Session, statuses: List[Tuple[int, str]], checked_at: datetime):
+        """按主键批量写回检查结果（单条 executemany UPDATE）"""
+        if not statuses:
+            return
+        db.execute(
+            update(QuickLink),
+            [{"id": link_id, "status": status, "last_checked": checked_at} for link_id, status in statuses],
+        )
+        db.commit()
+
+    @staticmethod
+    async def check_links(
+        db: Session,
+        user_id: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        checker: Optional[LinkChecker] = None,
+    ) -> List[dict]:
+        """分批检查快速链接并写回结果，user_id 为空时检查全部链接"""
+        results = []
+        async for batch in LinkHealthService.iter_check_batches(db, user_id, batch_size, checker):
+            results.extend(batch)
+        return results
+
+    @staticmethod
+    async def iter_check_batches(
+        db: Session,
+        user_id: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        checker: Optional[LinkChecker] = None,
+    ) -> AsyncIterator[List[dict]]:
+        """分批检查快速链接并写回结果，每写回一批产出该批的结果"""
+        batch_size = batch_size or LinkHealthConfig.BATCH_SIZE
+        checker = checker or link_checker
+        last_id = 0
+
+        while True:
+            rows = await run_in_threadpool(LinkHealthService._fetch_batch, db, last_id, batch_size, user_id)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            url_status = await checker.check_urls(url for _, url in rows)
+            checked_at = datetime.utcnow()
+            statuses = [(link_id, url_status[url]) for link_id, url in rows]
+            await run_in_threadpool(LinkHealthService._persist_results, db, statuses, checked_at)
+
+            yield [
+                {"id": link_id, "url": url, "status": url_status[url], "last_checked": checked_at}
+                for link_id, url in rows
+            ]
+
+    @staticmethod
+    async def run_periodic_checks(interval: Optional[int] = None):
+        """后台巡检任务：周期性检查全部快速链接"""
+        from ..database import SessionLocal, shard_map
+
+        interval = interval or LinkHealthConfig.INTERVAL
+        while True:
+            db = SessionLocal()
+            try:
+                started = time.monotonic()
+                # 只累计计数，不保留各批结果，内存占用与链接总数无关
+                total = broken = 0
+                for shard in (shard_map.names if shard_map is not None else [PRIMARY_SHARD]):
+                    with use_shard(db, shard):
+                        async for batch in LinkHealthService.iter_check_batches(db):
+                            total += len(batch)
+                            broken += sum(1 for item in batch if item["status"] != STATUS_OK)
+                logger.info(
+                    f"链接健康巡检完成: 共 {total} 条, 异常 {broken} 条, "
+                    f"耗时 {time.monotonic() - started:.1f}s"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"链接健康巡检失败: {e}")
+            finally:
+                db.close()
+            await asyncio.sleep(interval)
@@ -1,6 +1,8 @@
 """
 快速链接服务
 """
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -8,13 +10,20 @@ from datetime import datetime
 from ..models import QuickLink
 from ..schemas import QuickLinkCreate, QuickLinkUpdate
 from ..config import DefaultData
+from ..sharding import use_shard
+from .. import database
 
 
 class QuickLinkService:
     """快速链接服务类"""
     
     @staticmethod
-    def get_quick_links(db: Session, user_id: Optional[int] = None, category: Optional[str] = None) -> List[QuickLink]:
+    def get_quick_links(
+        db: Session,
+        user_id: Optional[int] = None,
+        category: Optional[str] = None,
+        sort: Optional[str] = None
+    ) -> List[QuickLink]:
         """获取用户的快速链接列表，如果没有用户ID则返回默认数据"""
         if user_id is None:
             # 返回默认快速链接数据（用于未登录用户）
@@ -30,6 +39,9 @@ class QuickLinkService:
         query = db.query(QuickLink).filter(QuickLink.user_id == user_id)
         if category and category != "all":
             query = query.filter(QuickLink.category == category)
+        if sort == "usage":
+            # 按已刷写的点击次数排序，尚未刷写的点击不影响本次排序
+            query = query.order_by(QuickLink.click_count.desc(), QuickLink.id.desc())
         return query.all()
     
     @staticmethod
@@ -47,6 +59,7 @@ class QuickLinkService:
                 color=link_data["color"],
                 category=link_data["category"],
                 user_id=0,  # 表示是默认数据
+                click_count=0,
                 created_at=current_time  # 添加创建时间
             )
             default_links.append(link)
@@ -65,7 +78,6 @@ class QuickLinkService:
         )
         db.add(db_link)
         db.commit()
-        db.refresh(db_link)
         return db_link
     
     @staticmethod
@@ -76,6 +88,15 @@ class QuickLinkService:
             QuickLink.user_id == user_id
         ).first()
     
+    @staticmethod
+    def get_quick_link_url(db: Session, link_id: int) -> Optional[str]:
+        """根据ID获取快速链接的目标地址（用于跳转）"""
+        if database.shard_map is None:
+            return db.query(QuickLink.url).filter(QuickLink.id == link_id).scalar()
+        # 跳转不带用户信息，由主键区间判断所在分片
+        with use_shard(db, database.shard_map.shard_for_id(link_id)):
+            return db.query(QuickLink.url).filter(QuickLink.id == link_id).scalar()
+    
     @staticmethod
     def update_quick_link(db: Session, link_id: int, link_data: QuickLinkUpdate, user_id: int) -> Optional[QuickLink]:
         """更新快速链接"""
@@ -95,7 +116,6 @@ class QuickLinkService:
             db_link.category = link_data.category
         
         db.commit()
-        db.refresh(db_link)
         return db_link
     
     @staticmethod
@@ -131,4 +151,74 @@ class QuickLinkService:
             return True
         except Exception:
             db.rollback()
-            return False 
\ No newline at end of file
+            return False 
+
+
+class AsyncQuickLinkService:
+    """快速链接服务类（异步会话版本）"""
+    
+    @staticmethod
+    async def get_quick_links(
+        db: AsyncSession,
+        user_id: Optional[int] = None,
+        category: Optional[str] = None,
+        sort: Optional[str] = None
+    ) -> List[QuickLink]:
+        """获取用户的快速链接列表，如果没有用户ID则返回默认数据"""
+        if user_id is None:
+            # 默认数据不访问数据库
+            return QuickLinkService.get_quick_links(None, None, category)
+        
+        stmt = select(QuickLink).where(QuickLink.user_id == user_id)
+        if category and category != "all":
+            stmt = stmt.where(QuickLink.category == category)
+        if sort == "usage":
+            stmt = stmt.order_by(QuickLink.click_count.desc(), QuickLink.id.desc())
+        return list(await db.scalars(stmt))
+    
+    @staticmethod
+    async def create_quick_link(db: AsyncSession, link_data: QuickLinkCreate, user_id: int) -> QuickLink:
+        """创建快速链接"""
+        db_link = QuickLink(
+            name=link_data.name,
+            url=link_data.url,
+            icon=link_data.icon,
+            color=link_data.color,
+            category=link_data.category,
+            user_id=user_id
+        )
+        db.add(db_link)
+        await db.commit()
+        return db_link
+    
+    @staticmethod
+    async def get_quick_link_by_id(db: AsyncSession, link_id: int, user_id: int) -> Optional[QuickLink]:
+        """根据ID获取用户的快速链接"""
+        return await db.scalar(select(QuickLink).where(
+            QuickLink.id == link_id,
+            QuickLink.user_id == user_id
+        ))
+    
+    @staticmethod
+    async def update_quick_link(db: AsyncSession, link_id: int, link_data: QuickLinkUpdate, user_id: int) -> Optional[QuickLink]:
+        """更新快速链接"""
+        db_link = await AsyncQuickLinkService.get_quick_link_by_id(db, link_id, user_id)
+        if not db_link:
+            return None
+        
+        for field, value in link_data.model_dump(exclude_none=True).items():
+            setattr(db_link, field, value)
+        
+        await db.commit()
+        return db_link
+    
+    @staticmethod
+    async def delete_quick_link(db: AsyncSession, link_id: int, user_id: int) -> bool:
+        """删除快速链接"""
+        db_link = await AsyncQuickLinkService.get_quick_link_by_id(db, link_id, user_id)
+        if not db_link:
+            return False
+        
+        await db.delete(db_link)
+        await db.commit()
+        return True
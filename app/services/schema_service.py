@@ -0,0 +1,140 @@
+"""
+数据库结构版本服务
+启动时比较模型结构和默认数据的指纹与库中记录，一致时跳过建表和默认数据初始化
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..config import DefaultData
+from ..models import SchemaVersion
+from .. import database
+from .data_init_service import DataInitService
+
+logger = logging.getLogger(__name__)
+
+# schema_version 表中本应用的记录名
+SCHEMA_KEY = "app"
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class SchemaService:
+    """数据库结构版本服务类"""
+
+    @staticmethod
+    def schema_fingerprint(metadata=None) -> str:
+        """根据表、列、外键和索引定义计算结构指纹"""
+        metadata = metadata or database.Base.metadata
+        tables = []
+        for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+            tables.append({
+                "name": table.name,
+                "columns": [
+                    {
+                        "name": column.name,
+                        "type": str(column.type),
+                        "nullable": column.nullable,
+                        "primary_key": column.primary_key,
+                        "unique": bool(column.unique),
+                        "server_default": str(column.server_default.arg) if column.server_default is not None else None,
+                        "foreign_keys": sorted(f"{fk.target_fullname} {fk.ondelete or ''}".strip() for fk in column.foreign_keys),
+                    }
+                    for column in table.columns
+                ],
+                "indexes": sorted(
+                    (index.name, [column.name for column in index.columns], bool(index.unique))
+                    for index in table.indexes
+                ),
+            })
+        if database.shard_map is not None:
+            # 新增分片后需要在新分片上建表
+            return _digest({"tables": tables, "shards": database.shard_map.names})
+        return _digest(tables)
+
+    @staticmethod
+    def seed_fingerprint() -> str:
+        """根据默认数据（含可选的 index.json）计算指纹"""
+        payload = {
+            "quick_links": DefaultData.DEFAULT_QUICK_LINKS,
+            "search_engines": DefaultData.DEFAULT_SEARCH_ENGINES,
+        }
+        if os.path.exists("index.json"):
+            with open("index.json", "r", encoding="utf-8") as f:
+                payload["index_json"] = f.read()
+        return _digest(payload)
+
+    @staticmethod
+    def get_version(db: Session) -> Optional[SchemaVersion]:
+        """一次主键查询读取库中记录的指纹"""
+        try:
+            return db.get(SchemaVersion, SCHEMA_KEY)
+        except SQLAlchemyError:
+            # 首次启动时 schema_version 表还不存在
+            db.rollback()
+            return None
+
+    @staticmethod
+    def is_up_to_date(db: Session) -> bool:
+        """库中记录的结构和默认数据指纹是否都与当前代码一致"""
+        version = SchemaService.get_version(db)
+        return (
+            version is not None
+            and version.schema_fingerprint == SchemaService.schema_fingerprint()
+            and version.seed_fingerprint == SchemaService.seed_fingerprint()
+        )
+
+    @staticmethod
+    def record_version(db: Session, seeded: bool):
+        """记录当前结构指纹；默认数据初始化成功时同时记录默认数据指纹"""
+        db.merge(SchemaVersion(
+            name=SCHEMA_KEY,
+            schema_fingerprint=SchemaService.schema_fingerprint(),
+            seed_fingerprint=SchemaService.seed_fingerprint() if seeded else ""
+        ))
+        db.commit()
+
+    @staticmethod
+    def ensure_schema() -> bool:
+        """指纹一致时直接返回；结构变化时建表，默认数据变化或上次初始化失败时重新初始化"""
+        db = database.SessionLocal()
+        try:
+            version = SchemaService.get_version(db)
+        finally:
+            db.close()
+
+        schema_current = version is not None and version.schema_fingerprint == SchemaService.schema_fingerprint()
+        seed_current = version is not None and version.seed_fingerprint == SchemaService.seed_fingerprint()
+        if schema_current and seed_current:
+            logger.info("数据库结构与默认数据版本一致，跳过建表和初始化")
+            return True
+
+        if not schema_current:
+            logger.info("数据库结构版本变化，执行建表")
+            if not database.create_database_tables():
+                return False
+            if database.shard_map is not None:
+                database.shard_map.create_tables(database.Base.metadata)
+
+        seeded = seed_current
+        if not seed_current:
+            logger.info("默认数据版本变化，执行默认数据初始化")
+            seeded = DataInitService.init_default_data()
+            if not seeded:
+                # 不记录默认数据指纹，下次启动重试初始化
+                logger.warning("默认数据初始化失败，但应用将继续启动")
+
+        db = database.SessionLocal()
+        try:
+            SchemaService.record_version(db, seeded)
+        finally:
+            db.close()
+        logger.info("已记录数据库结构与默认数据版本")
+        return True
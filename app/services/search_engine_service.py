@@ -1,6 +1,8 @@
 """
 搜索引擎服务
 """
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -91,7 +93,6 @@ class SearchEngineService:
         )
         db.add(db_engine)
         db.commit()
-        db.refresh(db_engine)
         return db_engine
     
     @staticmethod
@@ -121,7 +122,6 @@ class SearchEngineService:
             db_engine.sort_order = engine_data.sort_order
         
         db.commit()
-        db.refresh(db_engine)
         return db_engine
     
     @staticmethod
@@ -181,4 +181,110 @@ class SearchEngineService:
             return True
         except Exception:
             db.rollback()
-            return False 
\ No newline at end of file
+            return False 
+
+
+class AsyncSearchEngineService:
+    """搜索引擎服务类（异步会话版本）"""
+    
+    @staticmethod
+    async def get_search_engines(db: AsyncSession, user_id: Optional[int] = None, active_only: bool = True) -> List[SearchEngine]:
+        """获取用户的搜索引擎列表，如果没有用户ID则返回默认数据"""
+        if user_id is None:
+            return SearchEngineService._get_default_search_engines(active_only)
+        
+        stmt = select(SearchEngine).where(SearchEngine.user_id == user_id)
+        if active_only:
+            stmt = stmt.where(SearchEngine.is_active == True)
+        return list(await db.scalars(stmt.order_by(SearchEngine.sort_order)))
+    
+    @staticmethod
+    async def get_search_engine_by_id(db: AsyncSession, engine_id: int, user_id: int) -> Optional[SearchEngine]:
+        """根据ID获取用户的搜索引擎"""
+        return await db.scalar(select(SearchEngine).where(
+            SearchEngine.id == engine_id,
+            SearchEngine.user_id == user_id
+        ))
+    
+    @staticmethod
+    async def get_search_engine_by_name(db: AsyncSession, name: str, user_id: int) -> Optional[SearchEngine]:
+        """根据名称获取用户的搜索引擎"""
+        return await db.scalar(select(SearchEngine).where(
+            SearchEngine.name == name,
+            SearchEngine.user_id == user_id
+        ))
+    
+    @staticmethod
+    async def create_search_engine(db: AsyncSession, engine_data: SearchEngineCreate, user_id: int) -> Optional[SearchEngine]:
+        """创建搜索引擎"""
+        existing = await AsyncSearchEngineService.get_search_engine_by_name(db, engine_data.name, user_id)
+        if existing:
+            return None
+        
+        if engine_data.is_default:
+            await AsyncSearchEngineService._clear_default_engines(db, user_id)
+        
+        db_engine = SearchEngine(
+            name=engine_data.name,
+            display_name=engine_data.display_name,
+            url_template=engine_data.url_template,
+            icon=engine_data.icon,
+            color=engine_data.color,
+            is_active=engine_data.is_active,
+            is_default=engine_data.is_default,
+            user_id=user_id
+        )
+        db.add(db_engine)
+        await db.commit()
+        return db_engine
+    
+    @staticmethod
+    async def update_search_engine(db: AsyncSession, engine_id: int, engine_data: SearchEngineUpdate, user_id: int) -> Optional[SearchEngine]:
+        """更新搜索引擎"""
+        db_engine = await AsyncSearchEngineService.get_search_engine_by_id(db, engine_id, user_id)
+        if not db_engine:
+            return None
+        
+        if engine_data.is_default:
+            await AsyncSearchEngineService._clear_default_engines(db, user_id)
+        
+        for field, value in engine_data.model_dump(exclude_none=True).items():
+            setattr(db_engine, field, value)
+        
+        await db.commit()
+        return db_engine
+    
+    @staticmethod
+    async def delete_search_engine(db: AsyncSession, engine_id: int, user_id: int) -> bool:
+        """删除搜索引擎"""
+        db_engine = await AsyncSearchEngineService.get_search_engine_by_id(db, engine_id, user_id)
+        if not db_engine:
+            return False
+        
+        await db.delete(db_engine)
+        await db.commit()
+        return True
+    
+    @staticmethod
+    async def get_default_search_engine(db: AsyncSession, user_id: Optional[int] = None) -> Optional[SearchEngine]:
+        """获取用户的默认搜索引擎，如果没有用户ID则返回默认的搜索引擎"""
+        if user_id is None:
+            return SearchEngineService.get_default_search_engine(None, None)
+        
+        default_engine = await db.scalar(select(SearchEngine).where(
+            SearchEngine.user_id == user_id,
+            SearchEngine.is_default == True
+        ).limit(1))
+        if not default_engine:
+            default_engine = await db.scalar(select(SearchEngine).where(
+                SearchEngine.user_id == user_id,
+                SearchEngine.is_active == True
+            ).limit(1))
+        return default_engine
+    
+    @staticmethod
+    async def _clear_default_engines(db: AsyncSession, user_id: int):
+        """清除用户的所有默认搜索引擎设置"""
+        await db.execute(
+            update(SearchEngine).where(SearchEngine.user_id == user_id).values(is_default=False)
+        )
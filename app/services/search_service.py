@@ -1,6 +1,8 @@
 """
 搜索服务
 """
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging
@@ -8,7 +10,7 @@ import logging
 from ..models import SearchHistory
 from ..schemas import SearchRequest, SearchResponse
 from ..config import AppConfig
-from .search_engine_service import SearchEngineService
+from .search_engine_service import SearchEngineService, AsyncSearchEngineService
 
 logger = logging.getLogger(__name__)
 
@@ -59,4 +61,50 @@ class SearchService:
             db.commit()
         except Exception as e:
             logger.warning(f"搜索历史记录失败: {e}")
-            db.rollback() 
\ No newline at end of file
+            db.rollback() 
+
+
+class AsyncSearchService:
+    """搜索服务类（异步会话版本）"""
+    
+    @staticmethod
+    async def perform_search(db: AsyncSession, search_request: SearchRequest, user_id: int) -> Optional[SearchResponse]:
+        """执行搜索"""
+        engine = await AsyncSearchEngineService.get_search_engine_by_name(db, search_request.search_engine, user_id)
+        if not engine:
+            return None
+        
+        await AsyncSearchService._record_search_history(db, search_request, user_id)
+        
+        return SearchResponse(
+            search_url=engine.url_template.format(query=search_request.query),
+            search_engine=engine.display_name,
+            query=search_request.query
+        )
+    
+    @staticmethod
+    async def get_search_history(db: AsyncSession, user_id: int, limit: int = None) -> List[SearchHistory]:
+        """获取用户的搜索历史"""
+        if limit is None:
+            limit = AppConfig.DEFAULT_SEARCH_HISTORY_LIMIT
+        
+        return list(await db.scalars(
+            select(SearchHistory)
+            .where(SearchHistory.user_id == user_id)
+            .order_by(SearchHistory.created_at.desc())
+            .limit(limit)
+        ))
+    
+    @staticmethod
+    async def _record_search_history(db: AsyncSession, search_request: SearchRequest, user_id: int):
+        """记录用户的搜索历史"""
+        try:
+            db.add(SearchHistory(
+                query=search_request.query,
+                search_engine=search_request.search_engine,
+                user_id=user_id
+            ))
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"搜索历史记录失败: {e}")
+            await db.rollback()
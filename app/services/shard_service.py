@@ -0,0 +1,176 @@
+"""
+分片运维服务
+跨分片统计与导出（各分片并发执行），以及在线迁移单个用户的数据到另一个分片
+"""
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.engine import Engine
+
+from ..config import Config as DatabaseConfig
+from ..models import QuickLink, SearchEngine, SearchHistory, User
+from ..sharding import PRIMARY_SHARD, SHARDED_TABLES, ShardMap, user_shard
+
+logger = logging.getLogger(__name__)
+
+# 只追加的大表先在线复制；其余表数据量小，在暂停写入期间整体复制
+APPEND_ONLY_MODELS = (SearchHistory,)
+SMALL_MODELS = (QuickLink, SearchEngine)
+
+
+def _copy_rows(source: Engine, target: Engine, model, user_id: int, after_id: int, batch_size: int,
+               up_to: Optional[int] = None) -> int:
+    """按主键顺序分批复制用户数据到目标分片，返回已复制的最大源主键
+
+    目标分片按自己的主键区间重新分配主键，保证主键跨分片唯一。
+    """
+    table = model.__table__
+    columns = [column for column in table.columns if column.name != "id"]
+    while True:
+        query = select(table).where(table.c.user_id == user_id, table.c.id > after_id)
+        if up_to is not None:
+            query = query.where(table.c.id <= up_to)
+        with source.connect() as conn:
+            rows = conn.execute(query.order_by(table.c.id).limit(batch_size)).all()
+        if not rows:
+            return after_id
+        with target.begin() as conn:
+            conn.execute(table.insert(), [{c.name: row._mapping[c.name] for c in columns} for row in rows])
+        after_id = rows[-1].id
+
+
+def _delete_rows(engine: Engine, model, user_id: int, batch_size: int) -> int:
+    """分批删除用户在某个分片上的数据"""
+    table = model.__table__
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(
+                select(table.c.id).where(table.c.user_id == user_id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                return total
+            conn.execute(delete(table).where(table.c.id.in_(ids)))
+        total += len(ids)
+
+
+class ShardService:
+    """分片运维服务类"""
+
+    @staticmethod
+    def count_rows(shard_map: ShardMap) -> Dict[str, Dict[str, int]]:
+        """并发统计各分片上分片表的行数: {分片: {表: 行数}}"""
+        tables = [model.__table__ for model in (QuickLink, SearchEngine, SearchHistory)]
+
+        def count(name: str, engine: Engine) -> Dict[str, int]:
+            with engine.connect() as conn:
+                return {table.name: conn.scalar(select(func.count()).select_from(table)) for table in tables}
+
+        return shard_map.fan_out(count)
+
+    @staticmethod
+    def export_table(shard_map: ShardMap, table_name: str, write: Callable[[str], None],
+                     batch_size: int = 1000) -> int:
+        """并发读取各分片的一张分片表，逐行以 JSON 写出，返回导出的行数"""
+        if table_name not in SHARDED_TABLES:
+            raise ValueError(f"不是分片表: {table_name}")
+        table = next(model.__table__ for model in (QuickLink, SearchEngine, SearchHistory)
+                     if model.__tablename__ == table_name)
+        lock = threading.Lock()
+
+        def export(name: str, engine: Engine) -> int:
+            exported, last_id = 0, 0
+            while True:
+                with engine.connect() as conn:
+                    rows = conn.execute(
+                        select(table).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+                    ).all()
+                if not rows:
+                    return exported
+                lines = [json.dumps({"shard": name, **row._mapping}, ensure_ascii=False, default=str) for row in rows]
+                with lock:
+                    for line in lines:
+                        write(line)
+                exported += len(rows)
+                last_id = rows[-1].id
+
+        return sum(shard_map.fan_out(export).values())
+
+    @staticmethod
+    def rebalance_plan(primary: Engine, shard_map: ShardMap) -> List[dict]:
+        """一致性哈希下归属已改变的用户（例如新增分片后），返回待迁移列表"""
+        users = User.__table__
+        with primary.connect() as conn:
+            rows = conn.execute(select(users.c.id, users.c.shard).order_by(users.c.id)).all()
+        plan = []
+        for row in rows:
+            current, target = row.shard or PRIMARY_SHARD, shard_map.place(row.id)
+            if current != target:
+                plan.append({"user_id": row.id, "source": current, "target": target})
+        return plan
+
+    @staticmethod
+    def move_user(primary: Engine, shard_map: ShardMap, user_id: int, target: str,
+                  batch_size: int = 1000, grace: Optional[float] = None,
+                  sleep: Callable[[float], None] = time.sleep) -> dict:
+        """在线把一个用户的数据迁移到目标分片
+
+        1. 在线复制搜索历史（只追加）到当前最大主键，期间用户照常读写；
+        2. 标记迁移中（认证时拒绝该用户的写请求），等待进行中的请求结束；
+        3. 复制搜索历史增量，整体复制快速链接和搜索引擎；
+        4. 把 users.shard 指向目标分片并解除标记，等待仍在读源分片的请求结束；
+        5. 分批删除源分片上的数据。
+        """
+        grace = DatabaseConfig.SHARD_MOVE_GRACE if grace is None else grace
+        if target not in shard_map.engines:
+            raise ValueError(f"分片不存在: {target}")
+        users = User.__table__
+        with primary.connect() as conn:
+            user = conn.execute(select(users).where(users.c.id == user_id)).first()
+        if user is None:
+            raise ValueError(f"用户不存在: {user_id}")
+        source_name = user_shard(user)
+        if source_name == target:
+            return {"user_id": user_id, "source": source_name, "target": target, "moved": False}
+        source, destination = shard_map.engine_for(source_name), shard_map.engine_for(target)
+
+        def set_state(**values):
+            with primary.begin() as conn:
+                conn.execute(update(users).where(users.c.id == user_id).values(**values))
+
+        # 清理上次中断的迁移留在目标分片上的数据
+        for model in APPEND_ONLY_MODELS + SMALL_MODELS:
+            _delete_rows(destination, model, user_id, batch_size)
+
+        watermarks = {}
+        for model in APPEND_ONLY_MODELS:
+            with source.connect() as conn:
+                up_to = conn.scalar(select(func.max(model.id)).where(model.user_id == user_id)) or 0
+            watermarks[model] = _copy_rows(source, destination, model, user_id, 0, batch_size, up_to)
+        logger.info(f"用户 {user_id}: 已在线复制历史数据，开始暂停写入")
+
+        set_state(shard_moving=True)
+        try:
+            sleep(grace)
+            for model in APPEND_ONLY_MODELS:
+                _copy_rows(source, destination, model, user_id, watermarks[model], batch_size)
+            for model in SMALL_MODELS:
+                _copy_rows(source, destination, model, user_id, 0, batch_size)
+            # 目标分片的主键已越出区间时，不能切换过去（新主键会被判给其他分片）
+            with destination.connect() as conn:
+                max_id = conn.scalar(select(func.max(QuickLink.id)).where(QuickLink.user_id == user_id))
+            if max_id is not None:
+                shard_map.check_id(target, max_id)
+            set_state(shard=None if target == PRIMARY_SHARD else target, shard_moving=False)
+        except Exception:
+            set_state(shard_moving=False)
+            raise
+        logger.info(f"用户 {user_id}: 已切换到分片 {target}")
+
+        sleep(grace)
+        removed = sum(_delete_rows(source, model, user_id, batch_size) for model in APPEND_ONLY_MODELS + SMALL_MODELS)
+        return {"user_id": user_id, "source": source_name, "target": target, "moved": True, "rows": removed}
@@ -1,6 +1,9 @@
 """
 用户服务
 """
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import timedelta
@@ -9,9 +12,18 @@ from ..models import User
 from ..schemas import UserCreate, UserLogin, Token, UserResponse, UserProfileUpdate
 from ..auth import get_password_hash, authenticate_user, create_access_token, verify_password
 from ..config import AuthConfig
+from ..sharding import bind_user_shard
+from .. import database
 from .data_init_service import DataInitService
 
 
+def _assign_shard(db, user: User):
+    """按一致性哈希为新用户分配分片（需已 flush 得到主键），并让会话后续写入走该分片"""
+    if database.shard_map is not None:
+        user.shard = database.shard_map.place(user.id)
+    bind_user_shard(db, user)
+
+
 class UserService:
     """用户服务类"""
     
@@ -38,8 +50,9 @@ class UserService:
             hashed_password=hashed_password
         )
         db.add(db_user)
+        db.flush()
+        _assign_shard(db, db_user)
         db.commit()
-        db.refresh(db_user)
         
         # 为新用户初始化默认数据
         DataInitService.init_user_default_data(db, db_user.id)
@@ -127,6 +140,105 @@ class UserService:
         
         # 保存更改
         db.commit()
-        db.refresh(user)
         
-        return user 
\ No newline at end of file
+        return user 
+
+
+class AsyncUserService:
+    """用户服务类（异步会话版本）
+
+    bcrypt 哈希与校验是CPU密集操作，放到线程池执行以免阻塞事件循环。
+    """
+    
+    @staticmethod
+    async def create_user(db: AsyncSession, user_data: UserCreate) -> Optional[User]:
+        """创建用户，并在同一事务中写入默认数据"""
+        if await AsyncUserService.get_user_by_username(db, user_data.username):
+            return None
+        
+        if await db.scalar(select(User).where(User.email == user_data.email)):
+            return None
+        
+        if len(user_data.password) < AuthConfig.MIN_PASSWORD_LENGTH:
+            return None
+        
+        hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
+        db_user = User(
+            username=user_data.username,
+            email=user_data.email,
+            hashed_password=hashed_password
+        )
+        db.add(db_user)
+        await db.flush()
+        _assign_shard(db, db_user)
+        
+        # 为新用户初始化默认数据
+        db.add_all(DataInitService.build_user_default_data(db_user.id))
+        await db.commit()
+        return db_user
+    
+    @staticmethod
+    async def login_user(db: AsyncSession, user_data: UserLogin) -> Optional[Token]:
+        """用户登录"""
+        user = await AsyncUserService.get_user_by_username(db, user_data.username)
+        if not user:
+            return None
+        if not await run_in_threadpool(verify_password, user_data.password, user.hashed_password):
+            return None
+        
+        access_token = create_access_token(
+            data={"sub": user.username},
+            expires_delta=timedelta(minutes=AuthConfig.ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        return Token(
+            access_token=access_token,
+            token_type="bearer",
+            user=UserResponse.model_validate(user)
+        )
+    
+    @staticmethod
+    async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+        """根据用户名获取用户"""
+        return await db.scalar(select(User).where(User.username == username))
+    
+    @staticmethod
+    async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+        """根据ID获取用户"""
+        return await db.get(User, user_id)
+    
+    @staticmethod
+    async def update_user_profile(db: AsyncSession, user_id: int, update_data: UserProfileUpdate) -> Optional[User]:
+        """更新用户信息"""
+        user = await db.get(User, user_id)
+        if not user:
+            return None
+        
+        if update_data.new_password:
+            if not update_data.current_password:
+                raise ValueError("修改密码时必须提供当前密码")
+            
+            if not await run_in_threadpool(verify_password, update_data.current_password, user.hashed_password):
+                raise ValueError("当前密码不正确")
+            
+            if len(update_data.new_password) < AuthConfig.MIN_PASSWORD_LENGTH:
+                raise ValueError(f"新密码长度至少{AuthConfig.MIN_PASSWORD_LENGTH}位")
+            
+            user.hashed_password = await run_in_threadpool(get_password_hash, update_data.new_password)
+        
+        if update_data.email and update_data.email != user.email:
+            existing_user = await db.scalar(select(User).where(
+                User.email == update_data.email,
+                User.id != user_id
+            ))
+            if existing_user:
+                raise ValueError("邮箱已被其他用户使用")
+            user.email = update_data.email
+        
+        if update_data.display_name is not None:
+            user.display_name = update_data.display_name.strip() or None
+        
+        if update_data.bio is not None:
+            user.bio = update_data.bio.strip() or None
+        
+        await db.commit()
+        return user
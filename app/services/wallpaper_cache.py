@@ -0,0 +1,524 @@
+"""
+壁纸缓存服务
+两级缓存：内存 LRU（按总字节数限制）和磁盘存储（总大小超限时淘汰最久未访问的文件），
+键由壁纸源、分辨率、分类和模糊程度组成，有效期与响应头 Cache-Control 一致。
+磁盘上的图片按内容摘要命名，同一张图片只存一份；命中磁盘时直接以文件响应返回。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import WallpaperConfig
+
+logger = logging.getLogger(__name__)
+
+# 未写完的临时文件前缀，启动时清理
+TEMP_PREFIX = ".tmp-"
+
+
+@dataclass
+class CachedImage:
+    """一张缓存的图片（内存层带 content，磁盘层带 path）"""
+    key: str
+    digest: str
+    content_type: str
+    size: int
+    created_at: float
+    content: Optional[bytes] = None
+    path: Optional[str] = None
+
+    def expired(self, ttl: float, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.created_at > ttl
+
+    def meta(self) -> dict:
+        return {"key": self.key, "digest": self.digest, "content_type": self.content_type,
+                "size": self.size, "created_at": self.created_at}
+
+
+def cache_key(source: str, width: int, height: int, category: Optional[str] = None,
+              blur: Optional[int] = None) -> str:
+    """缓存键：壁纸源、分辨率、分类、模糊程度"""
+    return f"{source}:{width}x{height}:{category or '-'}:{blur or '-'}"
+
+
+def content_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def guess_content_type(head: bytes) -> str:
+    """按文件头判断图片类型（磁盘对象只按摘要存放，不记录类型）"""
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head.startswith(b"GIF8"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "image/jpeg"
+
+
+def _read_head(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(16)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _close_and_unlink(file, path: str):
+    try:
+        if file is not None:
+            file.close()
+    finally:
+        _unlink(path)
+
+
+class MemoryLRU:
+    """按总字节数限制的 LRU；单张图片超过容量 1/4 时不进内存，避免一张大图冲掉整个缓存"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedImage]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def find(self, digest: str) -> Optional[CachedImage]:
+        """按内容摘要查找（不影响 LRU 顺序）"""
+        return next((entry for entry in self._entries.values() if entry.digest == digest), None)
+
+    def pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def put(self, entry: CachedImage) -> bool:
+        if entry.content is None or entry.size > self.max_bytes // 4:
+            return False
+        self.pop(entry.key)
+        self._entries[entry.key] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+        return True
+
+
+class DiskStore:
+    """磁盘层：objects/{摘要} 存图片内容，keys/{键哈希}.json 记录缓存键到内容的映射
+
+    各图片的大小和访问先后保存在内存索引中（启动时扫描一次目录），写入和淘汰不再逐个 stat 文件；
+    总大小超过上限时删除最久未访问的图片，以及指向它的键文件。
+    文件的修改时间记录最近访问时间，只用于重启后恢复访问顺序。
+    所有方法都是阻塞 I/O，需在线程池中调用。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, on_evict: Optional[Callable[[str], None]] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict  # 图片被淘汰后以摘要调用，用于清理由它派生的文件
+        self.evictions = 0
+        self.objects_dir = os.path.join(directory, "objects")
+        self.keys_dir = os.path.join(directory, "keys")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.keys_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # 摘要 -> 大小，最久未访问的在前
+        self._bytes = 0
+        self._keys: Dict[str, Set[str]] = {}  # 摘要 -> 指向它的键文件名
+        self._key_digests: Dict[str, str] = {}  # 键文件名 -> 摘要
+        self._load()
+
+    def _load(self):
+        """扫描目录重建索引，删除上次退出时残留的临时文件和指向已删除图片的键文件"""
+        found = []
+        for name in os.listdir(self.objects_dir):
+            path = os.path.join(self.objects_dir, name)
+            if name.startswith(TEMP_PREFIX):
+                _unlink(path)
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(found):
+            self._sizes[digest] = size
+            self._bytes += size
+        for name in os.listdir(self.keys_dir):
+            path = os.path.join(self.keys_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    digest = json.load(f)["digest"]
+            except (OSError, ValueError, KeyError):
+                digest = None
+            if digest in self._sizes:
+                self._link_key(name, digest)
+            else:
+                _unlink(path)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest)
+
+    def _key_name(self, key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+
+    def _key_path(self, key: str) -> str:
+        return os.path.join(self.keys_dir, self._key_name(key))
+
+    def _write_atomic(self, path: str, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            _unlink(tmp)
+            raise
+
+    def _link_key(self, name: str, digest: str):
+        """记录键文件指向的图片；键改指其他图片时从原图片的键集合中移除"""
+        previous = self._key_digests.get(name)
+        if previous is not None and previous != digest:
+            self._keys.get(previous, set()).discard(name)
+        self._key_digests[name] = digest
+        self._keys.setdefault(digest, set()).add(name)
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        try:
+            with open(self._key_path(key), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            digest = meta["digest"]
+            with self._lock:
+                if digest not in self._sizes:
+                    return None
+                self._sizes.move_to_end(digest)
+            path = self.object_path(digest)
+            os.utime(path)  # 重启后按修改时间恢复访问顺序
+        except (OSError, ValueError, KeyError):
+            return None
+        return CachedImage(path=path, **meta)
+
+    def get_object(self, digest: str) -> Optional[str]:
+        """按内容摘要查找图片文件"""
+        path = self.object_path(digest)
+        return path if digest in self._sizes and os.path.exists(path) else None
+
+    def put(self, entry: CachedImage):
+        path = self.object_path(entry.digest)
+        with self._lock:
+            if not os.path.exists(path):
+                self._write_atomic(path, entry.content)
+            else:
+                os.utime(path)
+            self._record(entry)
+
+    def put_file(self, entry: CachedImage, source: str):
+        """把已写好的临时文件（须在 objects 目录下）移入磁盘层"""
+        path = self.object_path(entry.digest)
+        with self._lock:
+            if os.path.exists(path):
+                _unlink(source)
+                os.utime(path)
+            else:
+                os.replace(source, path)
+            self._record(entry)
+
+    def _record(self, entry: CachedImage):
+        """更新索引、写入键文件，然后按总大小淘汰"""
+        previous = self._sizes.pop(entry.digest, None)
+        if previous is not None:
+            self._bytes -= previous
+        self._sizes[entry.digest] = entry.size
+        self._bytes += entry.size
+        name = self._key_name(entry.key)
+        self._write_atomic(os.path.join(self.keys_dir, name), json.dumps(entry.meta()).encode("utf-8"))
+        self._link_key(name, entry.digest)
+        self._evict()
+
+    def _evict(self):
+        """删除最久未访问的图片及指向它的键文件，直到总大小不超过上限"""
+        while self._bytes > self.max_bytes and self._sizes:
+            digest, size = self._sizes.popitem(last=False)
+            self._bytes -= size
+            _unlink(self.object_path(digest))
+            for name in self._keys.pop(digest, ()):
+                self._key_digests.pop(name, None)
+                _unlink(os.path.join(self.keys_dir, name))
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(digest)
+
+
+class CacheSpool:
+    """边转发边写入缓存：上游响应体逐块写入临时文件并计算摘要，读完后整体交给缓存
+
+    磁盘层启用时临时文件建在 objects 目录下，读完后直接改名，内存中不保留整张图片；
+    写入失败时放弃缓存，不影响转发。
+    """
+
+    def __init__(self, cache: "WallpaperCache", key: str, content_type: str):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.size = 0
+        self.failed = False
+        self._hash = hashlib.sha256()
+        self._file = None
+        self._path: Optional[str] = None
+
+    def _write(self, chunk: bytes):
+        if self._file is None:
+            disk = self.cache.disk
+            fd, self._path = tempfile.mkstemp(dir=disk.objects_dir if disk is not None else None,
+                                              prefix=TEMP_PREFIX)
+            self._file = os.fdopen(fd, "wb")
+        self._file.write(chunk)
+
+    async def write(self, chunk: bytes):
+        if self.failed:
+            return
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        try:
+            await run_in_threadpool(self._write, chunk)
+        except OSError as e:
+            logger.warning(f"写入壁纸缓存临时文件失败，本次不缓存: {e}")
+            self.failed = True
+            await self.discard()
+
+    async def commit(self) -> Optional[CachedImage]:
+        """上游读完后写入缓存（临时文件归缓存所有），返回缓存条目"""
+        if self.failed or self._file is None:
+            await self.discard()
+            return None
+        file, path = self._file, self._path
+        self._file = self._path = None
+        try:
+            await run_in_threadpool(file.close)
+        except OSError as e:
+            logger.warning(f"写入壁纸缓存临时文件失败，本次不缓存: {e}")
+            await run_in_threadpool(_unlink, path)
+            return None
+        return await self.cache.put_file(self.key, path, self._hash.hexdigest(), self.size, self.content_type)
+
+    async def discard(self):
+        """删除临时文件（未读完、出错或客户端断开时）"""
+        file, path = self._file, self._path
+        self._file = self._path = None
+        if path is not None:
+            await run_in_threadpool(_close_and_unlink, file, path)
+
+
+class WallpaperCache:
+    """两级壁纸缓存"""
+
+    def __init__(self, memory_bytes: Optional[int] = None, disk_bytes: Optional[int] = None,
+                 directory: Optional[str] = None, ttl: Optional[float] = None, enabled: Optional[bool] = None):
+        self.enabled = WallpaperConfig.CACHE_ENABLED if enabled is None else enabled
+        self.ttl = WallpaperConfig.CACHE_TTL if ttl is None else ttl
+        self.memory = MemoryLRU(WallpaperConfig.CACHE_MEMORY_BYTES if memory_bytes is None else memory_bytes)
+        self.disk_bytes = WallpaperConfig.CACHE_DISK_BYTES if disk_bytes is None else disk_bytes
+        self.directory = directory or WallpaperConfig.CACHE_DIR
+        self._disk: Optional[DiskStore] = None
+        self._evict_listeners: List[Callable[[str], None]] = []
+        self._pending = set()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def disk(self) -> Optional[DiskStore]:
+        """磁盘层在首次使用时创建目录"""
+        if self._disk is None and self.disk_bytes > 0:
+            self._disk = DiskStore(self.directory, self.disk_bytes, on_evict=self._evicted)
+        return self._disk
+
+    def on_evict(self, listener: Callable[[str], None]):
+        """注册磁盘层淘汰图片时的回调（在线程池中以摘要调用）"""
+        self._evict_listeners.append(listener)
+
+    def _evicted(self, digest: str):
+        for listener in self._evict_listeners:
+            try:
+                listener(digest)
+            except OSError as e:
+                logger.warning(f"清理被淘汰壁纸的派生文件失败: {e}")
+
+    async def get(self, key: str, ttl: Optional[float] = None) -> Optional[CachedImage]:
+        """依次查找内存和磁盘，未命中或已过期时返回 None（ttl 可覆盖默认有效期）"""
+        if not self.enabled:
+            return None
+        ttl = self.ttl if ttl is None else ttl
+        entry = self.memory.get(key)
+        if entry is not None and not entry.expired(ttl):
+            self.hits["memory"] += 1
+            return entry
+        if self.disk_bytes > 0:
+            entry = await run_in_threadpool(self.disk.get, key)
+            if entry is not None and not entry.expired(ttl):
+                self.hits["disk"] += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key: str, content: bytes, content_type: str) -> Optional[CachedImage]:
+        """写入内存，并在后台写入磁盘"""
+        if not self.enabled or not content:
+            return None
+        entry = CachedImage(key=key, digest=content_digest(content), content_type=content_type,
+                            size=len(content), created_at=time.time(), content=content)
+        self.memory.put(entry)
+        self.stores += 1
+        if self.disk_bytes > 0:
+            task = asyncio.get_running_loop().create_task(self._write_disk(entry))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        return entry
+
+    def spool(self, key: str, content_type: str) -> Optional[CacheSpool]:
+        """为边转发边缓存的上游图片创建临时文件写入器，缓存未启用时返回 None"""
+        return CacheSpool(self, key, content_type) if self.enabled else None
+
+    async def put_file(self, key: str, path: str, digest: str, size: int,
+                       content_type: str) -> Optional[CachedImage]:
+        """写入一张已保存在临时文件中的图片：移入磁盘层（未启用磁盘层时删除），小图同时读入内存"""
+        in_memory = 0 < size <= self.memory.max_bytes // 4
+        if not size or (not in_memory and self.disk_bytes <= 0):
+            await run_in_threadpool(_unlink, path)
+            return None
+        entry = CachedImage(key=key, digest=digest, content_type=content_type, size=size, created_at=time.time())
+        try:
+            if in_memory:
+                entry.content = await run_in_threadpool(_read_file, path)
+                self.memory.put(entry)
+            if self.disk_bytes > 0:
+                await run_in_threadpool(self.disk.put_file, entry, path)
+                entry.path = self.disk.object_path(digest)
+            else:
+                await run_in_threadpool(_unlink, path)
+        except OSError as e:
+            logger.warning(f"写入壁纸磁盘缓存失败: {e}")
+            await run_in_threadpool(_unlink, path)
+            if entry.content is None:
+                return None
+        self.stores += 1
+        return entry
+
+    async def _write_disk(self, entry: CachedImage):
+        try:
+            await run_in_threadpool(self.disk.put, entry)
+        except OSError as e:
+            logger.warning(f"写入壁纸磁盘缓存失败: {e}")
+
+    def contains(self, digest: str) -> bool:
+        """该内容能否通过 get_object 取到"""
+        if not self.enabled:
+            return False
+        if self.memory.find(digest) is not None:
+            return True
+        return self._disk is not None and digest in self._disk._sizes
+
+    async def get_object(self, digest: str) -> Optional[CachedImage]:
+        """按内容摘要查找图片（内容不变，不检查有效期）"""
+        if not self.enabled:
+            return None
+        entry = self.memory.find(digest)
+        if entry is not None:
+            return entry
+        if self.disk_bytes <= 0:
+            return None
+        path = self.disk.get_object(digest)
+        if path is None:
+            return None
+        try:
+            head = await run_in_threadpool(_read_head, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        return CachedImage(key="", digest=digest, content_type=guess_content_type(head), size=size,
+                           created_at=0.0, path=path)
+
+    async def read(self, entry: CachedImage) -> Optional[bytes]:
+        """读取缓存图片的内容；磁盘文件已被淘汰时返回 None"""
+        if entry.content is not None:
+            return entry.content
+        try:
+            return await run_in_threadpool(_read_file, entry.path)
+        except OSError:
+            return None
+
+    async def promote(self, entry: CachedImage):
+        """把磁盘命中的图片读入内存，下次直接从内存返回"""
+        if entry.content is not None or entry.size > self.memory.max_bytes // 4:
+            return
+        try:
+            content = await run_in_threadpool(_read_file, entry.path)
+        except OSError:
+            return
+        self.memory.put(CachedImage(key=entry.key, digest=entry.digest, content_type=entry.content_type,
+                                    size=len(content), created_at=entry.created_at, content=content))
+
+    async def drain(self):
+        """等待后台磁盘写入完成"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def stats(self) -> dict:
+        hits = self.hits["memory"] + self.hits["disk"]
+        lookups = hits + self.misses
+        disk = self._disk
+        return {
+            "enabled": self.enabled,
+            "lookups": lookups,
+            "memory_hits": self.hits["memory"],
+            "disk_hits": self.hits["disk"],
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_hit_ratio": round(self.hits["memory"] / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.bytes,
+            "memory_max_bytes": self.memory.max_bytes,
+            "memory_evictions": self.memory.evictions,
+            "disk_bytes": disk.bytes if disk else 0,
+            "disk_max_bytes": self.disk_bytes,
+            "disk_evictions": disk.evictions if disk else 0,
+        }
+
+
+# 进程级共享的壁纸缓存
+wallpaper_cache = WallpaperCache()
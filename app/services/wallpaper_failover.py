@@ -0,0 +1,252 @@
+"""
+壁纸源故障转移
+按壁纸源统计延迟（p95）和错误率，连续失败或错误率过高时打开熔断器，熔断期间直接跳过该源；
+熔断时间过后放行一个探测请求（选择候选源时即占用探测名额），成功则恢复。请求的源不可用或失败时依次尝试后备源。
+第一个源在 p95 延迟内没有响应时，对下一个候选源发起对冲请求，先成功的结果胜出，其余的取消。
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from ..config import WallpaperConfig
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class SourceHealth:
+    """单个壁纸源的延迟、错误率与熔断状态"""
+
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.latencies: Deque[float] = deque(maxlen=100)  # 最近成功请求的耗时（秒）
+        self.outcomes: Deque[bool] = deque(maxlen=window)  # 最近请求是否成功
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.successes = 0
+        self.failures = 0
+        self.opens = 0
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+
+
+class WallpaperFailover:
+    """壁纸源选择、熔断与对冲请求"""
+
+    def __init__(self, fallback_order: Optional[Sequence[str]] = None, attempt_timeout: Optional[float] = None,
+                 hedge_enabled: Optional[bool] = None, hedge_min_delay: Optional[float] = None,
+                 hedge_max_delay: Optional[float] = None, hedge_default_delay: Optional[float] = None,
+                 failure_threshold: Optional[int] = None, error_rate: Optional[float] = None,
+                 window: Optional[int] = None, open_seconds: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.fallback_order = tuple(WallpaperConfig.FALLBACK_ORDER if fallback_order is None else fallback_order)
+        self.attempt_timeout = attempt_timeout or WallpaperConfig.ATTEMPT_TIMEOUT
+        self.hedge_enabled = WallpaperConfig.HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.hedge_min_delay = WallpaperConfig.HEDGE_MIN_DELAY if hedge_min_delay is None else hedge_min_delay
+        self.hedge_max_delay = WallpaperConfig.HEDGE_MAX_DELAY if hedge_max_delay is None else hedge_max_delay
+        self.hedge_default_delay = (WallpaperConfig.HEDGE_DEFAULT_DELAY if hedge_default_delay is None
+                                    else hedge_default_delay)
+        self.failure_threshold = failure_threshold or WallpaperConfig.BREAKER_FAILURES
+        self.error_rate = WallpaperConfig.BREAKER_ERROR_RATE if error_rate is None else error_rate
+        self.window = window or WallpaperConfig.BREAKER_WINDOW
+        self.open_seconds = WallpaperConfig.BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.clock = clock
+        self._sources: Dict[str, SourceHealth] = {}
+        self._lock = threading.Lock()  # 保护熔断状态与探测名额
+        self.hedges = 0
+        self.fallbacks = 0
+
+    def health(self, source: str) -> SourceHealth:
+        if source not in self._sources:
+            self._sources[source] = SourceHealth(source, self.window)
+        return self._sources[source]
+
+    def _available(self, health: SourceHealth) -> bool:
+        # 调用方持有 self._lock
+        if health.state == OPEN and self.clock() - health.opened_at >= self.open_seconds:
+            health.state = HALF_OPEN
+            health.probing = False
+        if health.state == HALF_OPEN:
+            return not health.probing
+        return health.state == CLOSED
+
+    def available(self, source: str) -> bool:
+        """熔断器关闭，或已过熔断时间且还没有探测请求在进行"""
+        with self._lock:
+            return self._available(self.health(source))
+
+    def _order(self, source: str, fallback: bool) -> List[str]:
+        return [source] + ([name for name in self.fallback_order if name != source] if fallback else [])
+
+    def candidates(self, source: str, fallback: bool = True) -> List[str]:
+        """请求的源在前，后备源按配置顺序排在后面，跳过熔断中的源（只查看，不占用探测名额）"""
+        return [name for name in self._order(source, fallback) if self.available(name)]
+
+    def claim_candidates(self, source: str, fallback: bool = True) -> Tuple[List[str], List[str]]:
+        """选出候选源，并在同一次加锁中占用其中半开源的探测名额，返回 (候选源, 占用了探测名额的源)
+
+        并发的两次选择不会都选中同一个半开源；占用的名额由 release_probe 或请求结果释放。
+        """
+        chosen, probes = [], []
+        with self._lock:
+            for name in self._order(source, fallback):
+                health = self.health(name)
+                if not self._available(health):
+                    continue
+                if health.state == HALF_OPEN:
+                    health.probing = True
+                    probes.append(name)
+                chosen.append(name)
+        return chosen, probes
+
+    def release_probe(self, source: str):
+        """放弃占用的探测名额（探测请求没有发出或没有结果），让下一个请求探测"""
+        with self._lock:
+            health = self.health(source)
+            if health.state == HALF_OPEN:
+                health.probing = False
+
+    def hedge_delay(self, source: str) -> float:
+        """对冲等待时间：该源的 p95 延迟，限制在上下限之间；还没有样本时使用默认值"""
+        p95 = self.health(source).p95()
+        if p95 is None:
+            return self.hedge_default_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    def record_success(self, source: str, seconds: float):
+        with self._lock:
+            health = self.health(source)
+            health.latencies.append(seconds)
+            health.outcomes.append(True)
+            health.successes += 1
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                logger.info(f"壁纸源 {source} 已恢复，关闭熔断器")
+            health.state = CLOSED
+            health.probing = False
+
+    def record_failure(self, source: str):
+        with self._lock:
+            health = self.health(source)
+            health.outcomes.append(False)
+            health.failures += 1
+            health.consecutive_failures += 1
+            tripped = (health.consecutive_failures >= self.failure_threshold
+                       or (len(health.outcomes) >= self.window // 2 and health.error_rate >= self.error_rate))
+            if health.state == HALF_OPEN or (health.state == CLOSED and tripped):
+                if health.state == CLOSED:
+                    health.opens += 1
+                    logger.warning(f"壁纸源 {source} 连续失败 {health.consecutive_failures} 次"
+                                   f"（错误率 {health.error_rate:.0%}），熔断 {self.open_seconds:.0f} 秒")
+                health.state = OPEN
+                health.opened_at = self.clock()
+                health.probing = False
+
+    async def run(self, source: str, attempt: Callable[[str], Awaitable[T]],
+                  discard: Optional[Callable[[T], Awaitable[None]]] = None, fallback: bool = True) -> Tuple[str, T]:
+        """依次尝试请求的源和后备源，返回 (成功的源, 结果)
+
+        进行中的只有一个请求且超过其对冲等待时间时，对下一个候选源发起对冲请求；某个请求失败时立即尝试下一个。
+        落败的请求被取消，已经拿到的结果交给 discard 释放（例如关闭上游响应）。全部失败时抛出最后一个异常。
+        """
+        queue, probes = self.claim_candidates(source, fallback)
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        last_error: Optional[BaseException] = None
+
+        def start():
+            name = queue.pop(0)
+            task = asyncio.ensure_future(asyncio.wait_for(attempt(name), self.attempt_timeout))
+            pending[task] = (name, self.clock())
+
+        try:
+            if queue:
+                start()
+            while pending:
+                timeout = None
+                if self.hedge_enabled and queue and len(pending) == 1:
+                    name, started = next(iter(pending.values()))
+                    timeout = max(0.0, started + self.hedge_delay(name) - self.clock())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    start()
+                    continue
+                for task in done:
+                    name, started = pending.pop(task)
+                    if task.exception() is None:
+                        self.record_success(name, self.clock() - started)
+                        if name != source:
+                            self.fallbacks += 1
+                        return name, task.result()
+                    last_error = task.exception()
+                    self.record_failure(name)
+                    logger.warning(f"壁纸源 {name} 请求失败: {last_error!r}")
+                if not pending and queue:
+                    start()
+        finally:
+            for task, (name, started) in pending.items():
+                # 被对冲请求超过的源按一次慢请求计入失败，持续偏慢的源最终会被熔断
+                if self.clock() - started >= self.hedge_delay(name):
+                    self.record_failure(name)
+                elif name in probes:
+                    # 探测请求没有结果就被取消（其他源先返回或客户端断开）时放行下一个探测，
+                    # 否则该源会一直停在半开状态
+                    self.release_probe(name)
+                task.cancel()
+                task.add_done_callback(lambda done: self._discard(done, discard))
+            # 占用了探测名额但没有轮到发出请求的源
+            for name in queue:
+                if name in probes:
+                    self.release_probe(name)
+        if last_error is None:
+            raise NoSourceAvailable("所有壁纸源均处于熔断状态")
+        raise last_error
+
+    @staticmethod
+    def _discard(task: asyncio.Task, discard):
+        if task.cancelled() or task.exception() is not None:
+            return
+        if discard is not None:
+            asyncio.ensure_future(discard(task.result()))
+
+    def stats(self) -> dict:
+        sources = []
+        for name in sorted(self._sources):
+            health = self._sources[name]
+            p95 = health.p95()
+            sources.append({
+                "source": name,
+                "state": health.state,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedge_delay_ms": round(self.hedge_delay(name) * 1000, 1),
+                "error_rate": round(health.error_rate, 4),
+                "successes": health.successes,
+                "failures": health.failures,
+                "opens": health.opens,
+            })
+        return {"hedges": self.hedges, "fallbacks": self.fallbacks, "sources": sources}
+
+
+class NoSourceAvailable(Exception):
+    """全部候选源都在熔断中"""
+
+
+# 进程级共享的壁纸源故障转移
+source_failover = WallpaperFailover()
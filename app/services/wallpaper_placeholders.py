@@ -0,0 +1,188 @@
+"""
+壁纸低质量占位图
+图片写入缓存时，在转码进程池中为它生成一张最长边 32 像素左右的 WebP 小图（几百字节），以 data URI 形式保存。
+前端收到响应头中的占位图后立即模糊显示，完整图片下载完成后再替换。每张图片（按内容摘要）只计算一次。
+磁盘上的占位图文件数有上限（先删最早写入的），壁纸缓存淘汰图片时同名占位图也一并删除。
+"""
+import asyncio
+import base64
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Union
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..config import WallpaperConfig
+from ..singleflight import flight
+from .image_pipeline import ImagePipeline, image_pipeline, placeholder
+from .wallpaper_cache import wallpaper_cache
+
+logger = logging.getLogger(__name__)
+
+DATA_URI_PREFIX = "data:image/webp;base64,"
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class PlaceholderStore:
+    """按内容摘要保存占位图：内存中保留最近的若干条，磁盘上每张一个文件"""
+
+    def __init__(self, enabled: Optional[bool] = None, size: Optional[int] = None, quality: Optional[int] = None,
+                 max_entries: Optional[int] = None, directory: Optional[str] = None,
+                 disk_max_entries: Optional[int] = None, pipeline: Optional[ImagePipeline] = None):
+        self.enabled = WallpaperConfig.PLACEHOLDER_ENABLED if enabled is None else enabled
+        self.size = size or WallpaperConfig.PLACEHOLDER_SIZE
+        self.quality = quality or WallpaperConfig.PLACEHOLDER_QUALITY
+        self.max_entries = max_entries or WallpaperConfig.PLACEHOLDER_MAX_ENTRIES
+        # 为空字符串时只保存在内存中
+        self.directory = (os.path.join(WallpaperConfig.CACHE_DIR, "placeholders") if directory is None
+                          else directory)
+        self.disk_max_entries = disk_max_entries or WallpaperConfig.PLACEHOLDER_DISK_MAX_ENTRIES
+        self.pipeline = pipeline or image_pipeline  # 与转码共用进程池
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        # 磁盘上的占位图，按写入先后排列；首次写入时扫描目录
+        self._files: "Optional[OrderedDict[str, None]]" = None
+        self._files_lock = threading.Lock()
+        self._pending = set()
+        self._flight = flight("placeholder")
+        self.computed = 0
+        self.failures = 0
+        self.bytes = 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.webp")
+
+    def _scan_files(self) -> "OrderedDict[str, None]":
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".webp"):
+                    try:
+                        found.append((os.path.getmtime(os.path.join(root, name)), name[:-len(".webp")]))
+                    except OSError:
+                        continue
+        return OrderedDict((digest, None) for _, digest in sorted(found))
+
+    def _save_file(self, digest: str, data: bytes):
+        """写入占位图文件，超过文件数上限时删除最早写入的（阻塞 I/O，在线程池中调用）"""
+        with self._files_lock:
+            if self._files is None:
+                self._files = self._scan_files()
+            _write_file(self._path(digest), data)
+            self._files[digest] = None
+            self._files.move_to_end(digest)
+            while len(self._files) > self.disk_max_entries:
+                oldest, _ = self._files.popitem(last=False)
+                _unlink(self._path(oldest))
+
+    def discard(self, digest: str):
+        """删除图片的占位图文件（壁纸缓存淘汰该图片时在线程池中调用）"""
+        if not self.directory:
+            return
+        with self._files_lock:
+            _unlink(self._path(digest))
+            if self._files is not None:
+                self._files.pop(digest, None)
+
+    def _remember(self, digest: str, uri: str):
+        self._entries[digest] = uri
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, digest: str) -> Optional[str]:
+        """内存中已有的占位图（data URI），用于同步地加到响应头上"""
+        uri = self._entries.get(digest)
+        if uri is not None:
+            self._entries.move_to_end(digest)
+        return uri
+
+    async def load(self, digest: str) -> Optional[str]:
+        """依次查找内存和磁盘"""
+        uri = self.get(digest)
+        if uri is not None or not self.enabled or not self.directory:
+            return uri
+        try:
+            data = await run_in_threadpool(_read_file, self._path(digest))
+        except OSError:
+            return None
+        uri = DATA_URI_PREFIX + base64.b64encode(data).decode("ascii")
+        self._remember(digest, uri)
+        return uri
+
+    def ingest(self, digest: str, content: Union[bytes, str]):
+        """图片进入缓存时调用：在后台生成占位图，不阻塞当前请求（content 为图片内容或缓存文件路径）"""
+        if not self.enabled or not content or digest in self._entries:
+            return
+        task = asyncio.get_running_loop().create_task(self.ensure(digest, content))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def ensure(self, digest: str, content: Union[bytes, str]) -> Optional[str]:
+        """返回占位图，没有时计算一次（同一张图片的并发调用共用一次计算）；无法解码时返回 None"""
+        if not self.enabled:
+            return None
+        uri = await self.load(digest)
+        if uri is not None:
+            return uri
+        return await self._flight.do(digest, lambda: self._compute(digest, content))
+
+    async def _compute(self, digest: str, content: Union[bytes, str]) -> Optional[str]:
+        try:
+            data = await self.pipeline.submit(placeholder, content, self.size, self.quality)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"生成壁纸占位图失败: {e}")
+            return None
+        self.computed += 1
+        self.bytes += len(data)
+        uri = DATA_URI_PREFIX + base64.b64encode(data).decode("ascii")
+        self._remember(digest, uri)
+        if self.directory:
+            try:
+                await run_in_threadpool(self._save_file, digest, data)
+            except OSError as e:
+                logger.warning(f"保存壁纸占位图失败: {e}")
+        return uri
+
+    async def drain(self):
+        """等待后台生成完成"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "entries": len(self._entries),
+            "files": len(self._files) if self._files is not None else 0,
+            "pending": len(self._pending),
+            "computed": self.computed,
+            "failures": self.failures,
+            "average_bytes": round(self.bytes / self.computed) if self.computed else 0,
+        }
+
+
+# 进程级共享的壁纸占位图；壁纸缓存淘汰图片时删除对应的占位图文件
+wallpaper_placeholders = PlaceholderStore()
+wallpaper_cache.on_evict(wallpaper_placeholders.discard)
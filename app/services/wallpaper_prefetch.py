@@ -0,0 +1,225 @@
+"""
+壁纸预取服务
+随机壁纸无法按请求缓存（Picsum 带随机参数，Unsplash 每次返回不同图片），
+因此按 (壁纸源, 分辨率档位, 分类, 模糊程度) 在后台预先下载 N 张图片，请求到来时直接取出一张返回，
+取出后在后台补充。N 按观测到的请求速率和下载耗时自适应：
+足够覆盖一次下载期间到达的请求（按突发放大一倍），长时间无人请求的池子会被清空。
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from ..config import WallpaperConfig
+
+logger = logging.getLogger(__name__)
+
+# 分辨率档位（横屏）：请求尺寸向上取到不小于它的最小档位，相近的屏幕共用一个池子；竖屏按宽高互换后匹配
+RESOLUTION_BUCKETS = ((960, 540), (1280, 720), (1366, 768), (1920, 1080), (2560, 1440), (3840, 2160))
+
+# 请求间隔的指数移动平均系数
+DEMAND_ALPHA = 0.3
+FETCH_ALPHA = 0.3
+
+Fetcher = Callable[[], Awaitable[Tuple[bytes, str]]]
+
+
+def resolution_bucket(width: int, height: int) -> Tuple[int, int]:
+    """请求尺寸所属的档位；超过最大档位时使用最大档位（任意大的尺寸不会各自产生新的预取池和缓存键）"""
+    if height > width:
+        portrait_height, portrait_width = resolution_bucket(height, width)
+        return portrait_width, portrait_height
+    for bucket_width, bucket_height in RESOLUTION_BUCKETS:
+        if width <= bucket_width and height <= bucket_height:
+            return bucket_width, bucket_height
+    return RESOLUTION_BUCKETS[-1]
+
+
+@dataclass(frozen=True)
+class PrefetchSpec:
+    """一个预取池对应的壁纸参数"""
+    source: str
+    width: int
+    height: int
+    category: Optional[str] = None
+    blur: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.source}:{self.width}x{self.height}:{self.category or '-'}:{self.blur or '-'}"
+
+
+@dataclass
+class PrefetchedImage:
+    content: bytes
+    content_type: str
+    fetched_at: float
+
+
+class _Pool:
+    """单个参数组合的预取池与需求统计"""
+
+    def __init__(self, spec: PrefetchSpec, fetch: Fetcher, now: float):
+        self.spec = spec
+        self.fetch = fetch
+        self.images: Deque[PrefetchedImage] = deque()
+        self.last_request = now
+        self.interval: Optional[float] = None  # 请求间隔的移动平均（秒）
+        self.fetch_seconds: Optional[float] = None  # 下载耗时的移动平均（秒）
+        self.task: Optional[asyncio.Task] = None
+        self.served = 0
+        self.misses = 0
+        self.fetched = 0
+        self.errors = 0
+
+    @property
+    def bytes(self) -> int:
+        return sum(len(image.content) for image in self.images)
+
+    def record_request(self, now: float):
+        elapsed = max(now - self.last_request, 1e-3)
+        if self.served + self.misses > 0:
+            self.interval = elapsed if self.interval is None else (
+                DEMAND_ALPHA * elapsed + (1 - DEMAND_ALPHA) * self.interval)
+        self.last_request = now
+
+    def record_fetch(self, seconds: float):
+        self.fetch_seconds = seconds if self.fetch_seconds is None else (
+            FETCH_ALPHA * seconds + (1 - FETCH_ALPHA) * self.fetch_seconds)
+
+    @property
+    def demand_per_second(self) -> float:
+        return 1 / self.interval if self.interval else 0.0
+
+    def target(self, minimum: int, maximum: int, initial: int) -> int:
+        """池子应保持的图片数：一次下载期间预计到达的请求数的两倍"""
+        if self.interval is None or self.fetch_seconds is None:
+            return max(minimum, min(initial, maximum))
+        wanted = math.ceil(self.demand_per_second * self.fetch_seconds * 2)
+        return max(minimum, min(wanted, maximum))
+
+
+class WallpaperPrefetcher:
+    """按参数组合维护预取池，在后台补充"""
+
+    def __init__(self, enabled: Optional[bool] = None, min_size: Optional[int] = None,
+                 max_size: Optional[int] = None, initial_size: Optional[int] = None,
+                 max_bytes: Optional[int] = None, idle_ttl: Optional[float] = None,
+                 concurrency: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.enabled = WallpaperConfig.PREFETCH_ENABLED if enabled is None else enabled
+        self.min_size = WallpaperConfig.PREFETCH_MIN if min_size is None else min_size
+        self.max_size = WallpaperConfig.PREFETCH_MAX if max_size is None else max_size
+        self.initial_size = WallpaperConfig.PREFETCH_INITIAL if initial_size is None else initial_size
+        self.max_bytes = WallpaperConfig.PREFETCH_MAX_BYTES if max_bytes is None else max_bytes
+        self.idle_ttl = WallpaperConfig.PREFETCH_IDLE_TTL if idle_ttl is None else idle_ttl
+        self.concurrency = concurrency or WallpaperConfig.PREFETCH_CONCURRENCY
+        self.clock = clock
+        self._pools: Dict[str, _Pool] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def bytes(self) -> int:
+        return sum(pool.bytes for pool in self._pools.values())
+
+    def take(self, spec: PrefetchSpec, fetch: Fetcher) -> Optional[PrefetchedImage]:
+        """取出一张预取好的图片（没有时返回 None），并按需在后台补充"""
+        if not self.enabled:
+            return None
+        now = self.clock()
+        self._drop_idle(now)
+        pool = self._pools.get(spec.key)
+        if pool is None:
+            pool = self._pools[spec.key] = _Pool(spec, fetch, now)
+        pool.fetch = fetch
+        pool.record_request(now)
+        image = pool.images.popleft() if pool.images else None
+        if image is None:
+            pool.misses += 1
+        else:
+            pool.served += 1
+        self._schedule_refill(pool)
+        return image
+
+    def _drop_idle(self, now: float):
+        for key, pool in list(self._pools.items()):
+            if now - pool.last_request > self.idle_ttl:
+                if pool.task is not None:
+                    pool.task.cancel()
+                del self._pools[key]
+                logger.info(f"壁纸预取池 {key} 长时间无请求，已清空")
+
+    def _schedule_refill(self, pool: _Pool):
+        if pool.task is not None and not pool.task.done():
+            return
+        if len(pool.images) >= pool.target(self.min_size, self.max_size, self.initial_size):
+            return
+        pool.task = asyncio.get_running_loop().create_task(self._refill(pool))
+
+    async def _refill(self, pool: _Pool):
+        """补充到目标数量；总内存超限或下载失败时停止，下一次请求会重新触发"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        while len(pool.images) < pool.target(self.min_size, self.max_size, self.initial_size):
+            if self.bytes >= self.max_bytes:
+                logger.debug(f"壁纸预取池总大小已达上限，暂停补充 {pool.spec.key}")
+                return
+            started = self.clock()
+            try:
+                async with self._semaphore:
+                    content, content_type = await pool.fetch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                pool.errors += 1
+                logger.warning(f"预取壁纸失败 {pool.spec.key}: {e}")
+                return
+            pool.record_fetch(self.clock() - started)
+            pool.images.append(PrefetchedImage(content, content_type, time.time()))
+            pool.fetched += 1
+
+    async def wait_idle(self):
+        """等待进行中的补充任务完成"""
+        tasks = [pool.task for pool in self._pools.values() if pool.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self):
+        """取消全部补充任务并清空池子"""
+        tasks = [pool.task for pool in self._pools.values() if pool.task is not None and not pool.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._pools.clear()
+        self._semaphore = None
+
+    def stats(self) -> dict:
+        pools = []
+        for key, pool in sorted(self._pools.items()):
+            pools.append({
+                "key": key,
+                "ready": len(pool.images),
+                "target": pool.target(self.min_size, self.max_size, self.initial_size),
+                "demand_per_minute": round(pool.demand_per_second * 60, 2),
+                "fetch_ms": round(pool.fetch_seconds * 1000, 1) if pool.fetch_seconds is not None else None,
+                "served": pool.served,
+                "misses": pool.misses,
+                "fetched": pool.fetched,
+                "errors": pool.errors,
+                "bytes": pool.bytes,
+            })
+        served = sum(pool["served"] for pool in pools)
+        requests = served + sum(pool["misses"] for pool in pools)
+        return {
+            "enabled": self.enabled,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "served_ratio": round(served / requests, 4) if requests else 0.0,
+            "pools": pools,
+        }
+
+
+# 进程级共享的壁纸预取器
+wallpaper_prefetcher = WallpaperPrefetcher()
@@ -8,17 +8,27 @@ from typing import Optional, Tuple
 from io import BytesIO
 from pathlib import Path
 
-import httpx
-import requests
-from requests.auth import HTTPBasicAuth
-from PIL import Image
-from webdav3.client import Client
-
 from ..config import WebDAVConfig
 
 logger = logging.getLogger(__name__)
 
 
+# requests、PIL 和 webdav3 导入较慢，只在首次使用头像功能时加载
+def _requests():
+    import requests
+    return requests
+
+
+def _basic_auth(config):
+    from requests.auth import HTTPBasicAuth
+    return HTTPBasicAuth(config.USERNAME, config.PASSWORD)
+
+
+def _image():
+    from PIL import Image
+    return Image
+
+
 class WebDAVService:
     """WebDAV文件存储服务"""
     
@@ -39,6 +49,7 @@ class WebDAVService:
                 'webdav_password': self.config.PASSWORD,
                 'webdav_timeout': 30,
             }
+            from webdav3.client import Client
             self._client = Client(options)
             
             # 确保头像目录存在
@@ -62,10 +73,10 @@ class WebDAVService:
             url = f"{self.config.URL.rstrip('/')}/{directory_path}"
             
             # 发送MKCOL请求创建目录
-            response = requests.request(
+            response = _requests().request(
                 'MKCOL',
                 url,
-                auth=HTTPBasicAuth(self.config.USERNAME, self.config.PASSWORD),
+                auth=_basic_auth(self.config),
                 timeout=30
             )
             
@@ -84,10 +95,10 @@ class WebDAVService:
             url = f"{self.config.URL.rstrip('/')}/{remote_path}"
             
             # 发送PUT请求上传文件
-            response = requests.put(
+            response = _requests().put(
                 url,
                 data=file_content,
-                auth=HTTPBasicAuth(self.config.USERNAME, self.config.PASSWORD),
+                auth=_basic_auth(self.config),
                 timeout=60,
                 headers={'Content-Type': 'application/octet-stream'}
             )
@@ -110,9 +121,9 @@ class WebDAVService:
             url = f"{self.config.URL.rstrip('/')}/{remote_path}"
             
             # 发送DELETE请求删除文件
-            response = requests.delete(
+            response = _requests().delete(
                 url,
-                auth=HTTPBasicAuth(self.config.USERNAME, self.config.PASSWORD),
+                auth=_basic_auth(self.config),
                 timeout=30
             )
             
@@ -134,9 +145,9 @@ class WebDAVService:
             url = f"{self.config.URL.rstrip('/')}/{remote_path}"
             
             # 发送GET请求下载文件
-            response = requests.get(
+            response = _requests().get(
                 url,
-                auth=HTTPBasicAuth(self.config.USERNAME, self.config.PASSWORD),
+                auth=_basic_auth(self.config),
                 timeout=60
             )
             
@@ -167,6 +178,7 @@ class WebDAVService:
         
         # 验证是否为有效图片
         try:
+            Image = _image()
             with Image.open(BytesIO(file_content)) as img:
                 img.verify()
             return True, ""
@@ -176,6 +188,7 @@ class WebDAVService:
     def _process_avatar_image(self, file_content: bytes) -> bytes:
         """处理头像图片（调整大小、优化）"""
         try:
+            Image = _image()
             with Image.open(BytesIO(file_content)) as img:
                 # 转换为RGB模式（如果需要）
                 if img.mode in ('RGBA', 'LA', 'P'):
@@ -332,5 +345,13 @@ class WebDAVService:
             return []
 
 
-# 全局WebDAV服务实例
-webdav_service = WebDAVService() 
\ No newline at end of file
+# 全局WebDAV服务实例（首次使用时创建）
+_webdav_service: Optional[WebDAVService] = None
+
+
+def get_webdav_service() -> WebDAVService:
+    """获取WebDAV服务实例"""
+    global _webdav_service
+    if _webdav_service is None:
+        _webdav_service = WebDAVService()
+    return _webdav_service
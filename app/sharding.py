@@ -0,0 +1,213 @@
+"""
+用户分片模块
+用户表始终在主库（分片 "0"）；快速链接、搜索引擎和搜索历史按用户所在分片存放。
+新用户按一致性哈希环分配分片并记录在 users.shard，之后只有迁移工具会改变它；
+请求认证后把用户所在分片写入会话 info，ShardedSession 据此把这三张表的读写路由到对应分片。
+"""
+import bisect
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import ForeignKeyConstraint, MetaData, event, text
+from sqlalchemy.engine import Engine
+
+from .config import Config as DatabaseConfig
+from .replicas import RoutingSession
+
+logger = logging.getLogger(__name__)
+
+# 会话 info 中记录当前用户所在分片的键
+SHARD_KEY = "shard"
+
+# 主库所在分片（users 表和未分配分片的老用户数据都在这里）
+PRIMARY_SHARD = "0"
+
+# 按用户分片的表
+SHARDED_TABLES = ("quick_links", "search_engines", "search_history")
+
+# 不带用户信息、只凭主键查找所在分片的表，主键必须落在所在分片的区间内
+ID_ROUTED_TABLES = ("quick_links",)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class ShardIdRangeExceeded(RuntimeError):
+    """分片的自增主键超出了它的区间，继续写入会与下一个分片的主键重叠"""
+
+
+class HashRing:
+    """一致性哈希环：增加分片时只有约 1/N 的键改变归属"""
+
+    def __init__(self, names: Iterable[str], vnodes: Optional[int] = None):
+        vnodes = vnodes or DatabaseConfig.SHARD_VIRTUAL_NODES
+        self._points = sorted((_hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._keys = [point for point, _ in self._points]
+
+    def node_for(self, key) -> str:
+        """键在环上顺时针遇到的第一个分片"""
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._points[index][1]
+
+
+class ShardMap:
+    """分片名到引擎的映射
+
+    分片 n 的自增主键从 n * id_spacing 开始，快速链接等表的主键跨分片唯一，
+    不带用户信息的跳转（/go/{token}）和点击计数刷写可以直接由主键找到所在分片。
+    """
+
+    def __init__(self, engines: Dict[str, Engine], vnodes: Optional[int] = None, id_spacing: Optional[int] = None):
+        if PRIMARY_SHARD not in engines:
+            raise ValueError("分片映射必须包含主库分片 0")
+        self.engines = dict(engines)
+        self.ring = HashRing(self.engines, vnodes)
+        self.id_spacing = id_spacing or DatabaseConfig.SHARD_ID_SPACING
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self.engines, key=int)
+
+    def engine_for(self, name: str) -> Engine:
+        return self.engines[name]
+
+    def place(self, user_id: int) -> str:
+        """新用户应分配到的分片"""
+        return self.ring.node_for(user_id)
+
+    def id_base(self, name: str) -> int:
+        """分片自增主键的起始值"""
+        return int(name) * self.id_spacing
+
+    def id_ceiling(self, name: str) -> int:
+        """分片主键区间的上界（不含），主库分片也不能越过它"""
+        return (int(name) + 1) * self.id_spacing
+
+    def shard_for_id(self, row_id: int) -> str:
+        """由主键判断数据所在分片"""
+        name = str(row_id // self.id_spacing)
+        return name if name in self.engines else PRIMARY_SHARD
+
+    def check_id(self, name: str, row_id: int):
+        """主键不在分片的区间内时抛出 ShardIdRangeExceeded
+
+        主库分片的自增主键从 1 开始，超过间隔后会被 shard_for_id 判给分片 1，
+        因此写入前必须拒绝，而不是静默地产生无法正确路由的数据。
+        """
+        if not self.id_base(name) <= row_id < self.id_ceiling(name):
+            raise ShardIdRangeExceeded(
+                f"分片 {name} 的主键 {row_id} 超出区间 [{self.id_base(name)}, {self.id_ceiling(name)})，"
+                f"请增加 SHARD_ID_SPACING 并重新分配主键区间")
+
+    def fan_out(self, fn: Callable[[str, Engine], object], names: Optional[Iterable[str]] = None) -> Dict[str, object]:
+        """在各分片上并发执行 fn(分片名, 引擎)，返回 {分片名: 结果}"""
+        names = list(names or self.names)
+        with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="shard") as executor:
+            futures = {name: executor.submit(fn, name, self.engines[name]) for name in names}
+            return {name: future.result() for name, future in futures.items()}
+
+    def create_tables(self, metadata: MetaData):
+        """在附加分片上创建分片表，并把自增起点设为各分片的主键区间"""
+        shard_metadata = build_shard_metadata(metadata)
+        for name in self.names:
+            if name == PRIMARY_SHARD:
+                continue
+            engine = self.engines[name]
+            shard_metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                for table_name in SHARDED_TABLES:
+                    _set_id_base(conn, table_name, self.id_base(name))
+            logger.info(f"分片 {name} 的表已就绪")
+
+
+def build_shard_metadata(metadata: MetaData) -> MetaData:
+    """附加分片上的表结构：与主库相同，但去掉指向 users 的外键（用户表只在主库）"""
+    shard_metadata = MetaData()
+    for table_name in SHARDED_TABLES:
+        table = metadata.tables[table_name].to_metadata(shard_metadata)
+        for constraint in [c for c in table.constraints if isinstance(c, ForeignKeyConstraint)]:
+            table.constraints.remove(constraint)
+        table.foreign_keys.clear()
+        for column in table.columns:
+            column.foreign_keys.clear()
+        # SQLite 只有 AUTOINCREMENT 表才能通过 sqlite_sequence 指定自增起点
+        table.dialect_options["sqlite"]["autoincrement"] = True
+    return shard_metadata
+
+
+def _set_id_base(conn, table_name: str, base: int):
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :base WHERE name = :name AND seq < :base"),
+                     {"name": table_name, "base": base})
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :base "
+            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+        ), {"name": table_name, "base": base})
+    elif conn.dialect.name == "mysql":
+        # 表中已有更大的主键时 MySQL 会忽略该设置
+        conn.execute(text(f"ALTER TABLE {table_name} AUTO_INCREMENT = {int(base)}"))
+
+
+def _table_name(mapper, clause) -> Optional[str]:
+    if mapper is not None:
+        return mapper.persist_selectable.name
+    table = getattr(clause, "table", None)
+    return getattr(table, "name", None)
+
+
+class ShardedSession(RoutingSession):
+    """按用户分片路由的会话
+
+    分片表的读写走 info[SHARD_KEY] 指定的分片；其余表（以及主库分片上的数据）
+    交给 RoutingSession 按读写路由到主库或只读副本。
+    """
+
+    def __init__(self, *args, shard_map: Optional[ShardMap] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_map = shard_map
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        shard = self.info.get(SHARD_KEY, PRIMARY_SHARD)
+        if shard != PRIMARY_SHARD and self.shard_map is not None and _table_name(mapper, clause) in SHARDED_TABLES:
+            return self.shard_map.engine_for(shard)
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(ShardedSession, "after_flush")
+def _check_new_ids(session, flush_context):
+    """新写入的行主键越出所在分片的区间时中止刷写（事务随之回滚）"""
+    if session.shard_map is None:
+        return
+    shard = session.info.get(SHARD_KEY, PRIMARY_SHARD)
+    for obj in session.new:
+        table = getattr(obj, "__table__", None)
+        if table is not None and table.name in ID_ROUTED_TABLES:
+            session.shard_map.check_id(shard, obj.id)
+
+
+def user_shard(user) -> str:
+    """用户数据所在分片"""
+    return user.shard or PRIMARY_SHARD
+
+
+def bind_user_shard(session, user):
+    """让会话中分片表的读写走用户所在分片"""
+    session.info[SHARD_KEY] = user_shard(user)
+
+
+@contextmanager
+def use_shard(session, name: str):
+    """临时让会话中分片表的读写走指定分片"""
+    previous = session.info.get(SHARD_KEY)
+    session.info[SHARD_KEY] = name
+    try:
+        yield
+    finally:
+        if previous is None:
+            session.info.pop(SHARD_KEY, None)
+        else:
+            session.info[SHARD_KEY] = previous
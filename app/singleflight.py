@@ -0,0 +1,71 @@
+"""
+请求合并（single-flight）
+同一个键同时只执行一次上游获取：缓存过期的瞬间涌入的并发请求等待同一个进行中的任务，
+共享它的结果或异常，而不是各自访问上游。
+获取在独立的任务中执行，发起它的请求被取消（客户端断开）时，其他等待者不受影响。
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, List, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0  # 实际执行的次数
+        self.coalesced = 0  # 加入已有任务、没有重复执行的次数
+        self.errors = 0
+
+    @property
+    def in_flight(self) -> int:
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """执行 fn 并返回结果；同一键已有任务在进行时直接等待它"""
+        loop = asyncio.get_running_loop()
+        task = self._tasks.get(key)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            self.coalesced += 1
+        else:
+            task = loop.create_task(fn())
+            self._tasks[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        # shield：单个等待者被取消时不取消共享的任务
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        total = self.calls + self.coalesced
+        return {
+            "name": self.name,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def flight(name: str) -> SingleFlight:
+    """按名称获取（不存在时创建）合并组，同名的调用方共用一组统计"""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def flight_stats() -> List[dict]:
+    return [_groups[name].stats() for name in sorted(_groups)]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+数据库后端基准测试
+对当前配置的后端（DB_BACKEND=mysql 或 sqlite）运行与线上相同比例的读写负载：
+约 95% 为首页读取（快速链接、搜索引擎、搜索历史），其余为执行搜索（写入搜索历史）。
+
+用法:
+    DB_BACKEND=sqlite SQLITE_PATH=/tmp/bench.db python benchmark_db.py --threads 8 --duration 10
+    DB_BACKEND=mysql MYSQL_PASSWORD=... python benchmark_db.py --threads 8 --duration 10
+"""
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+
+from app import database
+from app.config import Config as DatabaseConfig
+from app.models import User
+from app.replicas import READ_ONLY
+from app.schemas import SearchRequest
+from app.services.data_init_service import DataInitService
+from app.services.quick_link_service import QuickLinkService
+from app.services.search_engine_service import SearchEngineService
+from app.services.search_service import SearchService
+
+
+def seed_users(count: int) -> list:
+    """准备基准测试用户及其默认数据，返回用户ID列表"""
+    db = database.SessionLocal()
+    try:
+        user_ids = []
+        for i in range(count):
+            username = f"bench_user_{i}"
+            user = db.query(User).filter(User.username == username).first()
+            if user is None:
+                user = User(username=username, email=f"{username}@example.com", hashed_password="x")
+                db.add(user)
+                db.flush()
+                db.add_all(DataInitService.build_user_default_data(user.id))
+                db.commit()
+            user_ids.append(user.id)
+        return user_ids
+    finally:
+        db.close()
+
+
+def read_home(user_id: int):
+    """模拟 GET 首页：读取快速链接、搜索引擎和搜索历史"""
+    db = database.SessionLocal()
+    db.info[READ_ONLY] = True
+    try:
+        QuickLinkService.get_quick_links(db, user_id)
+        SearchEngineService.get_search_engines(db, user_id)
+        SearchService.get_search_history(db, user_id)
+    finally:
+        db.close()
+
+
+def write_search(user_id: int):
+    """模拟 POST /api/search：写入一条搜索历史"""
+    db = database.SessionLocal()
+    try:
+        SearchService.perform_search(db, SearchRequest(query=f"bench {random.random()}", search_engine="baidu"), user_id)
+    finally:
+        db.close()
+
+
+def run(threads: int, duration: float, write_ratio: float, user_ids: list) -> dict:
+    """运行负载，返回读写各自的延迟样本"""
+    latencies = {"read": [], "write": []}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        local = {"read": [], "write": []}
+        while time.perf_counter() < deadline:
+            kind = "write" if random.random() < write_ratio else "read"
+            start = time.perf_counter()
+            try:
+                (write_search if kind == "write" else read_home)(random.choice(user_ids))
+            except Exception as e:
+                errors.append(e)
+                continue
+            local[kind].append(time.perf_counter() - start)
+        with lock:
+            for kind, samples in local.items():
+                latencies[kind].extend(samples)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    latencies["errors"] = errors
+    return latencies
+
+
+def percentile(samples: list, pct: float) -> float:
+    """计算百分位数（毫秒）"""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库后端基准测试")
+    parser.add_argument("--threads", type=int, default=8, help="并发线程数")
+    parser.add_argument("--duration", type=float, default=10, help="运行时长（秒）")
+    parser.add_argument("--users", type=int, default=50, help="测试用户数")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="写请求比例")
+    args = parser.parse_args()
+
+    if not database.setup_database() or not database.create_database_tables():
+        print("数据库初始化失败")
+        sys.exit(1)
+
+    print(f"后端: {DatabaseConfig.describe()}")
+    user_ids = seed_users(args.users)
+    run(args.threads, 1, args.write_ratio, user_ids)  # 预热连接池和缓存
+
+    result = run(args.threads, args.duration, args.write_ratio, user_ids)
+    total = len(result["read"]) + len(result["write"])
+    print(f"线程: {args.threads}  时长: {args.duration}s  写比例: {args.write_ratio}")
+    print(f"吞吐: {total / args.duration:.1f} 请求/秒  错误: {len(result['errors'])}")
+    for kind in ("read", "write"):
+        samples = result[kind]
+        if samples:
+            print(
+                f"{kind:>5}: {len(samples)} 次  均值 {statistics.mean(samples) * 1000:.2f}ms  "
+                f"p50 {percentile(samples, 0.50):.2f}ms  p95 {percentile(samples, 0.95):.2f}ms  "
+                f"p99 {percentile(samples, 0.99):.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+数据库迁移工具
+表结构变更使用在线 DDL，数据回填按主键区间分批执行并限流，进度记录在 migration_checkpoints 表中；
+迁移中断（或手动 Ctrl+C）后重新运行同一命令即从检查点继续。
+
+用法:
+    python migrate.py list                      # 按版本顺序列出全部迁移
+    python migrate.py status [名称...]           # 查看各步骤进度
+    python migrate.py run [名称...]              # 按顺序执行迁移（默认全部）
+    python migrate.py run add_users --batch-size 500 --pause 0.5
+    python migrate.py reset add_users           # 清除检查点，下次重新执行全部步骤
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+
+from app.config import Config
+from app.migration_runner import (
+    AddColumns, AddForeignKey, AddIndex, Backfill, CreateTable, DropUniqueIndexes, Migration, MigrationRunner,
+    RunPython, SetNotNull,
+)
+from app.models import User
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 按用户隔离的表（原先没有 user_id 字段）
+USER_TABLES = ("quick_links", "search_engines", "search_history")
+
+# 按用户查询的复合索引: (表名, 索引名, 字段列表)，与 app/models.py 中的定义保持一致
+COMPOSITE_INDEXES = [
+    ("quick_links", "ix_quick_links_user_category", ["user_id", "category"]),
+    ("quick_links", "ix_quick_links_user_clicks", ["user_id", "click_count"]),
+    ("search_engines", "ix_search_engines_user_name", ["user_id", "name"]),
+    ("search_engines", "ix_search_engines_user_active_sort", ["user_id", "is_active", "sort_order"]),
+    ("search_engines", "ix_search_engines_user_default", ["user_id", "is_default"]),
+    ("search_history", "ix_search_history_user_created", ["user_id", "created_at"]),
+]
+
+
+def create_default_admin_user(engine):
+    """没有任何用户时创建默认管理员，已有数据将归属于该用户"""
+    with engine.begin() as conn:
+        if conn.scalar(text("SELECT COUNT(*) FROM users")):
+            return
+        from app.auth import get_password_hash
+
+        conn.execute(text("""
+            INSERT INTO users (username, email, hashed_password, is_active, created_at, updated_at)
+            VALUES (:username, :email, :hashed_password, :is_active, :created_at, :updated_at)
+        """), {
+            "username": "admin",
+            "email": "admin@example.com",
+            "hashed_password": get_password_hash("admin123"),
+            "is_active": True,
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        })
+    logger.info("创建默认管理员用户成功 (用户名: admin, 密码: admin123)，请在生产环境中及时更改默认密码!")
+
+
+def default_owner(conn) -> dict:
+    """已有数据归属的用户：第一个用户"""
+    return {"user_id": conn.scalar(text("SELECT MIN(id) FROM users"))}
+
+
+def user_id_steps(table: str) -> list:
+    steps = []
+    if table == "search_engines":
+        # 搜索引擎名称改为按用户唯一
+        steps.append(DropUniqueIndexes(table, "name"))
+    return steps + [
+        AddColumns(table, {"user_id": "INT NULL"}),
+        Backfill(table, "user_id = :user_id", where="user_id IS NULL", params=default_owner),
+        SetNotNull(table, "user_id", "INT"),
+        AddForeignKey(table, f"fk_{table}_user_id", "user_id", "users(id)", ondelete="CASCADE"),
+    ]
+
+
+# 迁移按列表顺序执行，序号即版本号；新的迁移只能追加在末尾
+MIGRATIONS = [
+    Migration("add_users", "创建用户表，为已有数据添加 user_id 并归属默认管理员", [
+        CreateTable(User.__table__),
+        RunPython("create_default_admin", create_default_admin_user),
+        *[step for table in USER_TABLES for step in user_id_steps(table)],
+    ]),
+    Migration("add_avatar_url", "为用户表添加 avatar_url 字段", [
+        AddColumns("users", {"avatar_url": "VARCHAR(512) NULL"}),
+    ]),
+    Migration("add_profile_fields", "为用户表添加 display_name 和 bio 字段", [
+        AddColumns("users", {"display_name": "VARCHAR(255) NULL", "bio": "VARCHAR(500) NULL"}),
+    ]),
+    Migration("add_link_health_fields", "为快速链接表添加健康检查字段 status 和 last_checked", [
+        AddColumns("quick_links", {"status": "VARCHAR(20) NULL", "last_checked": "DATETIME NULL"}),
+    ]),
+    Migration("add_click_count", "为快速链接表添加点击计数字段 click_count", [
+        AddColumns("quick_links", {"click_count": "INT NOT NULL DEFAULT 0"}),
+    ]),
+    Migration("add_composite_indexes", "为按用户查询的各个表添加 (user_id, ...) 复合索引", [
+        AddIndex(table, index, columns) for table, index, columns in COMPOSITE_INDEXES
+    ]),
+    Migration("add_cascade_deletes", "把指向用户表的外键改为 ON DELETE CASCADE", [
+        AddForeignKey(table, f"fk_{table}_user_id", "user_id", "users(id)", ondelete="CASCADE")
+        for table in USER_TABLES
+    ]),
+    Migration("add_user_shard", "为用户表添加分片字段 shard 和 shard_moving（见 reshard.py）", [
+        AddColumns("users", {"shard": "VARCHAR(50) NULL", "shard_moving": "BOOLEAN NOT NULL DEFAULT 0"}),
+    ]),
+    Migration("add_deletion_requested_at", "为用户表添加注销时间 deletion_requested_at（待删除账户的标记）", [
+        AddColumns("users", {"deletion_requested_at": "DATETIME NULL"}),
+        AddIndex("users", "ix_users_deletion_requested_at", ["deletion_requested_at"]),
+    ]),
+]
+
+
+def select_migrations(names):
+    by_name = {migration.name: migration for migration in MIGRATIONS}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise SystemExit(f"未知的迁移: {', '.join(unknown)}（可用: {', '.join(by_name)}）")
+    return [by_name[name] for name in names] if names else MIGRATIONS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据库迁移工具")
+    parser.add_argument("--batch-size", type=int, default=None, help="回填每批更新的行数")
+    parser.add_argument("--pause", type=float, default=None, help="两批之间至少休眠的秒数")
+    parser.add_argument("--throttle-ratio", type=float, default=None, help="休眠时间不少于该批耗时乘以此比例")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出全部迁移")
+    for command, help_text in (("status", "查看迁移进度"), ("run", "执行迁移"), ("reset", "清除迁移检查点")):
+        sub = commands.add_parser(command, help=help_text)
+        sub.add_argument("names", nargs="*" if command != "reset" else "+")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for version, migration in enumerate(MIGRATIONS, 1):
+            print(f"{version:>3}  {migration.name:<24} {migration.description}")
+        return True
+
+    logger.info(f"连接数据库: {Config.describe()}")
+    engine = create_engine(Config.get_database_url())
+    runner = MigrationRunner(engine, batch_size=args.batch_size, pause=args.pause,
+                             throttle_ratio=args.throttle_ratio)
+    try:
+        for migration in select_migrations(args.names):
+            if args.command == "status":
+                print(migration.name)
+                for step in runner.status(migration):
+                    state = "完成" if step["done"] else (f"进行中 id {step['last_id']}" if step["last_id"] else "未开始")
+                    print(f"  {step['step']:<40} {state:<20} 已更新 {step['rows_done']} 行")
+            elif args.command == "run":
+                runner.run(migration)
+            elif args.command == "reset":
+                logger.info(f"{migration.name}: 已清除 {runner.reset(migration)} 个检查点")
+        return True
+    except KeyboardInterrupt:
+        logger.warning("迁移已中断，重新运行同一命令即可从检查点继续")
+        return False
+    except Exception as e:
+        logger.error(f"迁移失败（重新运行即可从检查点继续）: {e}")
+        return False
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+分片运维工具
+使用 DB_SHARD_URLS 中配置的分片（分片 0 为主库）。
+
+用法:
+    python reshard.py counts                         # 并发统计各分片行数
+    python reshard.py export search_history out.jsonl  # 并发导出一张分片表
+    python reshard.py move 42 2                      # 在线把用户 42 的数据迁移到分片 2
+    python reshard.py rebalance [--apply]            # 列出（或迁移）新增分片后归属改变的用户
+"""
+import argparse
+import json
+import logging
+import sys
+
+from app import database
+from app.services.shard_service import ShardService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片运维工具")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批复制/删除的行数")
+    parser.add_argument("--grace", type=float, default=None, help="迁移时等待进行中请求结束的秒数")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("counts", help="统计各分片行数")
+    export = commands.add_parser("export", help="导出一张分片表为 JSON Lines")
+    export.add_argument("table")
+    export.add_argument("output")
+    move = commands.add_parser("move", help="迁移一个用户")
+    move.add_argument("user_id", type=int)
+    move.add_argument("target")
+    rebalance = commands.add_parser("rebalance", help="按一致性哈希迁移归属改变的用户")
+    rebalance.add_argument("--apply", action="store_true", help="执行迁移（默认只列出）")
+    args = parser.parse_args()
+
+    if not database.setup_database():
+        sys.exit(1)
+    shard_map = database.shard_map
+    if shard_map is None:
+        logger.error("未配置 DB_SHARD_URLS，没有可用的附加分片")
+        sys.exit(1)
+    shard_map.create_tables(database.Base.metadata)
+
+    if args.command == "counts":
+        print(json.dumps(ShardService.count_rows(shard_map), ensure_ascii=False, indent=2))
+    elif args.command == "export":
+        with open(args.output, "w", encoding="utf-8") as f:
+            total = ShardService.export_table(shard_map, args.table, lambda line: f.write(line + "\n"),
+                                              batch_size=args.batch_size)
+        logger.info(f"已导出 {total} 行到 {args.output}")
+    elif args.command == "move":
+        result = ShardService.move_user(database.engine, shard_map, args.user_id, args.target,
+                                        batch_size=args.batch_size, grace=args.grace)
+        print(json.dumps(result, ensure_ascii=False))
+    elif args.command == "rebalance":
+        plan = ShardService.rebalance_plan(database.engine, shard_map)
+        logger.info(f"共有 {len(plan)} 个用户需要迁移")
+        for item in plan:
+            if args.apply:
+                item = ShardService.move_user(database.engine, shard_map, item["user_id"], item["target"],
+                                              batch_size=args.batch_size, grace=args.grace)
+            print(json.dumps(item, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
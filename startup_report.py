@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+启动耗时报告
+在子进程中用 `python -X importtime` 导入 app.main，统计各模块累计导入耗时；
+再执行一次完整的应用启动（lifespan），报告就绪时的常驻内存（RSS）。
+用于跟踪冷启动回归，例如某个可选依赖又被放回了模块顶层导入。
+
+用法:
+    python startup_report.py
+    python startup_report.py --top 30 --json > startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# 只在启用对应功能时才应加载的重依赖
+OPTIONAL_MODULES = ("PIL", "webdav3", "requests", "httpx")
+
+
+def measure_imports(module: str = "app.main") -> dict:
+    """在干净的子进程中导入模块，解析 -X importtime 输出"""
+    code = f"import sys, json, {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # 表头
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    total = next((m["cumulative_ms"] for m in modules if m["module"] == module), 0.0)
+    return {
+        "total_ms": total,
+        "modules": modules,
+        "optional_loaded": [name for name in OPTIONAL_MODULES if name in loaded],
+    }
+
+
+def current_rss_mb() -> float:
+    """当前进程常驻内存（MB）"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # 非 Linux 平台退化为峰值常驻内存（macOS 单位为字节，Linux 为 KB）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_ready() -> dict:
+    """导入应用并执行启动流程，返回就绪耗时与 RSS"""
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from app.main import app
+    imported = time.perf_counter()
+    with TestClient(app) as client:
+        ready = time.perf_counter()
+        status = client.get("/readyz").status_code
+        return {
+            "import_ms": (imported - start) * 1000,
+            "startup_ms": (ready - imported) * 1000,
+            "ready_status": status,
+            "rss_before_mb": rss_before,
+            "rss_ready_mb": current_rss_mb(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时报告")
+    parser.add_argument("--top", type=int, default=20, help="列出累计耗时最高的模块数")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    parser.add_argument("--skip-startup", action="store_true", help="只统计导入耗时，不执行启动流程")
+    args = parser.parse_args()
+
+    imports = measure_imports()
+    report = {
+        "import_total_ms": imports["total_ms"],
+        "optional_loaded": imports["optional_loaded"],
+        "top_modules": sorted(imports["modules"], key=lambda m: m["cumulative_ms"], reverse=True)[:args.top],
+    }
+    if not args.skip_startup:
+        report["ready"] = measure_ready()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"导入 app.main 总耗时: {report['import_total_ms']:.1f} ms")
+    print(f"已加载的可选重依赖: {', '.join(report['optional_loaded']) or '无'}")
+    print(f"\n累计导入耗时 Top {args.top}:")
+    print(f"  {'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for item in report["top_modules"]:
+        print(f"  {item['cumulative_ms']:>10.1f} {item['self_ms']:>10.1f}  {item['module']}")
+    if "ready" in report:
+        ready = report["ready"]
+        print(f"\n启动流程耗时: {ready['startup_ms']:.1f} ms（/readyz 状态码 {ready['ready_status']}）")
+        print(f"就绪时 RSS: {ready['rss_ready_mb']:.1f} MB")
+
+    if report["optional_loaded"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
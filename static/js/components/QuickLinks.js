@@ -4,6 +4,7 @@
  */
 
 import { quickLinksApi } from '../services/api.js';
+import { authService } from '../services/auth.js';
 import { showSuccess, showError } from '../services/notification.js';
 import { dom, events, getCurrentCategory, setCurrentCategory } from '../utils/helpers.js';
 import { EVENTS } from '../utils/constants.js';
@@ -363,7 +364,7 @@ export class QuickLinks {
         page.className = `quick-links-page grid gap-4 grid-cols-${cols}`;
         page.innerHTML = this.visibleItems.map(link => `
             <div class="quick-link-item" data-id="${link.id}">
-                <a href="${link.url}" target="_blank" title="${link.name}">
+                <a href="${this.getLinkHref(link)}" target="_blank" title="${link.name}">
                     <div class="quick-link-icon" style="color: ${link.color}">
                         ${this.renderIcon(link)}
                     </div>
@@ -373,6 +374,16 @@ export class QuickLinks {
         `).join('');
     }
 
+    /**
+     * 获取链接跳转地址
+     * 已登录用户的链接经由 /go/{go_token} 跳转，以便服务端统计点击次数
+     * @param {Object} link 快速链接
+     * @returns {string} 跳转地址
+     */
+    getLinkHref(link) {
+        return authService.isLoggedIn() && link.go_token ? `/go/${link.go_token}` : link.url;
+    }
+
     /**
      * 带动画的页面渲染
      */
@@ -409,7 +420,7 @@ export class QuickLinks {
             page.className = `quick-links-page grid gap-4 grid-cols-${cols}`;
             page.innerHTML = this.visibleItems.map(link => `
                 <div class="quick-link-item" data-id="${link.id}">
-                    <a href="${link.url}" target="_blank" title="${link.name}">
+                    <a href="${this.getLinkHref(link)}" target="_blank" title="${link.name}">
                         <div class="quick-link-icon" style="color: ${link.color}">
                             ${this.renderIcon(link)}
                         </div>
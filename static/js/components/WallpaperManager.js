@@ -17,6 +17,7 @@ export class WallpaperManager {
         this.isEnabled = localStorage.getItem('wallpaper-enabled') !== 'false';
         this.changeInterval = parseInt(localStorage.getItem('wallpaper-interval')) || 30; // 分钟
         this.intervalId = null;
+        this.currentObjectUrl = null; // 当前壁纸的 blob 地址，换图后释放
         
         this.init();
     }
@@ -142,47 +143,70 @@ export class WallpaperManager {
 
     /**
      * 加载壁纸
+     * 响应头中带有占位图时先模糊显示占位图，完整图片下载完成后再替换
      */
     async loadWallpaper() {
+        const wallpaperUrl = this.getRandomWallpaperUrl();
+        const controller = new AbortController();
+        // 设置超时，15秒，因为后端代理可能需要更多时间
+        const timeout = setTimeout(() => controller.abort(), 15000);
+        
         try {
-            const wallpaperUrl = this.getRandomWallpaperUrl();
+            const response = await fetch(wallpaperUrl, { signal: controller.signal });
+            if (!response.ok) {
+                throw new Error(`壁纸加载失败: ${response.status}`);
+            }
             
-            // 预加载图片
+            const placeholder = response.headers.get('X-Wallpaper-Placeholder');
+            if (placeholder) {
+                this.applyPlaceholder(placeholder);
+            }
+            
+            // 预加载图片，解码完成后再显示
+            const blob = await response.blob();
+            const objectUrl = URL.createObjectURL(blob);
             const img = new Image();
+            img.src = objectUrl;
+            try {
+                await img.decode();
+            } catch (error) {
+                URL.revokeObjectURL(objectUrl);
+                throw error;
+            }
             
-            return new Promise((resolve, reject) => {
-                // 设置超时
-                const timeout = setTimeout(() => {
-                    console.warn('壁纸加载超时，使用默认背景');
-                    this.applyDefaultBackground();
-                    reject(new Error('壁纸加载超时'));
-                }, 15000); // 增加到15秒超时，因为后端代理可能需要更多时间
-                
-                img.onload = () => {
-                    clearTimeout(timeout);
-                    this.applyWallpaper(wallpaperUrl, img);
-                    this.currentWallpaper = wallpaperUrl;
-                    this.showNotification('壁纸加载成功', 'info');
-                    resolve();
-                };
-                
-                img.onerror = () => {
-                    clearTimeout(timeout);
-                    console.warn('壁纸加载失败，使用默认背景');
-                    this.applyDefaultBackground();
-                    reject(new Error('壁纸加载失败'));
-                };
-                
-                img.src = wallpaperUrl;
-            });
+            this.applyWallpaper(objectUrl, img);
+            if (this.currentObjectUrl) {
+                URL.revokeObjectURL(this.currentObjectUrl);
+            }
+            this.currentObjectUrl = objectUrl;
+            this.currentWallpaper = wallpaperUrl;
+            this.showNotification('壁纸加载成功', 'info');
         } catch (error) {
-            console.error('加载壁纸时出错:', error);
+            // 失败时不向上抛出：init、toggle 和定时切换都依赖这里自行恢复
+            if (error.name === 'AbortError') {
+                console.warn('壁纸加载超时，使用默认背景');
+            } else {
+                console.warn('壁纸加载失败，使用默认背景:', error);
+            }
             this.applyDefaultBackground();
             // 显示用户友好的错误提示
             this.showNotification('壁纸加载失败，已恢复默认背景', 'warning');
+        } finally {
+            clearTimeout(timeout);
         }
     }
 
+    /**
+     * 显示低质量占位图（几十像素的小图，放大并模糊）
+     */
+    applyPlaceholder(dataUri) {
+        this.applyWallpaper(dataUri);
+        const wallpaperContainer = document.getElementById('wallpaper-container');
+        // 模糊边缘会透出背景色，略微放大遮住
+        wallpaperContainer.style.filter = 'blur(20px)';
+        wallpaperContainer.style.transform = 'scale(1.1)';
+    }
+
     /**
      * 应用壁纸
      */
@@ -204,6 +228,8 @@ export class WallpaperManager {
         
         // 设置壁纸，确保全屏覆盖和最高清晰度
         wallpaperContainer.style.backgroundImage = `url(${url})`;
+        wallpaperContainer.style.filter = '';
+        wallpaperContainer.style.transform = '';
         wallpaperContainer.style.backgroundSize = 'cover';
         wallpaperContainer.style.backgroundPosition = 'center';
         wallpaperContainer.style.backgroundRepeat = 'no-repeat';
@@ -1,6 +1,9 @@
 """
 pytest配置文件
 """
+import uuid
+from contextlib import contextmanager
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -9,6 +12,8 @@ from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.database import get_db, Base
+from app.config import MetricsConfig
+from app.instrumentation import sql_metrics
 
 
 # 创建测试数据库
@@ -19,7 +24,7 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
 
 
 def override_get_db():
@@ -59,4 +64,32 @@ def db_session():
     
     session.close()
     transaction.rollback()
-    connection.close() 
\ No newline at end of file
+    connection.close()
+
+
+@pytest.fixture
+def auth_headers(client):
+    """注册并登录一个新用户，返回认证请求头"""
+    username = f"user_{uuid.uuid4().hex[:8]}"
+    client.post("/api/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "secret1"
+    })
+    response = client.post("/api/auth/login", json={"username": username, "password": "secret1"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """断言块内完成的每个请求执行的SQL语句不超过预算，且没有疑似 N+1"""
+    with sql_metrics.observe() as requests:
+        yield requests
+    assert requests, "块内没有完成任何请求"
+    for route, stats in requests:
+        assert stats.count <= max_queries, f"{route} 执行了 {stats.count} 条SQL，超出预算 {max_queries}"
+        assert not stats.repeated_shapes(), f"{route} 疑似 N+1: {stats.repeated_shapes()}"
+
+
+@pytest.fixture(autouse=True)
+def metrics_enabled(monkeypatch):
+    """测试中开放运行指标接口（默认关闭）"""
+    monkeypatch.setattr(MetricsConfig, "ENABLED", True)
@@ -0,0 +1,105 @@
+"""
+账户删除测试
+"""
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.config import AccountDeletionConfig
+from app.services.account_deletion_service import AccountDeletionService
+from app.models import QuickLink, SearchEngine, SearchHistory, User
+from app.services.data_init_service import DataInitService
+from tests.conftest import TestingSessionLocal
+
+
+class TestAccountDeletion:
+    """账户删除测试类"""
+
+    def test_database_cascade_without_loading_children(self, tmp_path):
+        """测试删除用户时由外键级联删除子表，ORM 不加载子表行"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'cascade.db'}")
+        event.listen(engine, "connect", lambda conn, record: conn.execute("PRAGMA foreign_keys=ON"))
+        database.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        try:
+            user = User(username="cascade", email="cascade@example.com", hashed_password="x")
+            db.add(user)
+            db.flush()
+            db.add_all(DataInitService.build_user_default_data(user.id))
+            db.add(SearchHistory(query="q", search_engine="baidu", user_id=user.id))
+            db.commit()
+
+            statements = []
+            event.listen(engine, "before_cursor_execute",
+                         lambda conn, cursor, statement, *args: statements.append(statement))
+            db.delete(user)
+            db.commit()
+
+            assert not any("FROM quick_links" in s or "FROM search_history" in s for s in statements)
+            for model in (QuickLink, SearchEngine, SearchHistory):
+                assert db.scalar(select(func.count()).select_from(model)) == 0
+        finally:
+            db.close()
+            engine.dispose()
+
+    def test_delete_account_in_batches(self, client: TestClient, auth_headers, monkeypatch):
+        """测试注销账户后立即停用，后台任务分批删除全部数据"""
+        monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+        monkeypatch.setattr(AccountDeletionConfig, "BATCH_SIZE", 2)
+        monkeypatch.setattr(AccountDeletionConfig, "BATCH_PAUSE", 0)
+        for i in range(5):
+            client.post("/api/search", json={"query": f"q{i}"}, headers=auth_headers)
+        user_id = client.get("/api/auth/me", headers=auth_headers).json()["id"]
+
+        response = client.delete("/api/auth/account", headers=auth_headers)
+        assert response.status_code == 202
+
+        # 删除任务在应用的事件循环上独立运行，等待其完成
+        client.portal.call(AccountDeletionService.drain)
+        assert client.get("/api/auth/me", headers=auth_headers).status_code == 401
+        db = TestingSessionLocal()
+        try:
+            assert db.get(User, user_id) is None
+            for model in (QuickLink, SearchEngine, SearchHistory):
+                assert db.scalar(select(func.count()).select_from(model).where(model.user_id == user_id)) == 0
+        finally:
+            db.close()
+
+    def test_resume_interrupted_purge(self, monkeypatch):
+        """测试删除中途进程退出后，启动任务继续删除已注销的账户，正常账户和管理员停用的账户不受影响"""
+        import asyncio
+
+        monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+        db = TestingSessionLocal()
+        try:
+            deleted = User(username="half_deleted", email="half@example.com", hashed_password="x")
+            AccountDeletionService.mark_deleted(deleted)
+            kept = User(username="still_active", email="active@example.com", hashed_password="x")
+            disabled = User(username="disabled", email="disabled@example.com", hashed_password="x", is_active=False)
+            db.add_all([deleted, kept, disabled])
+            db.flush()
+            for user in (deleted, kept, disabled):
+                db.add_all([SearchHistory(query=f"q{i}", search_engine="baidu", user_id=user.id) for i in range(3)])
+            db.commit()
+            deleted_id, kept_ids = deleted.id, (kept.id, disabled.id)
+        finally:
+            db.close()
+
+        pending = AccountDeletionService.pending_purges()
+        assert (deleted_id, "0") in pending
+        assert not any(user_id in kept_ids for user_id, _ in pending)
+        assert asyncio.run(AccountDeletionService.resume_pending_purges()) >= 1
+
+        db = TestingSessionLocal()
+        try:
+            assert db.get(User, deleted_id) is None
+            assert db.scalar(select(func.count()).select_from(SearchHistory)
+                             .where(SearchHistory.user_id == deleted_id)) == 0
+            for kept_id in kept_ids:
+                assert db.get(User, kept_id) is not None
+                assert db.scalar(select(func.count()).select_from(SearchHistory)
+                                 .where(SearchHistory.user_id == kept_id)) == 3
+        finally:
+            db.close()
+
@@ -0,0 +1,174 @@
+"""
+异步会话服务层测试（aiosqlite）
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_async_db
+from app.routers.aio import quick_links, search_engines, search, auth
+from app.schemas import (
+    QuickLinkCreate, QuickLinkUpdate, SearchEngineCreate, SearchRequest, UserCreate, UserLogin, UserProfileUpdate
+)
+from app.services.quick_link_service import AsyncQuickLinkService
+from app.services.search_engine_service import AsyncSearchEngineService
+from app.services.search_service import AsyncSearchService
+from app.services.user_service import AsyncUserService
+
+ASYNC_SQLITE_URL = "sqlite+aiosqlite://"
+
+
+async def _make_sessionmaker():
+    """创建内存数据库并建表"""
+    engine = create_async_engine(ASYNC_SQLITE_URL, poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+def run_with_session(coro_fn):
+    """在独立事件循环和内存数据库中运行测试协程"""
+    async def runner():
+        engine, session_factory = await _make_sessionmaker()
+        try:
+            async with session_factory() as db:
+                await coro_fn(db)
+        finally:
+            await engine.dispose()
+    asyncio.run(runner())
+
+
+class TestAsyncServices:
+    """异步服务测试类"""
+
+    def test_user_lifecycle(self):
+        """测试注册（含默认数据）、登录与资料更新"""
+        async def scenario(db):
+            user = await AsyncUserService.create_user(
+                db, UserCreate(username="alice", email="alice@example.com", password="secret1")
+            )
+            assert user.id is not None
+            assert await AsyncUserService.create_user(
+                db, UserCreate(username="alice", email="other@example.com", password="secret1")
+            ) is None
+
+            links = await AsyncQuickLinkService.get_quick_links(db, user.id)
+            engines = await AsyncSearchEngineService.get_search_engines(db, user.id)
+            assert len(links) > 0
+            assert len(engines) > 0
+
+            token = await AsyncUserService.login_user(db, UserLogin(username="alice", password="secret1"))
+            assert token.user.username == "alice"
+            assert await AsyncUserService.login_user(db, UserLogin(username="alice", password="wrong")) is None
+
+            updated = await AsyncUserService.update_user_profile(
+                db, user.id, UserProfileUpdate(display_name="  Alice  ", bio="")
+            )
+            assert updated.display_name == "Alice"
+            assert updated.bio is None
+
+        run_with_session(scenario)
+
+    def test_quick_link_crud(self):
+        """测试快速链接增删改查"""
+        async def scenario(db):
+            user = await AsyncUserService.create_user(
+                db, UserCreate(username="bob", email="bob@example.com", password="secret1")
+            )
+            link = await AsyncQuickLinkService.create_quick_link(
+                db, QuickLinkCreate(name="测试", url="https://test.com", category="测试"), user.id
+            )
+            assert link.id is not None
+
+            updated = await AsyncQuickLinkService.update_quick_link(db, link.id, QuickLinkUpdate(name="新名称"), user.id)
+            assert updated.name == "新名称"
+            assert updated.url == "https://test.com"
+
+            filtered = await AsyncQuickLinkService.get_quick_links(db, user.id, category="测试")
+            assert [item.id for item in filtered] == [link.id]
+
+            assert await AsyncQuickLinkService.delete_quick_link(db, link.id, user.id) is True
+            assert await AsyncQuickLinkService.delete_quick_link(db, link.id, user.id) is False
+
+            defaults = await AsyncQuickLinkService.get_quick_links(db, None)
+            assert all(item.user_id == 0 for item in defaults)
+
+        run_with_session(scenario)
+
+    def test_search_engine_and_search(self):
+        """测试默认搜索引擎切换与搜索历史记录"""
+        async def scenario(db):
+            user = await AsyncUserService.create_user(
+                db, UserCreate(username="carol", email="carol@example.com", password="secret1")
+            )
+            engine = await AsyncSearchEngineService.create_search_engine(db, SearchEngineCreate(
+                name="custom", display_name="自定义", url_template="https://s.example.com/?q={query}", is_default=True
+            ), user.id)
+            assert engine.is_default is True
+            assert (await AsyncSearchEngineService.get_default_search_engine(db, user.id)).id == engine.id
+            defaults = [e for e in await AsyncSearchEngineService.get_search_engines(db, user.id) if e.is_default]
+            assert [e.id for e in defaults] == [engine.id]
+
+            result = await AsyncSearchService.perform_search(
+                db, SearchRequest(query="hello", search_engine="custom"), user.id
+            )
+            assert result.search_url == "https://s.example.com/?q=hello"
+            assert await AsyncSearchService.perform_search(
+                db, SearchRequest(query="hello", search_engine="missing"), user.id
+            ) is None
+
+            history = await AsyncSearchService.get_search_history(db, user.id)
+            assert [item.query for item in history] == ["hello"]
+
+        run_with_session(scenario)
+
+
+def test_async_routers():
+    """测试异步路由与异步认证依赖的端到端流程"""
+    state = {}
+
+    async def override_get_async_db():
+        # aiosqlite 连接绑定事件循环，因此在 TestClient 的事件循环中首次使用时创建
+        if "factory" not in state:
+            state["engine"], state["factory"] = await _make_sessionmaker()
+        async with state["factory"]() as db:
+            yield db
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        if "engine" in state:
+            await state["engine"].dispose()
+
+    app = FastAPI(lifespan=lifespan)
+    for module in (quick_links, search_engines, search, auth):
+        app.include_router(module.router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+
+    with TestClient(app) as client:
+        response = client.post("/api/auth/register", json={
+            "username": "dave", "email": "dave@example.com", "password": "secret1"
+        })
+        assert response.status_code == 201
+
+        token = client.post("/api/auth/login", json={"username": "dave", "password": "secret1"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        assert client.get("/api/auth/me", headers=headers).json()["username"] == "dave"
+
+        response = client.post("/api/quick-links", json={"name": "链接", "url": "https://a.com"}, headers=headers)
+        assert response.status_code == 200
+        link_id = response.json()["id"]
+
+        links = client.get("/api/quick-links", headers=headers).json()
+        assert any(link["id"] == link_id for link in links)
+
+        response = client.post("/api/search", json={"query": "q", "search_engine": "baidu"}, headers=headers)
+        assert response.status_code == 200
+        assert len(client.get("/api/search-history", headers=headers).json()) == 1
+
+        assert client.get("/api/search-engines/default").json()["name"] == "baidu"
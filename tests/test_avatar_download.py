@@ -0,0 +1,49 @@
+"""
+头像代理下载测试（WebDAV 由替身对象模拟）
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import WebDAVConfig
+from app.routers import avatar
+from app.singleflight import SingleFlight
+
+AVATAR = b"\x89PNG" + b"a" * 2000
+
+
+class FakeWebDAV:
+    def __init__(self):
+        self.downloads = 0
+
+    def get_avatar_content(self, avatar_url):
+        self.downloads += 1
+        return AVATAR if avatar_url.endswith("user_1_abcd1234.png") else None
+
+
+@pytest.fixture
+def webdav(monkeypatch):
+    monkeypatch.setattr(WebDAVConfig, "URL", "https://dav.example/")
+    monkeypatch.setattr(WebDAVConfig, "USERNAME", "user")
+    monkeypatch.setattr(WebDAVConfig, "PASSWORD", "secret")
+    fake = FakeWebDAV()
+    monkeypatch.setattr(avatar, "get_webdav_service", lambda: fake)
+    monkeypatch.setattr(avatar, "avatar_flight", SingleFlight("avatar-test"))
+    return fake
+
+
+class TestAvatarDownload:
+    """头像代理下载测试类"""
+
+    def test_etag_and_immutable_cache(self, client: TestClient, webdav):
+        """测试头像带内容 ETag、永久缓存，重新验证返回 304，支持 Range"""
+        url = "/api/avatar/download/user_1_abcd1234.png"
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        etag = response.headers["etag"]
+
+        assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+        partial = client.get(url, headers={"Range": "bytes=0-3"})
+        assert partial.status_code == 206 and partial.content == b"\x89PNG"
+        assert client.get("/api/avatar/download/missing.png").status_code == 404
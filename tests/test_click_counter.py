@@ -0,0 +1,106 @@
+"""
+快速链接点击计数测试
+"""
+from fastapi.testclient import TestClient
+
+from app.link_tokens import sign_link_id
+from app.models import QuickLink, User
+from app.services.click_counter_service import ClickCounter, click_counter
+from app.services.quick_link_service import QuickLinkService
+from tests.conftest import TestingSessionLocal
+
+
+def _create_user_with_links(db, username, names):
+    """创建测试用户及其快速链接"""
+    user = User(username=username, email=f"{username}@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    links = [QuickLink(name=name, url=f"https://{name}.example.com", user_id=user.id) for name in names]
+    db.add_all(links)
+    db.commit()
+    return user, links
+
+
+class TestClickCounter:
+    """点击计数器测试类"""
+
+    def test_flush_batches_increments(self, test_db, db_session):
+        """测试多次点击合并为一次批量刷写"""
+        user, (a, b) = _create_user_with_links(db_session, "click_user", ["a", "b"])
+        counter = ClickCounter()
+        for _ in range(3):
+            counter.record(a.id)
+        counter.record(b.id)
+
+        assert counter.flush(db_session) == 2
+        assert counter.pending() == {}
+        assert counter.flush(db_session) == 0
+
+        db_session.expire_all()
+        assert db_session.get(QuickLink, a.id).click_count == 3
+        assert db_session.get(QuickLink, b.id).click_count == 1
+
+    def test_sort_by_usage(self, test_db, db_session):
+        """测试按点击次数排序"""
+        user, (a, b, c) = _create_user_with_links(db_session, "sort_user", ["a", "b", "c"])
+        counter = ClickCounter()
+        for link, clicks in ((a, 1), (b, 5), (c, 3)):
+            for _ in range(clicks):
+                counter.record(link.id)
+        counter.flush(db_session)
+        db_session.expire_all()
+
+        links = QuickLinkService.get_quick_links(db_session, user.id, sort="usage")
+        assert [link.name for link in links] == ["b", "c", "a"]
+
+    def test_go_redirects_without_db_write(self, client: TestClient):
+        """测试跳转端点只在内存计数"""
+        db = TestingSessionLocal()
+        try:
+            user, (link,) = _create_user_with_links(db, "go_user", ["go"])
+            link_id, link_url = link.id, link.url
+        finally:
+            db.close()
+
+        before = click_counter.pending().get(link_id, 0)
+        response = client.get(f"/go/{sign_link_id(link_id)}", follow_redirects=False)
+        assert response.status_code == 302
+        assert response.headers["location"] == link_url
+        assert click_counter.pending()[link_id] == before + 1
+
+        response = client.get(f"/go/{sign_link_id(999999)}", follow_redirects=False)
+        assert response.status_code == 404
+
+    def test_go_rejects_unsigned_ids(self, client: TestClient):
+        """测试不能用自增主键或伪造的签名跳转"""
+        db = TestingSessionLocal()
+        try:
+            user, (link,) = _create_user_with_links(db, "go_guess_user", ["guess"])
+            link_id = link.id
+        finally:
+            db.close()
+
+        for token in (str(link_id), f"{link_id}.forged", f"{link_id + 1}.{sign_link_id(link_id).split('.')[1]}"):
+            assert client.get(f"/go/{token}", follow_redirects=False).status_code == 404
+        assert click_counter.pending().get(link_id, 0) == 0
+
+    def test_invalid_sort_rejected(self, client: TestClient):
+        """测试非法排序参数"""
+        response = client.get("/api/quick-links?sort=name")
+        assert response.status_code == 422
+
+    def test_default_links_have_no_token(self, client: TestClient):
+        """测试未登录时的默认链接不签发令牌，其临时 ID 不能用来访问他人的链接"""
+        db = TestingSessionLocal()
+        try:
+            user, (link,) = _create_user_with_links(db, "private_user", ["private"])
+            link_id = link.id
+        finally:
+            db.close()
+
+        links = client.get("/api/quick-links").json()
+        assert links and all(item["go_token"] is None for item in links)
+        assert "user_id" not in links[0]
+        for item in links:
+            assert client.get(f"/go/{item['id']}", follow_redirects=False).status_code == 404
+        assert click_counter.pending().get(link_id, 0) == 0
@@ -0,0 +1,78 @@
+"""
+请求级会话延迟创建测试
+"""
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.database import LazyAsyncSession, LazySession, get_db
+from app.main import app
+from app.replicas import READ_ONLY, ReplicaSet, RoutingSession, reads_from_replica
+from tests.conftest import TestingSessionLocal, override_get_db
+
+
+class CountingSessionLocal:
+    """记录会话创建次数的会话工厂"""
+
+    def __init__(self):
+        self.created = 0
+
+    def __call__(self):
+        self.created += 1
+        return TestingSessionLocal()
+
+
+class TestLazySession:
+    """会话延迟创建测试类"""
+
+    def test_anonymous_requests_create_no_session(self, client: TestClient, auth_headers, monkeypatch):
+        """测试未登录读取默认数据时不创建会话，登录用户每个请求只创建一个"""
+        factory = CountingSessionLocal()
+        monkeypatch.setattr(database, "SessionLocal", factory)
+        app.dependency_overrides.pop(get_db)
+        try:
+            assert client.get("/api/quick-links").status_code == 200
+            assert client.get("/api/search-engines").status_code == 200
+            assert factory.created == 0
+
+            assert client.get("/api/quick-links", headers=auth_headers).status_code == 200
+            assert factory.created == 1
+        finally:
+            app.dependency_overrides[get_db] = override_get_db
+
+    def test_info_carried_into_session(self, tmp_path):
+        """测试创建前写入的 info 带入真实会话，副本路由判断透过代理生效"""
+        primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+        replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        factory = sessionmaker(bind=primary, class_=RoutingSession, replicas=ReplicaSet([replica]))
+        db = LazySession(factory, {READ_ONLY: True})
+        try:
+            assert not db.created
+            assert db.info[READ_ONLY] is True
+            db.execute(text("SELECT 1"))
+            assert db.created
+            assert db.info[READ_ONLY] is True
+            assert reads_from_replica(db)
+        finally:
+            db.close()
+            primary.dispose()
+            replica.dispose()
+
+    def test_async_session_created_on_first_use(self, tmp_path):
+        """测试异步会话代理首次使用时才创建"""
+        async def scenario():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+            db = LazyAsyncSession(async_sessionmaker(engine))
+            await db.close()
+            assert not db.created
+
+            assert (await db.execute(text("SELECT 1"))).scalar() == 1
+            assert db.created
+            await db.close()
+            await engine.dispose()
+
+        asyncio.run(scenario())
@@ -0,0 +1,190 @@
+"""
+快速链接健康检查测试
+"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.models import QuickLink, User
+from app.services import link_health_service
+from app.services.link_health_service import (
+    LinkChecker, LinkHealthService, STATUS_OK, STATUS_BROKEN, STATUS_ERROR
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地桩服务器：按路径返回不同状态，并记录请求次数与并发峰值"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self):
+        server = self.server
+        path = self.path.split("?")[0]
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if path == "/slow":
+                time.sleep(0.1)
+            location = None
+            if path == "/missing":
+                status = 404
+            elif path == "/nohead" and self.command == "HEAD":
+                status = 405
+            elif path == "/redirect":
+                status, location = 302, parse_qs(urlsplit(self.path).query)["to"][0]
+            else:
+                status = 200
+            self.send_response(status)
+            if location:
+                self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    do_HEAD = _respond
+    do_GET = _respond
+
+
+@pytest.fixture
+def stub_server():
+    """启动本地桩HTTP服务器"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.hits = {}
+    server.active = 0
+    server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestLinkChecker:
+    """链接检查器测试类"""
+
+    def test_classifies_statuses(self, stub_server):
+        """测试不同响应被归类为正确的状态"""
+        base = stub_server.base_url
+        checker = LinkChecker(timeout=2, allow_private=True)
+        results = asyncio.run(checker.check_urls([
+            f"{base}/ok",
+            f"{base}/missing",
+            f"{base}/nohead",
+            "http://127.0.0.1:1/unreachable",
+            "not-a-url",
+        ]))
+
+        assert results[f"{base}/ok"] == STATUS_OK
+        assert results[f"{base}/missing"] == STATUS_BROKEN
+        assert results[f"{base}/nohead"] == STATUS_OK
+        assert results["http://127.0.0.1:1/unreachable"] == STATUS_ERROR
+        assert results["not-a-url"] == STATUS_ERROR
+
+    def test_deduplicates_and_caches(self, stub_server):
+        """测试相同URL只请求一次，且结果在TTL内复用"""
+        url = f"{stub_server.base_url}/ok?dedupe"
+        checker = LinkChecker(timeout=2, cache_ttl=60, allow_private=True)
+
+        asyncio.run(checker.check_urls([url, url, url]))
+        asyncio.run(checker.check_urls([url]))
+        assert stub_server.hits[url.replace(stub_server.base_url, "")] == 1
+
+        # TTL为0时每次都重新检查
+        expired = LinkChecker(timeout=2, cache_ttl=0, allow_private=True)
+        asyncio.run(expired.check_urls([url]))
+        time.sleep(0.01)
+        asyncio.run(expired.check_urls([url]))
+        assert stub_server.hits[url.replace(stub_server.base_url, "")] == 3
+
+    def test_cache_is_bounded(self):
+        """测试缓存条数有上限，过期条目在每批检查后清理"""
+        checker = LinkChecker(timeout=2, cache_ttl=60, cache_max_entries=3)
+        asyncio.run(checker.check_urls([f"not-a-url-{i}" for i in range(5)]))
+        assert list(checker._cache) == ["not-a-url-2", "not-a-url-3", "not-a-url-4"]
+
+        expiring = LinkChecker(timeout=2, cache_ttl=0)
+        asyncio.run(expiring.check_urls([f"not-a-url-{i}" for i in range(5)]))
+        time.sleep(0.01)
+        asyncio.run(expiring.check_urls(["not-a-url-new"]))
+        assert len(expiring._cache) <= 1
+
+    def test_per_host_concurrency_bound(self, stub_server):
+        """测试单主机并发不超过上限"""
+        urls = [f"{stub_server.base_url}/slow?i={i}" for i in range(8)]
+        checker = LinkChecker(max_concurrency=10, per_host_concurrency=2, timeout=5, allow_private=True)
+        results = asyncio.run(checker.check_urls(urls))
+
+        assert all(status == STATUS_OK for status in results.values())
+        assert stub_server.max_active <= 2
+
+    def test_blocks_private_targets(self, stub_server, monkeypatch):
+        """测试默认不请求内网地址，且每一跳重定向都重新校验目标地址"""
+        base = stub_server.base_url
+        blocked = LinkChecker(timeout=2)
+        results = asyncio.run(blocked.check_urls([f"{base}/ok?private", "http://169.254.169.254/latest/meta-data/"]))
+        assert set(results.values()) == {STATUS_ERROR}
+        assert "/ok?private" not in stub_server.hits
+        assert not link_health_service.is_public_address("::ffff:10.0.0.1")
+        assert link_health_service.is_public_address("93.184.216.34")
+
+        # 把桩服务器的地址视为公网地址，重定向到另一个回环地址时在发起请求前被拒绝
+        checked = []
+
+        def only_stub_is_public(address):
+            checked.append(address)
+            return address == "127.0.0.1"
+
+        monkeypatch.setattr(link_health_service, "is_public_address", only_stub_is_public)
+        port = stub_server.server_address[1]
+        url = f"{base}/redirect?to=http://127.0.0.2:{port}/ok"
+        assert asyncio.run(LinkChecker(timeout=2).check_urls([url]))[url] == STATUS_ERROR
+        assert sum(n for path, n in stub_server.hits.items() if path.startswith("/redirect")) == 1
+        assert "127.0.0.2" in checked
+
+        # 允许的目标照常跟随重定向
+        allowed = f"{base}/redirect?to=/redirected"
+        assert asyncio.run(LinkChecker(timeout=2).check_urls([allowed]))[allowed] == STATUS_OK
+        assert stub_server.hits["/redirected"] == 1
+
+
+class TestLinkHealthService:
+    """链接健康检查持久化测试类"""
+
+    def test_check_links_persists_in_batches(self, test_db, db_session, stub_server):
+        """测试检查结果分批写回 status 和 last_checked"""
+        user = User(username="health_user", email="health@example.com", hashed_password="x")
+        db_session.add(user)
+        db_session.flush()
+
+        base = stub_server.base_url
+        links = [
+            QuickLink(name="ok", url=f"{base}/ok?persist", user_id=user.id),
+            QuickLink(name="ok-dup", url=f"{base}/ok?persist", user_id=user.id),
+            QuickLink(name="missing", url=f"{base}/missing", user_id=user.id),
+        ]
+        db_session.add_all(links)
+        db_session.commit()
+
+        checker = LinkChecker(timeout=2, allow_private=True)
+        results = asyncio.run(
+            LinkHealthService.check_links(db_session, user_id=user.id, batch_size=2, checker=checker)
+        )
+        assert len(results) == 3
+        assert stub_server.hits["/ok?persist"] == 1
+
+        db_session.expire_all()
+        statuses = {link.name: link.status for link in db_session.query(QuickLink).filter(QuickLink.user_id == user.id)}
+        assert statuses == {"ok": STATUS_OK, "ok-dup": STATUS_OK, "missing": STATUS_BROKEN}
+        assert all(link.last_checked is not None for link in db_session.query(QuickLink).filter(QuickLink.user_id == user.id))
@@ -0,0 +1,116 @@
+"""
+数据迁移框架测试（旧版表结构建在临时 SQLite 文件上）
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import migrate
+from app.migration_runner import AddColumns, Backfill, Migration, MigrationRunner, format_duration
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """没有用户系统的旧库：主键不连续的快速链接，名称唯一的搜索引擎"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE quick_links (id INTEGER PRIMARY KEY, name VARCHAR(255), url VARCHAR(512))"))
+        conn.execute(text("CREATE TABLE search_engines (id INTEGER PRIMARY KEY, name VARCHAR(100))"))
+        conn.execute(text("CREATE UNIQUE INDEX ix_search_engines_name ON search_engines (name)"))
+        conn.execute(text("INSERT INTO quick_links (id, name, url) VALUES (:id, :name, 'https://example.com')"),
+                     [{"id": i * 7, "name": f"link{i}"} for i in range(1, 26)])
+        conn.execute(text("INSERT INTO search_engines (id, name) VALUES (1, 'baidu'), (2, 'google')"))
+    yield engine
+    engine.dispose()
+
+
+def add_users() -> Migration:
+    return next(migration for migration in migrate.MIGRATIONS if migration.name == "add_users")
+
+
+class TestMigrations:
+    """数据迁移框架测试类"""
+
+    def test_backfill_resumes_from_checkpoint(self, legacy_engine):
+        """测试回填按批提交检查点，中断后重新运行从检查点继续且不重复已完成的步骤"""
+        def interrupt(seconds):
+            raise Interrupted()
+
+        runner = MigrationRunner(legacy_engine, batch_size=10, pause=0, sleep=interrupt)
+        with pytest.raises(Interrupted):
+            runner.run(add_users())
+
+        status = {step["step"]: step for step in runner.status(add_users())}
+        assert status["create_users"]["done"] and status["add_columns_quick_links"]["done"]
+        assert status["backfill_quick_links"] == {**status["backfill_quick_links"],
+                                                  "done": False, "last_id": 70, "rows_done": 10}
+        with legacy_engine.connect() as conn:
+            assert conn.scalar(text("SELECT COUNT(*) FROM quick_links WHERE user_id IS NULL")) == 15
+
+        slept = []
+        executed = MigrationRunner(legacy_engine, batch_size=10, pause=0.01, sleep=slept.append).run(add_users())
+        assert executed[0] == "backfill_quick_links"
+        assert "create_default_admin" not in executed
+        assert len(slept) == 1  # 剩余 15 行分两批，最后一批之后不休眠
+
+        with legacy_engine.connect() as conn:
+            admin_id = conn.scalar(text("SELECT id FROM users WHERE username = 'admin'"))
+            assert conn.scalar(text("SELECT COUNT(*) FROM quick_links WHERE user_id = :id"), {"id": admin_id}) == 25
+            assert conn.scalar(text("SELECT COUNT(*) FROM search_engines WHERE user_id = :id"), {"id": admin_id}) == 2
+        status = runner.status(add_users())
+        assert all(step["done"] for step in status)
+        assert next(step for step in status if step["step"] == "backfill_quick_links")["rows_done"] == 25
+        # 搜索引擎名称不再全局唯一
+        assert not any(index["unique"] for index in inspect(legacy_engine).get_indexes("search_engines"))
+
+    def test_progress_and_throttle(self, legacy_engine):
+        """测试进度按主键区间估算剩余时间，批间休眠时间随该批耗时增长"""
+        ticks = iter(range(1000))
+        reports, slept = [], []
+        runner = MigrationRunner(legacy_engine, batch_size=10, pause=0.5, throttle_ratio=2,
+                                 clock=lambda: next(ticks), sleep=slept.append, report=reports.append)
+        runner.run(Migration("tag", "测试", [
+            AddColumns("quick_links", {"tag": "VARCHAR(20) NULL"}),
+            Backfill("quick_links", "tag = :tag", params={"tag": "x"}),
+        ]))
+
+        assert [report["rows"] for report in reports] == [10, 20, 25]
+        assert reports[-1]["percent"] == 100 and reports[-1]["eta"] == 0
+        assert 0 < reports[0]["percent"] < 100 and reports[0]["eta"] > 0
+        # 每批耗时 1 个时钟单位，休眠 max(0.5, 1 * 2)
+        assert slept == [2, 2]
+        assert format_duration(3723) == "1h02m03s" and format_duration(None) == "未知"
+
+    def test_add_columns_idempotent(self, legacy_engine):
+        """测试添加字段的迁移重复执行（清除检查点后）不报错"""
+        runner = MigrationRunner(legacy_engine)
+        for name in ("add_users", "add_avatar_url", "add_profile_fields"):
+            runner.run(next(m for m in migrate.MIGRATIONS if m.name == name))
+        profile = next(m for m in migrate.MIGRATIONS if m.name == "add_profile_fields")
+        assert runner.reset(profile) == 1
+        assert runner.run(profile) == ["add_columns_users"]
+        columns = {column["name"] for column in inspect(legacy_engine).get_columns("users")}
+        assert {"avatar_url", "display_name", "bio"} <= columns
+
+    def test_all_migrations_run_in_order(self, legacy_engine):
+        """测试全部迁移按版本顺序执行，再次运行时不执行任何步骤"""
+        with legacy_engine.begin() as conn:
+            conn.execute(text("ALTER TABLE quick_links ADD COLUMN category VARCHAR(100)"))
+            for column in ("is_active BOOLEAN", "sort_order INTEGER", "is_default BOOLEAN"):
+                conn.execute(text(f"ALTER TABLE search_engines ADD COLUMN {column}"))
+
+        runner = MigrationRunner(legacy_engine, pause=0)
+        for migration in migrate.MIGRATIONS:
+            runner.run(migration)
+
+        inspector = inspect(legacy_engine)
+        assert {"status", "last_checked", "click_count"} <= {c["name"] for c in inspector.get_columns("quick_links")}
+        assert {"shard", "shard_moving"} <= {c["name"] for c in inspector.get_columns("users")}
+        indexes = {index["name"] for table in ("quick_links", "search_engines")
+                   for index in inspector.get_indexes(table)}
+        assert {name for table, name, _ in migrate.COMPOSITE_INDEXES if table != "search_history"} <= indexes
+        assert all(step["done"] for migration in migrate.MIGRATIONS for step in runner.status(migration))
+        assert [runner.run(migration) for migration in migrate.MIGRATIONS] == [[]] * len(migrate.MIGRATIONS)
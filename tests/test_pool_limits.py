@@ -0,0 +1,114 @@
+"""
+连接池统计与线程池准入控制测试
+"""
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc
+
+from app.concurrency import ConcurrencyLimitMiddleware, RequestGate
+from app.config import Config as DatabaseConfig
+from app.instrumentation import InstrumentedQueuePool, PoolRegistry
+
+
+class TestPoolLimits:
+    """连接池与线程池上限测试类"""
+
+    def test_thread_limit_follows_pool(self, monkeypatch):
+        """测试线程上限默认等于连接池容量，显式设置更大时溢出连接随之增长"""
+        monkeypatch.setattr(DatabaseConfig, "DB_BACKEND", "mysql")
+        monkeypatch.setattr(DatabaseConfig, "POOL_SIZE", 5)
+        monkeypatch.setattr(DatabaseConfig, "MAX_OVERFLOW", 3)
+        monkeypatch.setattr(DatabaseConfig, "THREAD_LIMIT", 0)
+        assert DatabaseConfig.get_thread_limit() == 8
+        assert DatabaseConfig.get_max_overflow() == 3
+
+        monkeypatch.setattr(DatabaseConfig, "THREAD_LIMIT", 12)
+        assert DatabaseConfig.get_thread_limit() == 12
+        assert DatabaseConfig.get_max_overflow() == 7
+
+        monkeypatch.setattr(DatabaseConfig, "DB_BACKEND", "sqlite")
+        monkeypatch.setattr(DatabaseConfig, "SQLITE_READER_POOL_SIZE", 4)
+        assert DatabaseConfig.get_thread_limit() == 5
+
+    def test_pool_telemetry(self, tmp_path):
+        """测试连接池记录借出等待、占用和超时"""
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+            pool_size=1, max_overflow=0, pool_timeout=0.05
+        )
+        registry = PoolRegistry()
+        registry.register("test", engine)
+        try:
+            held = engine.connect()
+            [stats] = registry.snapshot()
+            assert stats["checked_out"] == 1
+            assert stats["checkouts"] == 1
+
+            with pytest.raises(exc.TimeoutError):
+                engine.connect()
+            held.close()
+
+            engine.dispose()
+            [stats] = registry.snapshot()
+            assert stats["timeouts"] == 1
+            assert stats["checked_out"] == 0
+            assert stats["wait_max_ms"] >= 0
+        finally:
+            engine.dispose()
+
+    def test_request_gate(self):
+        """测试准入队列有限等待"""
+        async def scenario():
+            gate = RequestGate(limit=1, timeout=0.05)
+            assert await gate.acquire() is True
+            assert await gate.acquire() is False
+            assert gate.stats()["rejected"] == 1
+            gate.release()
+            assert await gate.acquire() is True
+            gate.release()
+            assert gate.stats()["active"] == 0
+
+        asyncio.run(scenario())
+
+    def test_middleware_sheds_sync_routes_only(self):
+        """测试同步路由超出上限时返回 503，异步路由不受影响"""
+        started, release = threading.Event(), threading.Event()
+        app = FastAPI()
+        app.add_middleware(ConcurrencyLimitMiddleware, gate=RequestGate(limit=1, timeout=0.1))
+
+        @app.get("/sync")
+        def sync_endpoint():
+            started.set()
+            release.wait(5)
+            return {"ok": True}
+
+        @app.get("/async")
+        async def async_endpoint():
+            return {"ok": True}
+
+        with TestClient(app) as client:
+            results = []
+            worker = threading.Thread(target=lambda: results.append(client.get("/sync").status_code))
+            worker.start()
+            assert started.wait(5)
+
+            response = client.get("/sync")
+            assert response.status_code == 503
+            assert "retry-after" in response.headers
+            assert client.get("/async").status_code == 200
+
+            release.set()
+            worker.join(5)
+            assert results == [200]
+
+    def test_pool_metrics_endpoint(self, client: TestClient):
+        """测试连接池指标端点"""
+        response = client.get("/api/metrics/pool")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["threadpool"]["total"] == DatabaseConfig.get_thread_limit()
+        assert data["request_gate"]["limit"] == DatabaseConfig.get_thread_limit()
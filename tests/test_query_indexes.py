@@ -0,0 +1,130 @@
+"""
+服务层查询索引使用测试
+通过 EXPLAIN QUERY PLAN 确认每条按用户过滤的查询都按预期的索引查找（SEARCH），而不是扫描
+"""
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.models import User
+from app.services.quick_link_service import QuickLinkService
+from app.services.search_engine_service import SearchEngineService
+from app.services.search_service import SearchService
+from app.services.link_health_service import LinkHealthService
+from tests.conftest import engine
+
+TABLES = ("quick_links", "search_engines", "search_history")
+PRIMARY_KEY = "PRIMARY KEY"
+
+# 只按 user_id 过滤时，任何以 user_id 开头的复合索引都可以
+QUICK_LINK_USER_INDEXES = ("ix_quick_links_user_category", "ix_quick_links_user_clicks")
+SEARCH_ENGINE_USER_INDEXES = ("ix_search_engines_user_name", "ix_search_engines_user_active_sort",
+                              "ix_search_engines_user_default")
+
+
+@contextmanager
+def captured_statements():
+    """记录块内执行的全部SQL语句及参数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _uses(detail: str, index: str) -> bool:
+    if index == PRIMARY_KEY:
+        return "USING INTEGER PRIMARY KEY" in detail or "USING PRIMARY KEY" in detail
+    return re.search(rf"USING (COVERING )?INDEX {index}\b", detail) is not None
+
+
+def assert_uses_index(db_session, statements, indexes, allow_temp_sort=False):
+    """对每条语句执行 EXPLAIN QUERY PLAN，断言按索引查找（SEARCH）且使用的是 indexes 之一
+
+    SCAN ... USING INDEX 是整个索引的扫描，同样视为未命中。
+    单个用户的链接和搜索引擎数量很少，允许对其结果临时排序；
+    需要按索引顺序分页的大表查询应传 allow_temp_sort=False。
+    """
+    checked = 0
+    for statement, parameters in statements:
+        if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            continue
+        plan = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        details = [row[-1] for row in plan]
+        for detail in details:
+            if any(re.search(rf"\b{table}\b", detail) for table in TABLES):
+                assert detail.startswith("SEARCH"), f"查询未按索引查找: {detail}\n{statement}"
+                assert any(_uses(detail, index) for index in indexes), \
+                    f"查询未使用预期的索引 {', '.join(indexes)}: {detail}\n{statement}"
+            if not allow_temp_sort:
+                assert "TEMP B-TREE" not in detail, f"查询需要临时排序: {detail}\n{statement}"
+        checked += 1
+    assert checked > 0
+
+
+def assert_query_uses(db_session, fn, *indexes, allow_temp_sort=False):
+    """执行 fn 并检查它发出的每条语句"""
+    with captured_statements() as statements:
+        fn()
+    assert_uses_index(db_session, statements, indexes, allow_temp_sort=allow_temp_sort)
+
+
+@pytest.fixture
+def user_id(test_db, db_session):
+    """创建测试用户"""
+    user = User(username="explain_user", email="explain@example.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    return user.id
+
+
+class TestQueryIndexes:
+    """查询索引测试类"""
+
+    def test_quick_link_queries(self, db_session, user_id):
+        """测试快速链接查询命中索引"""
+        assert_query_uses(db_session, lambda: QuickLinkService.get_quick_links(db_session, user_id),
+                          *QUICK_LINK_USER_INDEXES, allow_temp_sort=True)
+        assert_query_uses(db_session, lambda: QuickLinkService.get_quick_links(db_session, user_id, category="搜索"),
+                          "ix_quick_links_user_category", allow_temp_sort=True)
+        assert_query_uses(db_session, lambda: QuickLinkService.get_quick_link_by_id(db_session, 1, user_id),
+                          PRIMARY_KEY)
+        assert_query_uses(db_session, lambda: QuickLinkService.get_quick_link_url(db_session, 1), PRIMARY_KEY)
+        assert_query_uses(db_session, lambda: LinkHealthService._fetch_batch(db_session, 0, 100, user_id),
+                          *QUICK_LINK_USER_INDEXES, allow_temp_sort=True)
+
+        # 按点击次数排序应直接沿索引顺序读取
+        assert_query_uses(db_session, lambda: QuickLinkService.get_quick_links(db_session, user_id, sort="usage"),
+                          "ix_quick_links_user_clicks")
+
+    def test_search_engine_queries(self, db_session, user_id):
+        """测试搜索引擎查询命中索引"""
+        assert_query_uses(db_session,
+                          lambda: SearchEngineService.get_search_engines(db_session, user_id, active_only=True),
+                          "ix_search_engines_user_active_sort", allow_temp_sort=True)
+        assert_query_uses(db_session,
+                          lambda: SearchEngineService.get_search_engines(db_session, user_id, active_only=False),
+                          *SEARCH_ENGINE_USER_INDEXES, allow_temp_sort=True)
+        assert_query_uses(db_session, lambda: SearchEngineService.get_search_engine_by_id(db_session, 1, user_id),
+                          PRIMARY_KEY)
+        assert_query_uses(db_session,
+                          lambda: SearchEngineService.get_search_engine_by_name(db_session, "baidu", user_id),
+                          "ix_search_engines_user_name")
+        # 没有默认引擎时回退为第一个启用的引擎
+        assert_query_uses(db_session, lambda: SearchEngineService.get_default_search_engine(db_session, user_id),
+                          "ix_search_engines_user_default", "ix_search_engines_user_active_sort",
+                          allow_temp_sort=True)
+        assert_query_uses(db_session, lambda: SearchEngineService._clear_default_engines(db_session, user_id),
+                          *SEARCH_ENGINE_USER_INDEXES)
+
+    def test_search_history_queries(self, db_session, user_id):
+        """测试搜索历史查询命中索引（包括按时间倒序）"""
+        assert_query_uses(db_session, lambda: SearchService.get_search_history(db_session, user_id, limit=10),
+                          "ix_search_history_user_created")
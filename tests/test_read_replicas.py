@@ -0,0 +1,176 @@
+"""
+只读副本路由测试
+主库和副本使用两个独立的内存数据库，通过数据差异判断查询路由到了哪里
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import QuickLink, User
+from app.replicas import (
+    PRIMARY_COOKIE, READ_ONLY, USER_KEY, ReadYourWritesMiddleware, ReadYourWritesTracker, ReplicaSet,
+    RoutingSession, STRATEGY_LATENCY, reads_from_replica, use_primary
+)
+from app.services.quick_link_service import QuickLinkService
+
+
+def _make_engine(label):
+    """创建内存数据库，并写入一个带标记的用户"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(id=1, username=label, email=f"{label}@example.com", hashed_password="x"))
+    return engine
+
+
+@pytest.fixture
+def primary():
+    engine = _make_engine("primary")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def replica():
+    engine = _make_engine("replica")
+    yield engine
+    engine.dispose()
+
+
+def _session_factory(primary, replicas, tracker=None):
+    return sessionmaker(bind=primary, autoflush=False, class_=RoutingSession,
+                        replicas=replicas, tracker=tracker or ReadYourWritesTracker(window=60))
+
+
+def _current_label(db):
+    return db.get(User, 1).username
+
+
+class TestReplicaRouting:
+    """只读副本路由测试类"""
+
+    def test_read_only_session_uses_replica(self, primary, replica):
+        """测试只读会话读副本，非只读会话读主库"""
+        factory = _session_factory(primary, ReplicaSet([replica]))
+        with factory() as db:
+            db.info[READ_ONLY] = True
+            assert _current_label(db) == "replica"
+            assert reads_from_replica(db)
+        with factory() as db:
+            assert _current_label(db) == "primary"
+            assert not reads_from_replica(db)
+
+    def test_writes_go_to_primary_and_pin_user(self, primary, replica):
+        """测试写入走主库，且写入后该用户的读取在窗口期内固定到主库"""
+        tracker = ReadYourWritesTracker(window=60)
+        factory = _session_factory(primary, ReplicaSet([replica]), tracker)
+
+        with factory() as db:
+            db.info.update({READ_ONLY: True, USER_KEY: "alice"})
+            db.add(QuickLink(name="新链接", url="https://new.example.com", user_id=1))
+            db.commit()
+            assert _current_label(db) == "primary"
+        assert tracker.is_pinned("alice")
+        with primary.connect() as conn:
+            assert conn.execute(QuickLink.__table__.select()).fetchall()
+
+        with factory() as db:
+            db.info.update({READ_ONLY: True, USER_KEY: "alice"})
+            assert [link.name for link in QuickLinkService.get_quick_links(db, 1)] == ["新链接"]
+        with factory() as db:
+            db.info.update({READ_ONLY: True, USER_KEY: "bob"})
+            assert _current_label(db) == "replica"
+
+        tracker.window = 0
+        tracker.mark_write("alice")
+        with factory() as db:
+            db.info.update({READ_ONLY: True, USER_KEY: "alice"})
+            assert _current_label(db) == "replica"
+
+    def test_use_primary(self, primary, replica):
+        """测试临时切换到主库读取"""
+        factory = _session_factory(primary, ReplicaSet([replica]))
+        with factory() as db:
+            db.info[READ_ONLY] = True
+            assert _current_label(db) == "replica"
+            with use_primary(db):
+                db.expire_all()
+                assert _current_label(db) == "primary"
+            assert db.info[READ_ONLY] is True
+
+    def test_fallback_to_primary_on_replica_error(self, primary):
+        """测试副本不可用时回退主库并暂停使用该副本"""
+        broken = create_engine("sqlite:////nonexistent-dir/replica.db")
+        replicas = ReplicaSet([broken], cooldown=60)
+        factory = _session_factory(primary, replicas)
+        with factory() as db:
+            db.info[READ_ONLY] = True
+            assert _current_label(db) == "primary"
+        assert replicas.choose() is None
+
+    def test_selection_strategies(self, replica):
+        """测试轮询与最低延迟选择"""
+        other = _make_engine("other")
+        try:
+            round_robin = ReplicaSet([replica, other])
+            assert [round_robin.choose() for _ in range(4)] == [replica, other, replica, other]
+            round_robin.mark_down(replica)
+            assert [round_robin.choose() for _ in range(2)] == [other, other]
+
+            latency = ReplicaSet([replica, other], strategy=STRATEGY_LATENCY)
+            latency.record_latency(replica, 0.5)
+            latency.record_latency(other, 0.01)
+            assert latency.choose() is other
+        finally:
+            other.dispose()
+
+    def test_failed_query_clears_timing(self, replica):
+        """测试副本语句出错时不残留计时起点"""
+        ReplicaSet([replica])
+        with replica.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert conn.info.get("replica_query_start") == []
+            conn.execute(text("SELECT 1"))
+            assert conn.info["replica_query_start"] == []
+
+    def test_pin_carried_in_cookie(self, primary, replica):
+        """测试写后读主库的窗口通过 Cookie 传到其他工作进程"""
+        from starlette.applications import Starlette
+        from starlette.responses import PlainTextResponse
+        from starlette.routing import Route
+        from starlette.testclient import TestClient
+
+        # 两个工作进程各自有进程内记录
+        writer_tracker = ReadYourWritesTracker(window=60)
+        reader_tracker = ReadYourWritesTracker(window=60)
+        replicas = ReplicaSet([replica])
+
+        def write(request):
+            with _session_factory(primary, replicas, writer_tracker)() as db:
+                db.info[USER_KEY] = "alice"
+                db.add(QuickLink(name="新链接", url="https://new.example.com", user_id=1))
+                db.commit()
+            return PlainTextResponse("ok")
+
+        def read(request):
+            with _session_factory(primary, replicas, reader_tracker)() as db:
+                db.info.update({READ_ONLY: True, USER_KEY: "alice"})
+                return PlainTextResponse(_current_label(db))
+
+        writer = Starlette(routes=[Route("/write", write, methods=["POST"])])
+        writer.add_middleware(ReadYourWritesMiddleware, tracker=writer_tracker)
+        reader = Starlette(routes=[Route("/read", read)])
+        reader.add_middleware(ReadYourWritesMiddleware, tracker=reader_tracker)
+
+        with TestClient(writer) as writer_client, TestClient(reader) as reader_client:
+            assert reader_client.get("/read").text == "replica"
+            response = writer_client.post("/write")
+            assert PRIMARY_COOKIE in response.cookies
+            assert not reader_tracker.is_pinned("alice")
+            cookies = {PRIMARY_COOKIE: response.cookies[PRIMARY_COOKIE]}
+            assert reader_client.get("/read", cookies=cookies).text == "primary"
+            assert reader_client.get("/read", cookies={PRIMARY_COOKIE: "not-a-number"}).text == "replica"
@@ -0,0 +1,115 @@
+"""
+数据库结构版本与就绪检查测试
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.main import app
+from app.models import SchemaVersion
+from app.services.data_init_service import DataInitService
+from app.services.schema_service import SCHEMA_KEY, SchemaService
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+def fresh_database(tmp_path, monkeypatch):
+    """使用临时的空数据库作为应用数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}", connect_args={"check_same_thread": False})
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    yield engine
+    engine.dispose()
+
+
+class SeedCalls(list):
+    """记录默认数据初始化调用结果"""
+    result = True
+
+
+@pytest.fixture
+def seed_calls(monkeypatch):
+    """替换默认数据初始化，只记录调用"""
+    calls = SeedCalls()
+
+    def init_default_data():
+        calls.append(calls.result)
+        return calls.result
+
+    monkeypatch.setattr(DataInitService, "init_default_data", staticmethod(init_default_data))
+    return calls
+
+
+class TestSchemaVersion:
+    """结构版本测试类"""
+
+    def test_fingerprint_tracks_schema(self):
+        """测试结构指纹稳定，且随结构变化"""
+        assert SchemaService.schema_fingerprint() == SchemaService.schema_fingerprint()
+
+        metadata = MetaData()
+        for table in database.Base.metadata.tables.values():
+            table.to_metadata(metadata)
+        assert SchemaService.schema_fingerprint(metadata) == SchemaService.schema_fingerprint()
+
+        Table("extra", metadata, Column("id", Integer, primary_key=True))
+        assert SchemaService.schema_fingerprint(metadata) != SchemaService.schema_fingerprint()
+
+    def test_second_boot_skips_ddl_and_seeding(self, fresh_database, seed_calls):
+        """测试首次启动建表并初始化，之后启动只做一次主键查询"""
+        assert SchemaService.ensure_schema() is True
+        assert seed_calls == [True]
+        db = database.SessionLocal()
+        try:
+            assert db.get(SchemaVersion, SCHEMA_KEY).seed_fingerprint == SchemaService.seed_fingerprint()
+        finally:
+            db.close()
+
+        statements = []
+        event.listen(fresh_database, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        assert SchemaService.ensure_schema() is True
+        assert seed_calls == [True]
+        assert len(statements) == 1
+        assert "schema_version" in statements[0]
+
+    def test_failed_seed_retries_without_ddl(self, fresh_database, seed_calls, monkeypatch):
+        """测试默认数据初始化失败时下次启动只重试初始化，不再建表"""
+        seed_calls.result = False
+        assert SchemaService.ensure_schema() is True
+        db = database.SessionLocal()
+        try:
+            assert SchemaService.is_up_to_date(db) is False
+        finally:
+            db.close()
+
+        create_calls = []
+        monkeypatch.setattr(database, "create_database_tables", lambda: create_calls.append(1) or True)
+        seed_calls.result = True
+        assert SchemaService.ensure_schema() is True
+        assert create_calls == []
+        assert seed_calls == [False, True]
+        db = database.SessionLocal()
+        try:
+            assert SchemaService.is_up_to_date(db) is True
+        finally:
+            db.close()
+
+
+class TestHealthChecks:
+    """存活与就绪检查测试类"""
+
+    def test_liveness_and_readiness(self, client: TestClient, monkeypatch):
+        """测试就绪状态与存活状态分开报告"""
+        assert client.get("/healthz").status_code == 200
+
+        monkeypatch.setattr(app.state, "ready", False)
+        assert client.get("/readyz").status_code == 503
+
+        monkeypatch.setattr(app.state, "ready", True)
+        monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+        response = client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
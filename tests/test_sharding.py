@@ -0,0 +1,274 @@
+"""
+用户分片测试（以多个本地 SQLite 文件作为分片）
+"""
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.database import get_db
+from app.main import app
+from app.models import QuickLink, SearchHistory, User
+from app.replicas import READ_ONLY
+from app.services.shard_service import ShardService
+from app.sharding import PRIMARY_SHARD, HashRing, ShardedSession, ShardIdRangeExceeded, ShardMap
+from tests.conftest import override_get_db
+
+ID_SPACING = 1000
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    """主库加两个附加分片"""
+    engines = {
+        name: create_engine(f"sqlite:///{tmp_path / f'shard{name}.db'}", connect_args={"check_same_thread": False})
+        for name in ("0", "1", "2")
+    }
+    database.Base.metadata.create_all(bind=engines[PRIMARY_SHARD])
+    shard_map = ShardMap(engines, id_spacing=ID_SPACING)
+    shard_map.create_tables(database.Base.metadata)
+    factory = sessionmaker(autoflush=False, expire_on_commit=False, bind=engines[PRIMARY_SHARD],
+                           class_=ShardedSession, shard_map=shard_map)
+    monkeypatch.setattr(database, "engine", engines[PRIMARY_SHARD])
+    monkeypatch.setattr(database, "SessionLocal", factory)
+    monkeypatch.setattr(database, "shard_map", shard_map)
+
+    def get_sharded_db(request: Request):
+        db = factory()
+        db.info[READ_ONLY] = request.method in ("GET", "HEAD")
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_sharded_db
+    yield shard_map
+    app.dependency_overrides[get_db] = override_get_db
+    for engine in engines.values():
+        engine.dispose()
+
+
+def register(client: TestClient, username: str) -> dict:
+    """注册并登录，返回认证请求头"""
+    client.post("/api/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "secret1"
+    })
+    response = client.post("/api/auth/login", json={"username": username, "password": "secret1"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def count(engine, model, user_id: int) -> int:
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(model).where(model.user_id == user_id))
+
+
+def get_user(shard_map: ShardMap, username: str):
+    with shard_map.engine_for(PRIMARY_SHARD).connect() as conn:
+        return conn.execute(select(User.__table__).where(User.username == username)).first()
+
+
+class TestSharding:
+    """用户分片测试类"""
+
+    def test_hash_ring_moves_few_keys(self):
+        """测试增加分片时只有少量用户改变归属，且都移到新分片"""
+        before, after = HashRing(["0", "1", "2"]), HashRing(["0", "1", "2", "3"])
+        moved = [key for key in range(10000) if before.node_for(key) != after.node_for(key)]
+        assert 0 < len(moved) < 4000
+        assert all(after.node_for(key) == "3" for key in moved)
+
+    def test_requests_route_to_user_shard(self, client: TestClient, shards):
+        """测试新用户按哈希分配分片，其数据只写入所在分片，主键落在分片区间内"""
+        headers = register(client, "shard_alice")
+        user = get_user(shards, "shard_alice")
+        assert user.shard == shards.place(user.id)
+        home = shards.engine_for(user.shard)
+
+        links = client.get("/api/quick-links", headers=headers).json()
+        assert len(links) == count(home, QuickLink, user.id) > 0
+
+        client.post("/api/search", json={"query": "q"}, headers=headers)
+        assert count(home, SearchHistory, user.id) == 1
+        for name in shards.names:
+            if name != user.shard:
+                assert count(shards.engine_for(name), QuickLink, user.id) == 0
+
+        link = client.post("/api/quick-links", json={
+            "name": "示例", "url": "https://example.com", "icon": "fas fa-link", "color": "#000000", "category": "工具"
+        }, headers=headers).json()
+        assert shards.shard_for_id(link["id"]) == user.shard
+        response = client.get(f"/go/{link['go_token']}", follow_redirects=False)
+        assert response.status_code == 302
+        assert response.headers["location"] == "https://example.com"
+
+    def test_async_health_check_uses_user_shard(self, shards, monkeypatch):
+        """测试异步路由的健康检查在同步会话上也绑定用户所在分片"""
+        import asyncio
+
+        from app.routers.aio import quick_links as aio_quick_links
+        from app.sharding import SHARD_KEY
+
+        seen = []
+
+        async def check_links(db, user_id):
+            seen.append(db.info.get(SHARD_KEY))
+            return []
+
+        monkeypatch.setattr(aio_quick_links.LinkHealthService, "check_links", check_links)
+        db = database.SessionLocal()
+        try:
+            asyncio.run(aio_quick_links.check_quick_links_health(db, User(id=1, shard="2")))
+        finally:
+            db.close()
+        assert seen == ["2"]
+
+    def test_primary_ids_capped_at_spacing(self, shards):
+        """测试主库分片的主键超过间隔时拒绝写入，不与分片 1 的区间重叠"""
+        db = database.SessionLocal()
+        try:
+            user = User(username="overflow", email="overflow@example.com", hashed_password="x")
+            db.add(user)
+            db.commit()
+            user_id = user.id
+            db.add(QuickLink(id=ID_SPACING - 1, name="last", url="https://a.example.com", user_id=user_id))
+            db.commit()
+            db.add(QuickLink(id=ID_SPACING, name="over", url="https://b.example.com", user_id=user_id))
+            with pytest.raises(ShardIdRangeExceeded):
+                db.commit()
+            db.rollback()
+        finally:
+            db.close()
+        assert count(shards.engine_for(PRIMARY_SHARD), QuickLink, user_id) == 1
+        assert shards.id_ceiling(PRIMARY_SHARD) == ID_SPACING
+
+    def test_click_flush_routes_by_id(self, shards):
+        """测试点击计数按主键区间只刷写到链接所在的分片"""
+        from sqlalchemy import event
+
+        from app.services.click_counter_service import ClickCounter
+        from app.sharding import use_shard
+
+        db = database.SessionLocal()
+        try:
+            ids = {}
+            for name in ("1", "2"):
+                with use_shard(db, name):
+                    link = QuickLink(name=name, url=f"https://{name}.example.com", user_id=1)
+                    db.add(link)
+                    db.commit()
+                    ids[name] = link.id
+            assert [shards.shard_for_id(link_id) for link_id in ids.values()] == ["1", "2"]
+
+            updates = {name: 0 for name in shards.names}
+            listeners = []
+            for name in shards.names:
+                def count_updates(conn, cursor, statement, *args, name=name):
+                    if statement.startswith("UPDATE quick_links"):
+                        updates[name] += 1
+                event.listen(shards.engine_for(name), "before_cursor_execute", count_updates)
+                listeners.append((shards.engine_for(name), count_updates))
+
+            counter = ClickCounter()
+            counter.record(ids["1"])
+            counter.record(ids["1"])
+            counter.record(ids["2"])
+            assert counter.flush(db, shards) == 2
+            for engine, listener in listeners:
+                event.remove(engine, "before_cursor_execute", listener)
+            assert updates == {"0": 0, "1": 1, "2": 1}
+
+            for name, clicks in (("1", 2), ("2", 1)):
+                with shards.engine_for(name).connect() as conn:
+                    assert conn.scalar(select(QuickLink.click_count).where(QuickLink.id == ids[name])) == clicks
+        finally:
+            db.close()
+
+    def test_click_flush_commits_per_shard(self, shards):
+        """测试某个分片刷写失败时只放回该分片的计数，已提交的分片不会重复累加"""
+        from sqlalchemy import event
+
+        from app.services.click_counter_service import ClickCounter
+        from app.sharding import use_shard
+
+        db = database.SessionLocal()
+        try:
+            ids = {}
+            for name in ("1", "2"):
+                with use_shard(db, name):
+                    link = QuickLink(name=name, url=f"https://{name}.example.com", user_id=1)
+                    db.add(link)
+                    db.commit()
+                    ids[name] = link.id
+
+            def fail_updates(conn, cursor, statement, *args):
+                if statement.startswith("UPDATE quick_links"):
+                    raise RuntimeError("shard down")
+
+            failing = shards.engine_for("2")
+            event.listen(failing, "before_cursor_execute", fail_updates)
+            counter = ClickCounter()
+            counter.record(ids["1"])
+            counter.record(ids["2"])
+            try:
+                assert counter.flush(db, shards) == 1
+            finally:
+                event.remove(failing, "before_cursor_execute", fail_updates)
+            assert counter.pending() == {ids["2"]: 1}
+
+            assert counter.flush(db, shards) == 1
+            for name in ("1", "2"):
+                with shards.engine_for(name).connect() as conn:
+                    assert conn.scalar(select(QuickLink.click_count).where(QuickLink.id == ids[name])) == 1
+        finally:
+            db.close()
+
+    def test_move_user_online(self, client: TestClient, shards):
+        """测试迁移用户数据到另一个分片后，请求读写都走新分片"""
+        headers = register(client, "shard_bob")
+        for i in range(5):
+            client.post("/api/search", json={"query": f"q{i}"}, headers=headers)
+        user = get_user(shards, "shard_bob")
+        source = user.shard
+        target = next(name for name in shards.names if name != source)
+        links = count(shards.engine_for(source), QuickLink, user.id)
+
+        result = ShardService.move_user(shards.engine_for(PRIMARY_SHARD), shards, user.id, target,
+                                        batch_size=2, grace=0)
+        assert result["moved"] is True
+
+        moved = get_user(shards, "shard_bob")
+        assert (moved.shard or PRIMARY_SHARD) == target
+        assert moved.shard_moving is False
+        assert count(shards.engine_for(source), QuickLink, user.id) == 0
+        assert count(shards.engine_for(source), SearchHistory, user.id) == 0
+        assert count(shards.engine_for(target), SearchHistory, user.id) == 5
+
+        data = client.get("/api/quick-links", headers=headers).json()
+        assert len(data) == links
+        assert all(shards.shard_for_id(item["id"]) == target for item in data)
+        assert len(client.get("/api/search-history", headers=headers).json()) == 5
+
+    def test_moving_user_rejects_writes(self, client: TestClient, shards):
+        """测试迁移中的用户可以读取，写请求返回 503"""
+        headers = register(client, "shard_carol")
+        user = get_user(shards, "shard_carol")
+        with shards.engine_for(PRIMARY_SHARD).begin() as conn:
+            conn.execute(User.__table__.update().where(User.id == user.id).values(shard_moving=True))
+
+        assert client.get("/api/quick-links", headers=headers).status_code == 200
+        response = client.post("/api/search", json={"query": "q"}, headers=headers)
+        assert response.status_code == 503
+        assert "retry-after" in response.headers
+
+    def test_fan_out_counts_and_export(self, client: TestClient, shards):
+        """测试跨分片统计与导出"""
+        register(client, "shard_dave")
+        register(client, "shard_erin")
+        counts = ShardService.count_rows(shards)
+        assert set(counts) == set(shards.names)
+        total = sum(item["quick_links"] for item in counts.values())
+
+        lines = []
+        assert ShardService.export_table(shards, "quick_links", lines.append) == total == len(lines)
@@ -0,0 +1,78 @@
+"""
+请求合并测试
+"""
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight, flight, flight_stats
+
+
+class TestSingleFlight:
+    """请求合并测试类"""
+
+    def test_concurrent_calls_share_one_result(self):
+        """测试同一键的并发调用只执行一次，不同键互不影响，完成后再次调用会重新执行"""
+        group = SingleFlight("test")
+        calls = []
+
+        async def fetch(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return f"value-{key}"
+
+        async def run():
+            results = await asyncio.gather(*(group.do(key, lambda key=key: fetch(key)) for key in "aaaab"))
+            assert group.in_flight == 0
+            again = await group.do("a", lambda: fetch("a"))
+            return results, again
+
+        results, again = asyncio.run(run())
+        assert results == ["value-a"] * 4 + ["value-b"]
+        assert again == "value-a"
+        assert calls == ["a", "b", "a"]
+        assert group.stats()["calls"] == 3 and group.stats()["coalesced"] == 3
+
+    def test_error_is_shared(self):
+        """测试异常传给全部等待者，只计一次错误"""
+        group = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        async def run():
+            return await asyncio.gather(*(group.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert group.errors == 1 and group.calls == 1
+
+    def test_cancelled_waiter_does_not_cancel_others(self):
+        """测试发起请求的调用方被取消时，共享任务继续执行，其他等待者照常拿到结果"""
+        group = SingleFlight("test")
+
+        async def run():
+            gate = asyncio.Event()
+
+            async def fetch():
+                await gate.wait()
+                return 42
+
+            leader = asyncio.create_task(group.do("k", fetch))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(group.do("k", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            gate.set()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        assert asyncio.run(run()) == 42
+        assert group.calls == 1 and group.coalesced == 1
+
+    def test_named_groups_are_shared(self):
+        """测试同名合并组共用统计，并出现在指标列表中"""
+        assert flight("test-shared") is flight("test-shared")
+        assert any(item["name"] == "test-shared" for item in flight_stats())
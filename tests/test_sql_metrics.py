@@ -0,0 +1,94 @@
+"""
+SQL 请求级统计测试
+"""
+import logging
+
+from fastapi.testclient import TestClient
+
+from app.config import MetricsConfig, SQLMetricsConfig
+from app.instrumentation import RequestQueryStats, SQLMetrics, statement_shape
+from app.services.quick_link_service import QuickLinkService
+from tests.conftest import query_budget
+
+
+class TestSQLMetrics:
+    """SQL统计测试类"""
+
+    def test_statement_shape(self):
+        """测试语句归一化"""
+        assert statement_shape("SELECT *\n  FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (?)"
+        assert statement_shape("SELECT * FROM t WHERE id IN (%s,%s)") == "SELECT * FROM t WHERE id IN (?)"
+
+    def test_n_plus_one_detection(self, caplog):
+        """测试同一请求内重复语句被标记为 N+1"""
+        metrics = SQLMetrics()
+        stats = RequestQueryStats()
+        stats.record("SELECT * FROM users", 0.001, False)
+        for _ in range(SQLMetricsConfig.N_PLUS_ONE_THRESHOLD):
+            stats.record("SELECT * FROM quick_links WHERE id = ?", 0.001, False)
+
+        with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+            metrics.record_request("GET /x", stats)
+        assert "疑似 N+1" in caplog.text
+
+        [route] = metrics.snapshot()
+        assert route["route"] == "GET /x"
+        assert route["queries"] == SQLMetricsConfig.N_PLUS_ONE_THRESHOLD + 1
+        assert route["n_plus_one_requests"] == 1
+
+    def test_slow_query_logs_call_site(self, test_db, db_session, monkeypatch, caplog):
+        """测试慢查询日志包含应用代码调用位置"""
+        monkeypatch.setattr(SQLMetricsConfig, "SLOW_QUERY_MS", 0)
+        with caplog.at_level(logging.WARNING, logger="app.instrumentation"):
+            QuickLinkService.get_quick_links(db_session, 1)
+        assert "慢查询" in caplog.text
+        assert "app/services/quick_link_service.py" in caplog.text
+
+    def test_endpoint_query_budgets(self, client: TestClient, auth_headers):
+        """测试主要端点的查询预算"""
+        with query_budget(2):
+            client.get("/api/quick-links", headers=auth_headers)
+            client.get("/api/search-engines", headers=auth_headers)
+            client.get("/api/search-engines/default", headers=auth_headers)
+            client.get("/api/search-history", headers=auth_headers)
+        with query_budget(1):
+            client.get("/api/auth/me", headers=auth_headers)
+        with query_budget(3):
+            client.post("/api/search", json={"query": "q"}, headers=auth_headers)
+
+    def test_write_endpoint_budgets(self, client: TestClient, auth_headers):
+        """测试写入端点提交后不再查询：认证 1 条，读取目标行 1 条，写入 1 条"""
+        with query_budget(2):
+            link = client.post("/api/quick-links", json={
+                "name": "示例", "url": "https://example.com", "icon": "fas fa-link", "color": "#000000", "category": "工具"
+            }, headers=auth_headers).json()
+        with query_budget(3):
+            client.put(f"/api/quick-links/{link['id']}", json={"name": "示例2"}, headers=auth_headers)
+            client.delete(f"/api/quick-links/{link['id']}", headers=auth_headers)
+            engine = client.post("/api/search-engines", json={
+                "name": "example", "display_name": "示例", "url_template": "https://example.com/?q={query}",
+                "icon": "fas fa-search", "color": "#000000"
+            }, headers=auth_headers).json()
+            client.put(f"/api/search-engines/{engine['id']}", json={"display_name": "示例2"}, headers=auth_headers)
+            client.put("/api/auth/profile", json={"bio": "hello"}, headers=auth_headers)
+
+    def test_metrics_endpoint(self, client: TestClient, auth_headers):
+        """测试指标端点按路由模板汇总"""
+        client.get("/api/quick-links", headers=auth_headers)
+        response = client.get("/api/metrics/sql")
+        assert response.status_code == 200
+        routes = {item["route"]: item for item in response.json()}
+        assert routes["GET /api/quick-links"]["requests"] >= 1
+        assert routes["GET /api/quick-links"]["queries"] >= 2
+
+    def test_metrics_access(self, client: TestClient, monkeypatch):
+        """测试指标接口默认关闭，配置令牌后需要携带令牌访问"""
+        monkeypatch.setattr(MetricsConfig, "ENABLED", False)
+        assert client.get("/api/metrics/sql").status_code == 404
+        assert client.get("/api/metrics/pool").status_code == 404
+
+        monkeypatch.setattr(MetricsConfig, "ENABLED", True)
+        monkeypatch.setattr(MetricsConfig, "TOKEN", "secret")
+        assert client.get("/api/metrics/pool").status_code == 401
+        assert client.get("/api/metrics/pool", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get("/api/metrics/pool", headers={"Authorization": "Bearer secret"}).status_code == 200
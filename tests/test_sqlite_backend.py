@@ -0,0 +1,72 @@
+"""
+嵌入式SQLite后端测试
+"""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import database
+from app.config import Config as DatabaseConfig
+from app.models import User
+from app.replicas import READ_ONLY
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch):
+    """切换到临时目录下的SQLite后端，结束后恢复全局引擎"""
+    monkeypatch.setattr(DatabaseConfig, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(DatabaseConfig, "SQLITE_PATH", str(tmp_path / "data" / "app.db"))
+    monkeypatch.setattr(DatabaseConfig, "SQLITE_READER_POOL_SIZE", 2)
+    for name in ("engine", "SessionLocal", "replica_set"):
+        monkeypatch.setattr(database, name, None)
+
+    assert database.setup_database()
+    assert database.create_database_tables()
+    yield
+    database.engine.dispose()
+    database.replica_set.engines[0].dispose()
+
+
+class TestSQLiteBackend:
+    """SQLite后端测试类"""
+
+    def test_database_url(self, monkeypatch):
+        """测试SQLite模式不再要求MySQL密码"""
+        monkeypatch.setattr(DatabaseConfig, "DB_BACKEND", "sqlite")
+        monkeypatch.setattr(DatabaseConfig, "SQLITE_PATH", "./data/app.db")
+        monkeypatch.setattr(DatabaseConfig, "MYSQL_PASSWORD", "")
+        assert DatabaseConfig.get_database_url() == "sqlite:///./data/app.db"
+        assert DatabaseConfig.get_async_database_url() == "sqlite+aiosqlite:///./data/app.db"
+
+    def test_pragmas(self, sqlite_backend):
+        """测试写连接和读连接的PRAGMA设置"""
+        reader = database.replica_set.engines[0]
+        for engine in (database.engine, reader):
+            with engine.connect() as conn:
+                assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+                assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+                assert conn.execute(text("PRAGMA busy_timeout")).scalar() == DatabaseConfig.SQLITE_BUSY_TIMEOUT
+                assert conn.execute(text("PRAGMA mmap_size")).scalar() == DatabaseConfig.SQLITE_MMAP_SIZE
+
+        assert database.engine.pool.size() == 1
+        with reader.connect() as conn:
+            assert conn.execute(text("PRAGMA query_only")).scalar() == 1
+            with pytest.raises(OperationalError):
+                conn.execute(text("DELETE FROM users"))
+
+    def test_reads_see_committed_writes(self, sqlite_backend):
+        """测试写入经写连接提交后，只读会话立即可见"""
+        db = database.SessionLocal()
+        try:
+            db.add(User(username="sqlite_user", email="sqlite@example.com", hashed_password="x"))
+            db.commit()
+        finally:
+            db.close()
+
+        db = database.SessionLocal()
+        db.info[READ_ONLY] = True
+        try:
+            assert db.query(User).filter(User.username == "sqlite_user").count() == 1
+            assert db.replica_bind is database.replica_set.engines[0]
+        finally:
+            db.close()
@@ -0,0 +1,15 @@
+"""
+启动导入测试
+"""
+import startup_report
+
+
+class TestStartup:
+    """冷启动导入测试类"""
+
+    def test_optional_dependencies_not_imported(self):
+        """测试导入应用时不加载 PIL、webdav3、requests、httpx 等可选重依赖"""
+        imports = startup_report.measure_imports()
+        assert imports["optional_loaded"] == []
+        assert imports["total_ms"] > 0
+        assert any(item["module"] == "app.main" for item in imports["modules"])
@@ -0,0 +1,894 @@
+"""
+壁纸代理测试（上游由 httpx.MockTransport 模拟）
+"""
+import asyncio
+import glob
+import os
+from io import BytesIO
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from app.config import WallpaperConfig
+from app.http_client import SharedHTTPClient, _per_host_transport
+from app.routers import metrics, wallpaper
+from app.routers.wallpaper import UpstreamStreamingResponse, UpstreamTooLarge, ZeroCopyFileResponse
+from app.services.bing_catalog import BingCatalog
+from app.services.image_pipeline import ImagePipeline
+from app.services.wallpaper_cache import WallpaperCache, content_digest
+from app.services.wallpaper_failover import WallpaperFailover
+from app.services.wallpaper_placeholders import PlaceholderStore
+from app.services.wallpaper_prefetch import PrefetchSpec, WallpaperPrefetcher, resolution_bucket
+from app.singleflight import SingleFlight
+
+IMAGE = b"\xff\xd8\xff" + b"x" * 50000
+
+
+def image_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, content=IMAGE, headers={"content-type": "image/jpeg"})
+
+
+class ChunkedUpstream:
+    """不带 Content-Length、逐块返回的上游，记录读取的块数"""
+
+    def __init__(self, chunks: int, chunk: bytes = b"x" * 1024):
+        self.chunks = chunks
+        self.chunk = chunk
+        self.read = 0
+
+    async def body(self):
+        for _ in range(self.chunks):
+            self.read += 1
+            yield self.chunk
+            await asyncio.sleep(0)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=self.body(), headers={"content-type": "image/jpeg"})
+
+
+class BingArchive:
+    """模拟 HPImageArchive：按 idx、n 返回从 today 往前的若干天，其余地址返回图片"""
+
+    def __init__(self, today: date, days: int):
+        self.today = today
+        self.days = days
+        self.archive_requests = 0
+        self.image_requests = 0
+
+    def image(self, i: int) -> dict:
+        day = self.today - timedelta(days=i)
+        return {"startdate": day.strftime("%Y%m%d"), "enddate": (day + timedelta(days=1)).strftime("%Y%m%d"),
+                "url": f"/th?id=OHR.Day{day:%m%d}_1920x1080.jpg", "title": f"title {day:%m%d}",
+                "copyright": "(c) test"}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/HPImageArchive.aspx":
+            self.image_requests += 1
+            return image_handler(request)
+        self.archive_requests += 1
+        idx, n = int(request.url.params["idx"]), int(request.url.params["n"])
+        return httpx.Response(200, json={"images": [self.image(i) for i in range(idx, min(idx + n, self.days))]})
+
+
+def beijing(day: date, hour: int) -> float:
+    return datetime(day.year, day.month, day.day, hour, tzinfo=timezone(timedelta(hours=8))).timestamp()
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    """用模拟上游替换共享客户端（默认不使用缓存和预取，每次请求都访问上游）"""
+    shared = SharedHTTPClient(transport=httpx.MockTransport(image_handler))
+    monkeypatch.setattr(wallpaper, "http_client", shared)
+    monkeypatch.setattr(metrics, "http_client", shared)
+    monkeypatch.setattr(wallpaper, "wallpaper_cache", WallpaperCache(enabled=False))
+    monkeypatch.setattr(wallpaper, "wallpaper_prefetcher", WallpaperPrefetcher(enabled=False))
+    monkeypatch.setattr(wallpaper, "bing_catalog", BingCatalog(path=str(tmp_path / "bing.json")))
+    monkeypatch.setattr(wallpaper, "image_pipeline", ImagePipeline(enabled=False))
+    monkeypatch.setattr(wallpaper, "wallpaper_placeholders", PlaceholderStore(enabled=False))
+    failover = WallpaperFailover(fallback_order=("picsum", "bing", "unsplash"), hedge_default_delay=5)
+    monkeypatch.setattr(wallpaper, "source_failover", failover)
+    monkeypatch.setattr(metrics, "source_failover", failover)
+    return shared
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """启用缩放转码（在线程池中执行）"""
+    image_pipeline = ImagePipeline(enabled=True, workers=0)
+    monkeypatch.setattr(wallpaper, "image_pipeline", image_pipeline)
+    monkeypatch.setattr(metrics, "image_pipeline", image_pipeline)
+    return image_pipeline
+
+
+@pytest.fixture
+def placeholders(monkeypatch, tmp_path):
+    """启用占位图（在线程池中生成），文件放在临时目录"""
+    store = PlaceholderStore(enabled=True, directory=str(tmp_path / "placeholders"),
+                             pipeline=ImagePipeline(enabled=True, workers=0))
+    monkeypatch.setattr(wallpaper, "wallpaper_placeholders", store)
+    monkeypatch.setattr(metrics, "wallpaper_placeholders", store)
+    return store
+
+
+def jpeg(width: int, height: int) -> bytes:
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new("RGB", (width, height), (40, 120, 200)).save(output, format="JPEG", quality=95)
+    return output.getvalue()
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """启用两级缓存，磁盘目录放在临时目录"""
+    wallpaper_cache = WallpaperCache(memory_bytes=1024 * 1024, disk_bytes=1024 * 1024,
+                                     directory=str(tmp_path / "cache"), ttl=3600, enabled=True)
+    monkeypatch.setattr(wallpaper, "wallpaper_cache", wallpaper_cache)
+    monkeypatch.setattr(metrics, "wallpaper_cache", wallpaper_cache)
+    return wallpaper_cache
+
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    """启用预取，每个池子初始目标为 2 张"""
+    wallpaper_prefetcher = WallpaperPrefetcher(enabled=True, min_size=1, max_size=8, initial_size=2,
+                                               max_bytes=1024 * 1024, idle_ttl=1800, concurrency=2)
+    monkeypatch.setattr(wallpaper, "wallpaper_prefetcher", wallpaper_prefetcher)
+    monkeypatch.setattr(metrics, "wallpaper_prefetcher", wallpaper_prefetcher)
+    return wallpaper_prefetcher
+
+
+def host_requests(shared: SharedHTTPClient, host: str) -> int:
+    return next((item["total_requests"] for item in shared.stats()["hosts"] if item["host"] == host), 0)
+
+
+class TestWallpaper:
+    """壁纸代理测试类"""
+
+    def test_requests_share_one_client(self, client: TestClient, upstream):
+        """测试多次请求复用同一个客户端，连接池统计按主机给出请求数"""
+        assert client.get("/api/metrics/http").json()["started"] is False
+        for _ in range(3):
+            response = client.get("/api/wallpaper/random?source=picsum&width=800&height=600")
+            assert response.status_code == 200
+            assert response.content == IMAGE
+        assert upstream.clients_created == 1
+
+        stats = client.get("/api/metrics/http").json()
+        assert stats["started"] is True
+        host = next(item for item in stats["hosts"] if item["host"] == "picsum.photos")
+        assert host["total_requests"] == 3
+        assert host["active_requests"] == 0
+
+    def test_stream_passes_content_length(self, client: TestClient, upstream, monkeypatch):
+        """测试透传 Content-Length，转发完成后上游连接归还"""
+        response = client.get("/api/wallpaper/random?source=picsum")
+        assert response.headers["content-length"] == str(len(IMAGE))
+        assert response.content == IMAGE
+        host = upstream.stats()["hosts"][0]
+        assert host["active_requests"] == 0
+
+    def test_max_bytes_guard(self, client: TestClient, upstream, monkeypatch):
+        """测试 Content-Length 超限直接返回 502，无长度的上游读到上限即中止并关闭"""
+        monkeypatch.setattr(WallpaperConfig, "MAX_IMAGE_BYTES", 10000)
+        monkeypatch.setattr(WallpaperConfig, "STREAM_CHUNK_SIZE", 1024)
+        response = client.get("/api/wallpaper/random?source=picsum")
+        assert response.status_code == 502
+        assert upstream.stats()["hosts"][0]["active_requests"] == 0
+
+        chunked = ChunkedUpstream(chunks=100)
+        upstream.inner_transport = httpx.MockTransport(chunked.handler)
+        upstream._client = None
+        with pytest.raises(UpstreamTooLarge):
+            client.get("/api/wallpaper/random?source=picsum")
+        assert chunked.read <= 11
+        assert upstream.stats()["hosts"][0]["active_requests"] == 0
+
+    def test_malformed_content_length(self, client: TestClient, upstream):
+        """测试上游 Content-Length 格式不对时按长度未知转发，不返回 500，上游连接归还"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            response = httpx.Response(200, content=IMAGE, headers={"content-type": "image/jpeg"})
+            response.headers["content-length"] = "12abc"
+            return response
+
+        upstream.inner_transport = httpx.MockTransport(handler)
+        response = client.get("/api/wallpaper/random?source=picsum")
+        assert response.status_code == 200
+        assert response.content == IMAGE
+        assert response.headers.get("content-length") != "12abc"
+        assert upstream.stats()["hosts"][0]["active_requests"] == 0
+
+    def test_client_disconnect_closes_upstream(self):
+        """测试客户端中途断开时停止读取并关闭上游响应"""
+        chunked = ChunkedUpstream(chunks=10000)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(chunked.handler)) as http:
+                upstream = await http.send(http.build_request("GET", "https://img.example/a.jpg"), stream=True)
+                response = UpstreamStreamingResponse(upstream, max_bytes=10 ** 9, chunk_size=1024)
+                disconnected = asyncio.Event()
+                sent = []
+
+                async def receive():
+                    await disconnected.wait()
+                    return {"type": "http.disconnect"}
+
+                async def send(message):
+                    sent.append(message)
+                    if len(sent) == 4:
+                        disconnected.set()
+                    await asyncio.sleep(0)
+
+                await response({"type": "http"}, receive, send)
+                return upstream, sent
+
+        upstream, sent = asyncio.run(run())
+        assert upstream.is_closed
+        assert chunked.read < 100
+        # 每块转发一次，内存中最多只有一块
+        assert all(len(message.get("body", b"")) <= 1024 for message in sent)
+        assert not any(message.get("more_body") is False for message in sent)
+
+    def test_cache_memory_then_disk(self, client: TestClient, upstream, cache):
+        """测试同一组参数只访问一次上游，之后命中内存；内存被清空后命中磁盘并读回内存"""
+        url = "/api/wallpaper/random?source=picsum&width=800&height=600"
+        first = client.get(url)
+        assert first.headers["x-cache"] == "MISS"
+        second = client.get(url)
+        assert second.headers["x-cache"] == "HIT-MEMORY"
+        assert second.content == IMAGE
+        assert host_requests(upstream, "picsum.photos") == 1
+
+        # 其他参数不共用缓存
+        assert client.get(url + "&blur=2").headers["x-cache"] == "MISS"
+
+        # 800x600 归入 1280x720 档位
+        cache.memory.pop("picsum:1280x720:-:-")
+        third = client.get(url)
+        assert third.headers["x-cache"] == "HIT-DISK"
+        assert third.content == IMAGE
+        assert client.get(url).headers["x-cache"] == "HIT-MEMORY"
+        assert host_requests(upstream, "picsum.photos") == 2
+
+        stats = client.get("/api/metrics/wallpaper-cache").json()
+        assert stats["memory_hits"] == 2 and stats["disk_hits"] == 1 and stats["misses"] == 2
+        assert stats["hit_ratio"] == 0.6
+
+    def test_prefetch_serves_ready_image(self, client: TestClient, upstream, prefetcher):
+        """测试首个请求走上游并触发预取，之后的请求直接取预取好的图片，取走后在后台补充"""
+        url = "/api/wallpaper/random?source=picsum&width=1700&height=1000"
+        first = client.get(url)
+        assert first.headers["x-cache"] == "MISS"
+        client.portal.call(prefetcher.wait_idle)
+        # 1700x1000 归入 1920x1080 档位，预取时按档位尺寸请求
+        assert prefetcher.stats()["pools"][0]["key"] == "picsum:1920x1080:-:-"
+        assert prefetcher.stats()["pools"][0]["ready"] == 2
+
+        second = client.get("/api/wallpaper/random?source=picsum&width=1920&height=1080")
+        assert second.headers["x-cache"] == "PREFETCHED"
+        assert second.content == IMAGE
+        client.portal.call(prefetcher.wait_idle)
+
+        stats = client.get("/api/metrics/wallpaper-prefetch").json()
+        pool = stats["pools"][0]
+        assert pool["served"] == 1 and pool["misses"] == 1
+        assert pool["ready"] == pool["target"]
+        assert stats["served_ratio"] == 0.5
+        # 上游请求数：首个请求 1 次，预取 2 次，补充 target - 1 次
+        assert host_requests(upstream, "picsum.photos") == 1 + 2 + pool["target"] - 1
+
+    def test_prefetch_target_follows_demand(self):
+        """测试目标数随请求速率和下载耗时调整，长时间无请求的池子被清空"""
+        now = [0.0]
+        spec = PrefetchSpec("picsum", *resolution_bucket(800, 600))
+        assert spec.width == 1280 and spec.height == 720
+
+        async def fetch():
+            now[0] += 0.5  # 每次下载耗时 0.5 秒
+            return b"img", "image/jpeg"
+
+        async def run():
+            prefetcher = WallpaperPrefetcher(enabled=True, min_size=1, max_size=8, initial_size=2,
+                                             max_bytes=1024, idle_ttl=60, concurrency=1, clock=lambda: now[0])
+            assert prefetcher.take(spec, fetch) is None
+            await prefetcher.wait_idle()
+            # 每 0.1 秒一个请求：下载期间约到达 5 个请求，目标为 5 * 2，受上限约束为 8
+            # （每个请求的时刻单独设定，不计入模拟的下载耗时）
+            for i in range(1, 11):
+                now[0] = 0.1 * i
+                prefetcher.take(spec, fetch)
+                await prefetcher.wait_idle()
+            busy = prefetcher.stats()["pools"][0]
+            # 每 30 秒一个请求：目标回落到下限
+            for i in range(1, 11):
+                now[0] = 1 + 30 * i
+                prefetcher.take(spec, fetch)
+                await prefetcher.wait_idle()
+            quiet = prefetcher.stats()["pools"][0]
+            now[0] = 1 + 30 * 10 + 61
+            prefetcher.take(PrefetchSpec("bing", 1920, 1080), fetch)
+            await prefetcher.close()
+            return busy, quiet, prefetcher.stats()
+
+        busy, quiet, final = asyncio.run(run())
+        assert busy["target"] == 8 and busy["ready"] == 8
+        assert quiet["target"] == 1
+        assert final["pools"] == []
+
+    def test_prefetch_respects_byte_cap_and_errors(self):
+        """测试总大小达到上限时停止补充，下载失败不影响请求"""
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            return b"x" * 600, "image/jpeg"
+
+        async def failing():
+            raise RuntimeError("upstream down")
+
+        async def run():
+            prefetcher = WallpaperPrefetcher(enabled=True, min_size=4, max_size=8, initial_size=4,
+                                             max_bytes=1000, idle_ttl=60, concurrency=1)
+            assert prefetcher.take(PrefetchSpec("unsplash", 1920, 1080), failing) is None
+            await prefetcher.wait_idle()
+            prefetcher.take(PrefetchSpec("picsum", 1920, 1080), fetch)
+            await prefetcher.wait_idle()
+            return prefetcher.stats()
+
+        stats = asyncio.run(run())
+        assert len(calls) == 2 and stats["bytes"] == 1200
+        assert next(pool for pool in stats["pools"] if pool["key"].startswith("unsplash"))["errors"] == 1
+
+    def test_bing_catalog_batches_and_persists(self, tmp_path):
+        """测试按 n=8 分批填满目录并保存到文件；重启后直接读文件，换图后只请求一批"""
+        today = date(2026, 10, 19)
+        archive = BingArchive(today, days=40)
+        now = [beijing(today, 10)]
+        path = str(tmp_path / "bing.json")
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(archive.handler)) as http:
+                catalog = BingCatalog(path=path, days=30, utc_offset=8, clock=lambda: now[0])
+                images = await catalog.ensure(http)
+                assert len(images) == 30 and archive.archive_requests == 4
+                assert images[0].date == "20261019" and images[-1].date == "20260920"
+
+                reloaded = BingCatalog(path=path, days=30, utc_offset=8, clock=lambda: now[0])
+                assert (await reloaded.days_ago(http, 3)).date == "20261016"
+                assert archive.archive_requests == 4
+
+                # 北京时间零点换图之后才刷新，新的一天只需一批
+                now[0] = beijing(today + timedelta(days=1), 0) + 60
+                archive.today = today + timedelta(days=1)
+                latest = await reloaded.latest(http)
+                assert latest.date == "20261020"
+                assert archive.archive_requests == 5
+                assert len(reloaded.images()) == 30
+                await reloaded.latest(http)
+                assert archive.archive_requests == 5
+
+        asyncio.run(run())
+
+    def test_bing_endpoints_use_catalog(self, client: TestClient, upstream, cache, monkeypatch):
+        """测试每日、历史和随机必应壁纸都从目录读取，随机图片按日期缓存"""
+        archive = BingArchive(date.today(), days=3)
+        upstream.inner_transport = httpx.MockTransport(archive.handler)
+        monkeypatch.setattr("app.services.bing_catalog.random.choice", lambda images: images[-1])
+
+        daily = client.get("/api/wallpaper/bing/daily").json()
+        assert daily["date"] == archive.image(0)["startdate"]
+        assert daily["url"].startswith("https://www.bing.com/th?id=OHR.")
+        history = client.get("/api/wallpaper/bing/history?days_ago=2").json()
+        assert history["date"] == archive.image(2)["startdate"]
+        assert client.get("/api/wallpaper/bing/history?days_ago=5").status_code == 404
+
+        first = client.get("/api/wallpaper/random?source=bing&width=1366&height=768")
+        second = client.get("/api/wallpaper/random?source=bing&width=1920&height=1080")
+        assert first.content == second.content == IMAGE
+        assert first.headers["x-cache"] == "MISS"
+        assert second.headers["x-cache"] == "HIT-MEMORY"
+        assert archive.archive_requests == 1 and archive.image_requests == 1
+
+    def test_resolution_buckets(self):
+        """测试横屏向上取档位，竖屏按互换后的档位，超大尺寸归入最大档位"""
+        assert resolution_bucket(1536, 864) == (1920, 1080)
+        assert resolution_bucket(390, 844) == (540, 960)
+        assert resolution_bucket(800, 1280) == (1080, 1920)
+        assert resolution_bucket(5120, 2880) == (3840, 2160)
+        assert resolution_bucket(9999, 4000) == (3840, 2160)
+        assert resolution_bucket(2000, 9000) == (2160, 3840)
+
+    def test_invalid_options_share_pool_and_cache_key(self, client: TestClient, upstream, cache, prefetcher):
+        """测试上游会忽略的分类和模糊程度不产生新的预取池和缓存键"""
+        for query in ("source=unsplash&category=xyz", "source=unsplash&category=abc&blur=3",
+                      "source=unsplash", "source=picsum&blur=99&category=nature", "source=picsum&blur=0",
+                      "source=picsum"):
+            assert client.get(f"/api/wallpaper/random?width=1280&height=720&{query}").status_code == 200
+        client.portal.call(prefetcher.wait_idle)
+        pools = {(pool.spec.source, pool.spec.category, pool.spec.blur) for pool in prefetcher._pools.values()}
+        assert pools == {("unsplash", None, None), ("picsum", None, None)}
+
+        client.get("/api/wallpaper/random?width=1280&height=720&source=unsplash&category=landscape")
+        client.get("/api/wallpaper/random?width=1280&height=720&source=picsum&blur=3")
+        client.portal.call(prefetcher.wait_idle)
+        pools = {(pool.spec.source, pool.spec.category, pool.spec.blur) for pool in prefetcher._pools.values()}
+        assert ("unsplash", "landscape", None) in pools and ("picsum", None, 3) in pools
+
+    def test_pipeline_transcodes_and_caches_variants(self, client: TestClient, upstream, cache, pipeline):
+        """测试按 Accept 头转码为 WebP 并缩小到档位尺寸，变体按格式分别缓存"""
+        from PIL import Image
+
+        original = jpeg(2000, 1125)
+        upstream.inner_transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=original, headers={"content-type": "image/jpeg"}))
+        url = "/api/wallpaper/random?source=picsum&width=1500.4&height=900"
+
+        webp = client.get(url, headers={"Accept": "image/webp,image/*"})
+        assert webp.headers["content-type"] == "image/webp"
+        assert webp.headers["vary"] == "Accept"
+        with Image.open(BytesIO(webp.content)) as img:
+            assert img.format == "WEBP" and img.size == (1920, 1080)
+        assert len(webp.content) < len(original)
+
+        assert client.get(url, headers={"Accept": "image/webp"}).headers["x-cache"] == "HIT-MEMORY"
+        legacy = client.get(url, headers={"Accept": "image/*"})
+        assert legacy.headers["x-cache"] == "MISS"
+        assert legacy.headers["content-type"] == "image/jpeg"
+        assert host_requests(upstream, "picsum.photos") == 2
+
+        stats = client.get("/api/metrics/wallpaper-pipeline").json()
+        assert stats["rendered"] == 2 and stats["failures"] == 0
+
+    def test_pipeline_crops_portrait_from_bing_original(self, client: TestClient, upstream, cache, pipeline):
+        """测试必应原图只下载一次，手机竖屏得到按宽高比裁剪、不放大的图片"""
+        from PIL import Image
+
+        archive = BingArchive(date.today(), days=1)
+        original = jpeg(1920, 1080)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == "/HPImageArchive.aspx":
+                return archive.handler(request)
+            archive.image_requests += 1
+            return httpx.Response(200, content=original, headers={"content-type": "image/jpeg"})
+
+        upstream.inner_transport = httpx.MockTransport(handler)
+        phone = client.get("/api/wallpaper/random?source=bing&width=390&height=844",
+                           headers={"Accept": "image/webp"})
+        with Image.open(BytesIO(phone.content)) as img:
+            # 540x960 档位：从 1920x1080 居中裁出 9:16 的 608x1080，再缩小到 540x960
+            assert img.size == (540, 960)
+        desktop = client.get("/api/wallpaper/random?source=bing&width=1920&height=1080",
+                             headers={"Accept": "image/webp"})
+        with Image.open(BytesIO(desktop.content)) as img:
+            assert img.size == (1920, 1080)
+        assert archive.image_requests == 1
+
+    def test_concurrent_misses_fetch_once(self, client: TestClient, upstream, cache, pipeline, monkeypatch):
+        """测试同一键的并发未命中只访问一次上游，全部请求拿到相同的图片"""
+        monkeypatch.setattr(wallpaper, "wallpaper_flight", SingleFlight("wallpaper-test"))
+        original = jpeg(1920, 1080)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.02)
+            return httpx.Response(200, content=original, headers={"content-type": "image/jpeg"})
+
+        upstream.inner_transport = httpx.MockTransport(handler)
+
+        async def burst():
+            return await asyncio.gather(*(
+                wallpaper.get_random_wallpaper(Request({"type": "http", "headers": []}), source="unsplash",
+                                               width=1920, height=1080, category="nature", blur=None,
+                                               accept="image/webp")
+                for _ in range(5)))
+
+        responses = client.portal.call(burst)
+        assert len({response.body for response in responses}) == 1
+        assert host_requests(upstream, "source.unsplash.com") == 1
+        assert wallpaper.wallpaper_flight.stats()["coalesced"] == 4
+
+    def test_failover_and_circuit_breaker(self, client: TestClient, upstream):
+        """测试请求的源失败时改用后备源并在响应头中标明，连续失败后熔断、不再访问该源"""
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "source.unsplash.com":
+                return httpx.Response(503)
+            return image_handler(request)
+
+        upstream.inner_transport = httpx.MockTransport(handler)
+        for _ in range(5):
+            response = client.get("/api/wallpaper/random?source=unsplash")
+            assert response.status_code == 200
+            assert response.headers["x-wallpaper-source"] == "picsum"
+        assert host_requests(upstream, "source.unsplash.com") == 3
+
+        stats = client.get("/api/metrics/wallpaper-sources").json()
+        unsplash = next(item for item in stats["sources"] if item["source"] == "unsplash")
+        assert unsplash["state"] == "open" and unsplash["opens"] == 1
+        assert stats["fallbacks"] == 5
+        assert client.get("/api/wallpaper/random?source=picsum").headers["x-wallpaper-source"] == "picsum"
+
+    def test_hedged_request_beats_slow_source(self, client: TestClient, upstream, monkeypatch):
+        """测试首个源超过对冲等待时间仍未响应时向后备源发起对冲请求，先返回的胜出，慢请求被取消"""
+        failover = WallpaperFailover(fallback_order=("picsum",), hedge_default_delay=0.05, failure_threshold=2)
+        monkeypatch.setattr(wallpaper, "source_failover", failover)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.host == "source.unsplash.com":
+                await asyncio.sleep(5)
+            return image_handler(request)
+
+        upstream.inner_transport = httpx.MockTransport(handler)
+        response = client.get("/api/wallpaper/random?source=unsplash")
+        assert response.headers["x-wallpaper-source"] == "picsum"
+        assert response.content == IMAGE
+        assert failover.hedges == 1
+        assert next(item for item in upstream.stats()["hosts"]
+                    if item["host"] == "source.unsplash.com")["active_requests"] == 0
+        # 两次被对冲超过后，慢源被熔断，之后直接使用后备源
+        client.get("/api/wallpaper/random?source=unsplash")
+        assert failover.health("unsplash").state == "open"
+        client.get("/api/wallpaper/random?source=unsplash")
+        assert failover.hedges == 2
+
+    def test_breaker_half_open_probe(self):
+        """测试熔断时间过后只放行一个探测请求，成功后恢复，失败则重新熔断"""
+        now = [0.0]
+        failover = WallpaperFailover(fallback_order=(), failure_threshold=2, open_seconds=30,
+                                     hedge_min_delay=0.1, hedge_max_delay=2, clock=lambda: now[0])
+        for _ in range(2):
+            failover.record_failure("picsum")
+        assert failover.candidates("picsum") == []
+        now[0] = 31
+        assert failover.candidates("picsum") == ["picsum"]
+        failover.health("picsum").probing = True
+        assert failover.candidates("picsum") == []
+        failover.record_failure("picsum")
+        assert failover.health("picsum").state == "open"
+        now[0] = 62
+        assert failover.available("picsum")
+        failover.record_success("picsum", 0.4)
+        assert failover.health("picsum").state == "closed"
+        # 对冲等待时间取 p95 并受上下限约束
+        for seconds in [0.3] * 18 + [5, 5]:
+            failover.record_success("picsum", seconds)
+        assert failover.hedge_delay("picsum") == 2
+
+    def test_cancelled_probe_releases_half_open(self):
+        """测试半开状态的探测请求被取消（对冲落败或客户端断开）后，该源仍可再次探测"""
+        now = [0.0]
+        failover = WallpaperFailover(fallback_order=("b",), failure_threshold=2, open_seconds=30,
+                                     hedge_min_delay=0, hedge_max_delay=10, hedge_default_delay=0,
+                                     clock=lambda: now[0])
+        failover.record_success("b", 1.0)
+        for _ in range(2):
+            failover.record_failure("b")
+        now[0] = 31
+
+        async def hedged():
+            probe_started = asyncio.Event()
+
+            async def attempt(name):
+                if name == "b":
+                    probe_started.set()
+                    await asyncio.sleep(3600)
+                await probe_started.wait()
+                return name
+
+            return await failover.run("a", attempt)
+
+        assert asyncio.run(hedged()) == ("a", "a")
+        assert failover.health("b").state == "half_open"
+        assert failover.candidates("a") == ["a", "b"]
+
+        async def disconnected():
+            task = asyncio.ensure_future(failover.run("b", lambda name: asyncio.sleep(3600), fallback=False))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(disconnected())
+        assert failover.available("b")
+
+    def test_concurrent_runs_send_one_probe(self):
+        """测试并发的对冲请求只有一个会选中半开的源，探测名额在选择候选源时即被占用"""
+        now = [0.0]
+        failover = WallpaperFailover(fallback_order=("b",), failure_threshold=2, open_seconds=30,
+                                     hedge_min_delay=0, hedge_max_delay=10, hedge_default_delay=0,
+                                     clock=lambda: now[0])
+        failover.record_success("b", 1.0)
+        for _ in range(2):
+            failover.record_failure("b")
+        now[0] = 31
+
+        queued, probes = failover.claim_candidates("a")
+        assert (queued, probes) == (["a", "b"], ["b"])
+        assert failover.claim_candidates("a") == (["a"], [])
+        failover.release_probe("b")
+
+        attempts = []
+
+        async def concurrent():
+            release = asyncio.Event()
+
+            async def attempt(name):
+                attempts.append(name)
+                if name == "b":
+                    await asyncio.sleep(3600)
+                await release.wait()
+                return name
+
+            runs = [asyncio.ensure_future(failover.run("a", attempt)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.gather(*runs)
+
+        assert asyncio.run(concurrent()) == [("a", "a"), ("a", "a")]
+        assert attempts.count("b") == 1
+        # 探测请求被取消后名额释放
+        assert failover.candidates("a") == ["a", "b"]
+
+    def test_pipeline_process_pool_and_fallback(self):
+        """测试进程池转码，无法解码的原图返回 None 由调用方回退"""
+        image_pipeline = ImagePipeline(enabled=True, workers=1)
+
+        async def run():
+            try:
+                rendered = await image_pipeline.render(jpeg(1280, 720), 960, 540, "webp")
+                broken = await image_pipeline.render(b"not an image", 960, 540, "webp")
+            finally:
+                image_pipeline.close()
+            return rendered, broken
+
+        rendered, broken = asyncio.run(run())
+        assert rendered[1] == "image/webp" and rendered[0][:4] == b"RIFF"
+        assert broken is None
+        assert image_pipeline.stats()["failures"] == 1
+        assert image_pipeline.negotiate("image/avif,image/webp") in ("avif", "webp")
+        assert image_pipeline.negotiate("text/html") == "jpeg"
+
+    def test_conditional_and_range_on_cached_image(self, client: TestClient, upstream, cache):
+        """测试缓存命中带 ETag 和不变地址，重新验证返回 304，Range 返回 206，不变地址永久缓存"""
+        url = "/api/wallpaper/random?source=picsum&width=800&height=600"
+        client.get(url)
+        hit = client.get(url)
+        etag = hit.headers["etag"]
+        location = hit.headers["content-location"]
+        assert hit.headers["accept-ranges"] == "bytes" and "last-modified" in hit.headers
+
+        revalidated = client.get(url, headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304 and revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+        since = client.get(url, headers={"If-Modified-Since": hit.headers["last-modified"]})
+        assert since.status_code == 304
+
+        partial = client.get(url, headers={"Range": "bytes=0-99"})
+        assert partial.status_code == 206
+        assert partial.headers["content-range"] == f"bytes 0-99/{len(IMAGE)}"
+        assert partial.content == IMAGE[:100]
+        assert client.get(url, headers={"Range": "bytes=-10"}).content == IMAGE[-10:]
+        assert client.get(url, headers={"Range": f"bytes={len(IMAGE)}-"}).status_code == 416
+        # If-Range 不一致时返回完整内容
+        assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'}).status_code == 200
+
+        immutable = client.get(location)
+        assert immutable.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert immutable.headers["etag"] == etag and immutable.content == IMAGE
+        assert client.get(location, headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/api/wallpaper/cached/" + "0" * 64).status_code == 404
+        assert client.get("/api/wallpaper/cached/not-a-digest").status_code == 400
+
+    def test_placeholder_computed_once_at_ingest(self, client: TestClient, upstream, cache, placeholders):
+        """测试图片写入缓存时生成一次占位图，之后通过响应头和元数据接口返回"""
+        import base64
+        from PIL import Image
+
+        upstream.inner_transport = httpx.MockTransport(
+            lambda request: httpx.Response(200, content=jpeg(1280, 720), headers={"content-type": "image/jpeg"}))
+        url = "/api/wallpaper/random?source=picsum&width=1280&height=720"
+        assert "x-wallpaper-placeholder" not in client.get(url).headers
+        client.portal.call(placeholders.drain)
+
+        hit = client.get(url)
+        placeholder = hit.headers["x-wallpaper-placeholder"]
+        assert placeholder.startswith("data:image/webp;base64,")
+        with Image.open(BytesIO(base64.b64decode(placeholder.split(",", 1)[1]))) as img:
+            assert img.format == "WEBP" and img.size == (32, 18)
+
+        digest = hit.headers["content-location"].rsplit("/", 1)[1]
+        assert client.get(hit.headers["content-location"]).headers["x-wallpaper-placeholder"] == placeholder
+        meta = client.get(f"/api/wallpaper/meta/{digest}").json()
+        assert meta["placeholder"] == placeholder and meta["content_type"] == "image/jpeg"
+        assert client.get(url).headers["x-wallpaper-placeholder"] == placeholder
+        assert client.get("/api/metrics/wallpaper-placeholders").json()["computed"] == 1
+
+        # 内存中淘汰后从磁盘读取，不重新生成
+        placeholders._entries.clear()
+        assert client.get(f"/api/wallpaper/meta/{digest}").json()["placeholder"] == placeholder
+        assert placeholders.computed == 1
+        assert client.get("/api/wallpaper/meta/" + "0" * 64).status_code == 404
+
+    def test_range_on_disk_object(self, client: TestClient, upstream, cache):
+        """测试磁盘上的缓存对象按区间读取文件"""
+        client.get("/api/wallpaper/random?source=picsum&width=800&height=600")
+        client.portal.call(cache.drain)
+        cache.memory.pop("picsum:1280x720:-:-")
+        location = "/api/wallpaper/cached/" + cache.disk.get("picsum:1280x720:-:-").digest
+        partial = client.get(location, headers={"Range": "bytes=100-1123"})
+        assert partial.status_code == 206
+        assert partial.headers["content-length"] == "1024"
+        assert partial.content == IMAGE[100:1124]
+        assert partial.headers["content-type"] == "image/jpeg"
+        assert client.get(location).content == IMAGE
+
+    def test_cache_eviction_by_bytes(self, tmp_path):
+        """测试内存和磁盘按总字节数淘汰最久未使用的图片"""
+        wallpaper_cache = WallpaperCache(memory_bytes=36000, disk_bytes=25000,
+                                         directory=str(tmp_path / "cache"), ttl=3600, enabled=True)
+
+        async def run():
+            for i in range(5):
+                wallpaper_cache.put(f"k{i}", bytes([i]) * 9000, "image/jpeg")
+                await wallpaper_cache.drain()
+            return [await wallpaper_cache.get(f"k{i}") for i in range(5)]
+
+        entries = asyncio.run(run())
+        assert wallpaper_cache.memory.bytes <= 36000
+        assert wallpaper_cache.disk.bytes <= 25000
+        # k0 已被内存和磁盘同时淘汰，k1、k2 只剩内存，k3、k4 两层都在
+        assert entries[0] is None
+        assert all(entry is not None for entry in entries[1:])
+        stats = wallpaper_cache.stats()
+        assert stats["memory_evictions"] == 1 and stats["disk_evictions"] == 3
+
+    def test_stream_spools_to_disk(self, client: TestClient, upstream, monkeypatch, tmp_path):
+        """测试流式转发时各块写入缓存目录下的临时文件，读完后改名为缓存对象；中途断开时删除临时文件"""
+        wallpaper_cache = WallpaperCache(memory_bytes=100000, disk_bytes=1024 * 1024,
+                                         directory=str(tmp_path / "cache"), ttl=3600, enabled=True)
+        monkeypatch.setattr(wallpaper, "wallpaper_cache", wallpaper_cache)
+        objects = tmp_path / "cache" / "objects"
+
+        url = "/api/wallpaper/random?source=picsum&width=800&height=600"
+        assert client.get(url).headers["x-cache"] == "MISS"
+        # 大于内存层单张上限的图片只在磁盘上，不读入内存
+        assert len(wallpaper_cache.memory) == 0
+        assert os.listdir(objects) == [content_digest(IMAGE)]
+        hit = client.get(url)
+        assert hit.headers["x-cache"] == "HIT-DISK" and hit.content == IMAGE
+
+        chunked = ChunkedUpstream(chunks=10000)
+
+        async def disconnect():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(chunked.handler)) as http:
+                response = await http.send(http.build_request("GET", "https://img.example/b.jpg"), stream=True)
+                streaming = UpstreamStreamingResponse(response, max_bytes=10 ** 9, chunk_size=1024,
+                                                      spool=wallpaper_cache.spool("k", "image/jpeg"))
+                sent = []
+
+                async def receive():
+                    while len(sent) < 4:
+                        await asyncio.sleep(0)
+                    return {"type": "http.disconnect"}
+
+                async def send(message):
+                    sent.append(message)
+                    await asyncio.sleep(0)
+
+                await streaming({"type": "http"}, receive, send)
+
+        asyncio.run(disconnect())
+        assert chunked.read < 100
+        assert os.listdir(objects) == [content_digest(IMAGE)]
+
+    def test_disk_index_and_key_files(self, tmp_path):
+        """测试磁盘层淘汰图片时删除指向它的键文件，重启后从目录重建大小索引"""
+        directory = tmp_path / "cache"
+        wallpaper_cache = WallpaperCache(memory_bytes=0, disk_bytes=25000, directory=str(directory),
+                                         ttl=3600, enabled=True)
+
+        async def fill():
+            for i in range(5):
+                wallpaper_cache.put(f"k{i}", bytes([i]) * 9000, "image/jpeg")
+                await wallpaper_cache.drain()
+
+        asyncio.run(fill())
+        assert wallpaper_cache.stats()["disk_evictions"] == 3
+        assert len(os.listdir(directory / "keys")) == len(os.listdir(directory / "objects")) == 2
+
+        (directory / "objects" / ".tmp-leftover").write_bytes(b"x")
+        reopened = WallpaperCache(memory_bytes=0, disk_bytes=25000, directory=str(directory),
+                                  ttl=3600, enabled=True)
+        assert reopened.disk.bytes == 18000
+        assert not (directory / "objects" / ".tmp-leftover").exists()
+        assert asyncio.run(reopened.get("k4")) is not None and asyncio.run(reopened.get("k0")) is None
+
+    def test_placeholder_files_are_bounded(self, tmp_path):
+        """测试占位图文件数有上限，壁纸缓存淘汰图片时对应的占位图文件也被删除"""
+        store = PlaceholderStore(enabled=True, directory=str(tmp_path / "placeholders"), disk_max_entries=2,
+                                 pipeline=ImagePipeline(enabled=True, workers=0))
+        images = [jpeg(64 + i, 36) for i in range(3)]
+        digests = [content_digest(image) for image in images]
+
+        async def ingest():
+            for digest, image in zip(digests, images):
+                await store.ensure(digest, image)
+
+        asyncio.run(ingest())
+        on_disk = lambda: sorted(os.path.basename(path)[:-len(".webp")]
+                                 for path in glob.glob(str(tmp_path / "placeholders" / "*" / "*.webp")))
+        assert on_disk() == sorted(digests[1:])
+        assert store.stats()["files"] == 2
+
+        wallpaper_cache = WallpaperCache(memory_bytes=36000, disk_bytes=25000,
+                                         directory=str(tmp_path / "cache"), ttl=3600, enabled=True)
+        wallpaper_cache.on_evict(store.discard)
+
+        async def fill():
+            for i, image in enumerate(images[1:] + [b"x" * 24000]):
+                wallpaper_cache.put(f"k{i}", image, "image/jpeg")
+                await wallpaper_cache.drain()
+
+        asyncio.run(fill())
+        assert wallpaper_cache.stats()["disk_evictions"] >= 1
+        assert digests[1] not in on_disk()
+
+    def test_disk_hit_uses_zerocopy_extension(self, tmp_path):
+        """测试服务器声明 zerocopy 扩展时把文件交给服务器发送"""
+        path = tmp_path / "image.jpg"
+        path.write_bytes(IMAGE)
+        sent = []
+
+        async def receive():
+            return {"type": "http.request"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "GET", "headers": [], "extensions": {"http.response.zerocopy": {}}}
+        asyncio.run(ZeroCopyFileResponse(str(path), media_type="image/jpeg")(scope, receive, send))
+        assert sent[0]["type"] == "http.response.start"
+        assert (b"content-length", str(len(IMAGE)).encode()) in sent[0]["headers"]
+        assert sent[1]["type"] == "http.response.zerocopy"
+        assert sent[1]["count"] == len(IMAGE)
+
+    def test_per_host_limit(self):
+        """测试单个主机的并发请求不超过上限，其他主机不受影响"""
+        active, peak = {}, {}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            host = request.url.host
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return httpx.Response(200, content=b"ok")
+
+        async def run():
+            transport = _per_host_transport(httpx.MockTransport(handler), 2)
+            async with httpx.AsyncClient(transport=transport) as client:
+                urls = ["https://a.example/x"] * 6 + ["https://b.example/x"] * 2
+                responses = await asyncio.gather(*(client.get(url) for url in urls))
+            assert all(response.status_code == 200 for response in responses)
+            assert transport.hosts["a.example"].requests == 6
+            assert transport.hosts["a.example"].active == 0
+
+        asyncio.run(run())
+        assert peak == {"a.example": 2, "b.example": 2}
+
+    def test_close_releases_client(self):
+        """测试关闭后再次使用会重新创建客户端"""
+        shared = SharedHTTPClient(transport=httpx.MockTransport(image_handler))
+
+        async def run():
+            first = shared.get()
+            assert shared.get() is first
+            await shared.aclose()
+            assert shared.started is False
+            assert shared.get() is not first
+            await shared.aclose()
+
+        asyncio.run(run())
+        assert shared.clients_created == 2